@@ -0,0 +1,68 @@
+import argparse
+import time
+
+from config_genie import ConfigGenie
+from phantom_data_manager import PhantomDataManager
+from log_config import setup_logging
+from colors import Colors
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def users(count):
+    return ({"username": f"bench_{i}", "role": "user", "group": "bench", "active_hours": "8:00-17:00"}
+            for i in range(count))
+
+
+def insert_one_by_one(data_manager, count):
+    # How users were created before bulk inserts, kept as the baseline
+    for user in users(count):
+        data_manager.collections["users"].insert_one(user)
+    return count
+
+
+def insert_bulk(data_manager, count):
+    return data_manager.create_docs("users", users(count))
+
+
+def read_all(data_manager):
+    return sum(1 for _ in data_manager.read_doc("users", {}, {"username": 1, "role": 1, "ip_address": 1}))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compares the MongoDB connection profiles by creating and reading back users "
+                    "in a scratch database, which is dropped afterwards.")
+    parser.add_argument("--uri", default="mongodb://localhost:27017/", help="MongoDB URI.")
+    parser.add_argument("--db", default="pyeventgen_bench", help="Scratch database name.")
+    parser.add_argument("--count", type=int, default=20000, help="Users created per run.")
+    parser.add_argument("--profiles", default="interactive,bulk", help="Comma separated connection profiles.")
+    args = parser.parse_args()
+    setup_logging("pyeventgen_bench.log")
+
+    config_manager = ConfigGenie()
+    data_manager = PhantomDataManager(config_manager, args.uri, args.db)
+    runs = [("one by one", "interactive", insert_one_by_one)]
+    runs += [(profile, profile, insert_bulk) for profile in args.profiles.split(",")]
+
+    print(f"{'run':<14}{'insert (s)':>12}{'docs/s':>12}{'read (s)':>12}{'docs/s':>12}")
+    try:
+        for label, profile, insert in runs:
+            if not data_manager.apply_profile(profile):
+                print(f"{Colors.FAIL}Connection profile '{profile}' doesn't exist.{Colors.ENDC}")
+                continue
+            data_manager.collections["users"].delete_many({})
+            inserted, insert_time = timed(insert, data_manager, args.count)
+            read, read_time = timed(read_all, data_manager)
+            print(f"{label:<14}{insert_time:>12.2f}{inserted / insert_time:>12.0f}"
+                  f"{read_time:>12.2f}{read / read_time:>12.0f}")
+    finally:
+        data_manager.client.drop_database(args.db)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+import gzip
+import logging
+import lzma
+import os
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def compress_gzip(data, level):
+    # mtime=0 keeps the output identical between runs
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_xz(data, level):
+    return lzma.compress(data, format=lzma.FORMAT_XZ, preset=level)
+
+
+class BlockCompressor:
+    """
+    Binary file wrapper that splits what gets written into independent blocks and
+    compresses them concurrently on a thread pool (zlib and lzma release the GIL).
+    Each block becomes a complete gzip member or xz stream, so the output is a valid
+    multi-member file any gzip/xz tool can read, and every block can also be
+    decompressed on its own using the seek index.
+    """
+
+    codecs = {
+        "gzip": (compress_gzip, "gz"),
+        "xz": (compress_xz, "xz")
+    }
+
+    def __init__(self, file, codec, level=6, block_size=4 * 1024 * 1024, threads=None, index_path=None):
+        """
+        :param file: [File] Binary file the compressed blocks are written to, positioned where they start.
+        :param codec: [String] 'gzip' or 'xz'.
+        :param level: [int] Compression level.
+        :param block_size: [int] Uncompressed bytes per block.
+        :param threads: [int] Number of compression threads. Defaults to the number of CPUs.
+        :param index_path: [String] Seek index file. If not given, no index is written.
+        """
+
+        self.file = file
+        self.compress = self.codecs[codec][0]
+        self.level = level
+        self.block_size = block_size
+        self.threads = threads or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="BlockCompressor")
+        self.block = bytearray()
+        # Blocks being compressed, kept in submission order so they are written in order
+        self.pending = deque()
+        self.logger = logging.getLogger("BlockCompressor")
+
+        # Offsets of the next block, in the uncompressed and the compressed stream
+        self.compressed_offset = file.tell()
+        self.uncompressed_offset = 0
+        self.index = None
+        if index_path:
+            self.index = self.open_index(index_path)
+
+    def open_index(self, index_path):
+        """
+        Opens the seek index. Each line holds the uncompressed offset, uncompressed size,
+        compressed offset and compressed size of a block, separated by tabs.
+        When the output is being resumed, the entries of blocks past the current
+        position are dropped.
+        :param index_path: [String] Seek index file.
+        :return: [File] Index file opened for appending
+        """
+
+        entries = []
+        if self.compressed_offset and os.path.exists(index_path):
+            with open(index_path, "r") as index:
+                for line in index:
+                    entry = [int(field) for field in line.split("\t")]
+                    if entry[2] + entry[3] <= self.compressed_offset:
+                        entries.append(line)
+                        self.uncompressed_offset = entry[0] + entry[1]
+        index = open(index_path, "w")
+        index.writelines(entries)
+        return index
+
+    def write(self, data):
+        """
+        Buffers data and submits a block for compression every time 'block_size' bytes are buffered.
+        :param data: [Bytes] Data to be written.
+        """
+
+        self.block += data
+        if len(self.block) >= self.block_size:
+            self.submit_block()
+
+    def submit_block(self):
+        if not self.block:
+            return
+        # Bounds the memory used by blocks waiting to be written
+        while len(self.pending) >= self.threads * 2:
+            self.write_block(*self.pending.popleft())
+        data = bytes(self.block)
+        self.block = bytearray()
+        self.pending.append((self.executor.submit(self.compress, data, self.level), len(data)))
+
+    def write_block(self, future, size):
+        compressed = future.result()
+        self.file.write(compressed)
+        if self.index:
+            self.index.write(f"{self.uncompressed_offset}\t{size}\t{self.compressed_offset}\t{len(compressed)}\n")
+        self.uncompressed_offset += size
+        self.compressed_offset += len(compressed)
+
+    def push(self):
+        """
+        Compresses the buffered data as a block (even if it's smaller than 'block_size')
+        and writes every pending block out, without syncing the file.
+        """
+
+        self.submit_block()
+        while self.pending:
+            self.write_block(*self.pending.popleft())
+        if self.index:
+            self.index.flush()
+        self.file.push()
+
+    def flush(self):
+        """
+        Writes every pending block, like push, and syncs the file if its policy says so.
+        """
+
+        self.push()
+        self.file.flush()
+
+    def sync(self):
+        """
+        Writes every pending block and syncs the index and the file to disk. A resumed output
+        only keeps the index entries of the blocks before its offset, so the index must hold
+        every block the synced file does.
+        """
+
+        self.flush()
+        if self.index:
+            os.fsync(self.index.fileno())
+        self.file.sync()
+
+    def tell(self):
+        """
+        Gets the compressed offset after flushing, which always falls on a block boundary.
+        :return: [int] Offset
+        """
+
+        self.flush()
+        return self.compressed_offset
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown()
+        if self.index:
+            self.index.close()
+        self.file.close()
+        self.logger.info(f"{self.uncompressed_offset} bytes compressed into {self.compressed_offset} bytes.")
@@ -0,0 +1,221 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+
+# Campaigns are described in a JSON file (the 'campaigns' config) as a list like:
+# [
+#     {"type": "brute_force", "start": 600, "attempts": 80, "rate": 4},
+#     {"type": "lateral_movement", "start": 1800, "hops": 6, "interval": 45},
+#     {"type": "exfiltration", "start": 3600, "exports": 300, "rate": 10}
+# ]
+# 'start' is the number of seconds after the first event of the run the campaign begins at.
+
+
+def poisson_arrivals(rng, start, count, rate):
+    """
+    Gets the timestamps of a burst of events arriving as a Poisson process.
+    The gaps of the whole burst are drawn at once and accumulated.
+    :param rng: [Random] Random generator of the campaign.
+    :param start: [float] Timestamp the burst starts at.
+    :param count: [int] Number of events.
+    :param rate: [float] Average number of events per second.
+    :return: [List-of float] Timestamps
+    """
+
+    return [start + offset for offset in itertools.accumulate(rng.expovariate(rate) for _ in range(count))]
+
+
+def brute_force(rng, campaign, start, pool, build_event):
+    # A burst of failed logins against one account from one external address,
+    # optionally ending with the one that gets in
+    user = pool.pick_user(rng)
+    server = pool.pick_server(rng)
+    source_ip = campaign.get("source_ip") or f"203.0.113.{rng.randrange(1, 255)}"
+    rate = campaign.get("rate", 2.0)
+    timestamps = poisson_arrivals(rng, start, campaign.get("attempts", 50), rate)
+    events = [(build_event(timestamp, user, server, "login_failure", rng), "attempt") for timestamp in timestamps]
+    if campaign.get("success", True):
+        timestamp = timestamps[-1] + rng.expovariate(rate)
+        events.append((build_event(timestamp, user, server, "login_success", rng), "access"))
+    for event, _ in events:
+        event["details"]["user_ip"] = source_ip
+    return events
+
+
+def lateral_movement(rng, campaign, start, pool, build_event):
+    # One account logging into a chain of different servers, looking around
+    # on each one and connecting to the next
+    user = pool.pick_user(rng)
+    servers = []
+    for _ in range(campaign.get("hops", 5) * 4):
+        server = pool.pick_server(rng)
+        if server not in servers:
+            servers.append(server)
+        if len(servers) == campaign.get("hops", 5):
+            break
+    events = []
+    hop_times = poisson_arrivals(rng, start, len(servers), 1 / campaign.get("interval", 60))
+    for hop, (server, timestamp) in enumerate(zip(servers, hop_times)):
+        steps = ["login_success", "file_access", "network_connection"]
+        for step, step_time in zip(steps, poisson_arrivals(rng, timestamp, len(steps), 0.5)):
+            events.append((build_event(step_time, user, server, step, rng), f"hop_{hop}"))
+    return events
+
+
+def exfiltration(rng, campaign, start, pool, build_event):
+    # Data being staged with a few queries, then exported in a spike
+    user = pool.pick_user(rng)
+    server = pool.pick_server(rng)
+    exports = campaign.get("exports", 200)
+    rate = campaign.get("rate", 5.0)
+    staging = poisson_arrivals(rng, start, max(exports // 10, 1), rate / 4)
+    spike = poisson_arrivals(rng, staging[-1], exports, rate)
+    return ([(build_event(timestamp, user, server, "database_query", rng), "staging") for timestamp in staging]
+            + [(build_event(timestamp, user, server, "data_export", rng), "export") for timestamp in spike])
+
+
+class CampaignInjector:
+    """
+    Overlays attack campaigns on the baseline events of a run. The events of each
+    campaign are generated in bulk when the injector is created, and handed out in
+    time order, merged across campaigns, as the baseline events go by. The ground
+    truth of every injected event is written to a labels file.
+    """
+
+    scenarios = {
+        "brute_force": brute_force,
+        "lateral_movement": lateral_movement,
+        "exfiltration": exfiltration
+    }
+
+    def __init__(self, campaigns, seed, start_time, pool, build_event, skip=0):
+        """
+        :param campaigns: [List-of Dictionary] Campaigns, each with its 'type', 'start' and parameters.
+        :param seed: [int] Seed of the campaigns. The same seed always produces the same campaign events.
+        :param start_time: [float] Timestamp the campaign starts are counted from, or None to count them
+        from the first baseline event (for runs whose timestamps come from the wall clock).
+        :param pool: [EntityPool] Users and servers of the run.
+        :param build_event: [Function] Builds an event from a timestamp, user, server, action and random generator.
+        :param skip: [int] Number of campaign events already injected (used to resume a run).
+        """
+
+        self.logger = logging.getLogger("CampaignInjector")
+        self.campaigns = campaigns
+        self.seed = seed
+        self.pool = pool
+        self.build_event = build_event
+        self.start_time = None
+        self.total = 0
+        self.injected = skip
+        self.timeline = None
+        self.next_item = None
+        self.labels = None
+        self.labels_path = None
+        if start_time is not None:
+            self.plan(start_time)
+
+    def plan(self, start_time):
+        """
+        Generates the events of every campaign.
+        :param start_time: [float] Timestamp the campaign starts are counted from.
+        """
+
+        timelines = []
+        for index, campaign in enumerate(self.campaigns):
+            name = campaign.get("name", f"{campaign['type']}_{index}")
+            # Each campaign has its own generator, so adding one doesn't change the others
+            rng = random.Random(f"{self.seed}:{index}:{name}")
+            events = self.scenarios[campaign["type"]](rng, campaign, start_time + campaign.get("start", 0),
+                                                      self.pool, self.build_event)
+            # Stages can overlap (a hop may start before the previous one is done),
+            # and the merge below needs every timeline in time order
+            events.sort(key=lambda item: item[0]["timestamp"])
+            labels = {"campaign": name, "scenario": campaign["type"]}
+            timelines.append([(event, dict(labels, stage=stage)) for event, stage in events])
+            self.logger.info(f"Campaign '{name}' generated with {len(events)} events.")
+
+        self.start_time = start_time
+        self.total = sum(len(timeline) for timeline in timelines)
+        merged = heapq.merge(*timelines, key=lambda item: item[0]["timestamp"])
+        self.timeline = itertools.islice(merged, self.injected, None)
+        self.next_item = next(self.timeline, None)
+
+    @staticmethod
+    def validate(campaigns):
+        """
+        Verifies the campaigns of a campaigns file.
+        :param campaigns: [List-of Dictionary] Campaigns.
+        :return: [String] Error message, or None if they are valid
+        """
+
+        if not isinstance(campaigns, list):
+            return "The campaigns file must contain a list of campaigns."
+        for campaign in campaigns:
+            if campaign.get("type") not in CampaignInjector.scenarios:
+                return (f"Unknown campaign type '{campaign.get('type')}'. "
+                        f"Available types: {', '.join(CampaignInjector.scenarios)}")
+        return None
+
+    def open_labels(self, path, resume_offset=None):
+        """
+        Opens the labels file, where a JSON line with the sequence number, campaign,
+        scenario and stage of each injected event is written.
+        :param path: [String] Labels file.
+        :param resume_offset: [int] If given, the file is truncated at this offset and appended to.
+        """
+
+        if resume_offset is None:
+            self.labels = open(path, "wb")
+        else:
+            self.labels = open(path, "r+b")
+            self.labels.seek(resume_offset)
+            self.labels.truncate()
+        self.labels_path = path
+
+    def pop_until(self, timestamp, sequence):
+        """
+        Gets the campaign events up to a timestamp, in time order, numbers them
+        and writes their labels.
+        :param timestamp: [float] Timestamp of the next baseline event.
+        :param sequence: [int] Sequence number of the first campaign event returned.
+        :return: [List] Campaign events
+        """
+
+        # Without a start time, the campaigns start counting from this event
+        if self.start_time is None:
+            self.plan(timestamp)
+        events = []
+        while self.next_item is not None and self.next_item[0]["timestamp"] <= timestamp:
+            event, labels = self.next_item
+            event["sequence"] = sequence + len(events)
+            events.append(event)
+            if self.labels is not None:
+                self.labels.write((json.dumps(dict(labels, sequence=event["sequence"])) + "\n").encode("utf-8"))
+            self.next_item = next(self.timeline, None)
+        self.injected += len(events)
+        return events
+
+    def tell(self):
+        """
+        Gets the offset of the labels file, after flushing it and syncing it to disk.
+        :return: [int] Offset, or None if there's no labels file
+        """
+
+        if self.labels is None:
+            return None
+        self.labels.flush()
+        os.fsync(self.labels.fileno())
+        return self.labels.tell()
+
+    def close(self):
+        """
+        Closes the labels file.
+        :return: [int] Number of campaign events left out because they fall after the last baseline event
+        """
+
+        if self.labels is not None:
+            self.labels.close()
+        return self.total - self.injected
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+
+from colors import Colors
+
+
+class CheckpointManager:
+
+    def __init__(self, config_manager):
+        # Manager components get imported from command_line.py initialization/instantiation
+        self.config_manager = config_manager
+        self.logger = logging.getLogger("CheckpointManager")
+        self.logger.info("CheckpointManager component initialized.")
+
+    def get_interval(self):
+        """
+        Gets how many events are generated between two checkpoints.
+        :return: [int] Checkpoint interval
+        """
+
+        return int(self.config_manager.get_global_config("checkpoint_interval")["checkpoint_interval"])
+
+    def checkpoint_path(self, filename):
+        """
+        Gets the checkpoint file stored next to the given output file.
+        :param filename: [String] Output file of the run.
+        :return: [String] Checkpoint file path
+        """
+
+        return f"{filename}.checkpoint.json"
+
+    def save(self, path, state):
+        """
+        Writes the state of a run to its checkpoint file.
+        The file is replaced atomically, so a crash while saving keeps the previous checkpoint.
+        :param path: [String] Checkpoint file path.
+        :param state: [Dictionary] State of the run.
+        """
+
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        self.logger.info(f"Checkpoint saved to '{path}' after {state['events_emitted']} events.")
+
+    def load(self, path):
+        """
+        Reads the state of a run from its checkpoint file.
+        :param path: [String] Checkpoint file path.
+        :return: [Dictionary] State of the run, or None if it couldn't be read
+        """
+
+        try:
+            with open(path, "r") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            message = f"Checkpoint file '{path}' doesn't exist."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return None
+        except json.JSONDecodeError:
+            message = f"Checkpoint file '{path}' is corrupted."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return None
+        self.logger.info(f"Checkpoint loaded from '{path}' at {state['events_emitted']} events.")
+        return state
+
+    def remove(self, path):
+        """
+        Removes the checkpoint file once its run has completed.
+        :param path: [String] Checkpoint file path.
+        """
+
+        if os.path.exists(path):
+            os.remove(path)
+            self.logger.info(f"Checkpoint '{path}' removed.")
@@ -1,15 +1,33 @@
+import argparse
 import cmd
+import copy
 import json
 import logging
 import os
 import platform
 import readline
 import atexit
+import glob
+import random
+import time
+
+from pymongo import errors
 
 from config_genie import ConfigGenie
 from phantom_data_manager import PhantomDataManager
 from virtual_event_gen import VirtualEventGen
 from export_manager import ExportManager
+from checkpoint_manager import CheckpointManager
+from distributed_gen import GenerationCoordinator
+from entity_pool import SampledEntityPool
+from entity_snapshot import EntitySnapshot, write_snapshot, USER_FIELDS, SERVER_FIELDS
+from event_stats import EventStats
+from campaign_injector import CampaignInjector
+from shard_merger import ShardMerger
+from sink_fanout import SinkError
+from event_replayer import EventReplayer
+from job_manager import JobManager
+from shell_profiler import ShellProfiler, PROFILE_MODES, PROFILE_SORTS
 from log_config import setup_logging
 from colors import Colors
 
@@ -24,14 +42,26 @@ class PyEventGenShell(cmd.Cmd):
     # prompt = f"pyeventgen > "
     # prompt = f"{Colors.OKBLUE}(pyeventgen) {Colors.ENDC}"
     prompt = f"(pyeventgen) "
+    # Commands that can run as background jobs. They return False when they fail, which fails their job
+    background_commands = ("generate_events", "resume", "create_users", "create_servers", "replay")
 
-    def __init__(self):
+    def __init__(self, snapshot_path=None):
         super().__init__()
         # https://stackoverflow.com/questions/22261615/attribute-error-has-no-attribute-completekey-python
         self.config_manager = ConfigGenie()
-        self.data_manager = PhantomDataManager()
+        # Starting from a snapshot skips the MongoDB connection altogether
+        self.data_manager = None if snapshot_path else PhantomDataManager(self.config_manager)
         self.event_manager = VirtualEventGen(self.config_manager, self.data_manager)
-        self.export_manager = ExportManager()
+        if snapshot_path:
+            self.event_manager.use_snapshot(EntitySnapshot(snapshot_path))
+        self.export_manager = ExportManager(self.config_manager, self.data_manager)
+        self.checkpoint_manager = CheckpointManager(self.config_manager)
+        self.coordinator = GenerationCoordinator(self.config_manager)
+        self.profiler = ShellProfiler(self.config_manager)
+        self.job_manager = JobManager()
+        # Set on the copies of the shell that run background jobs
+        self.job = None
+        self.export_prefix = None
         self.logger = logging.getLogger("PyEventGenShell")
         self.clear_console()
         self.setup_history()
@@ -71,6 +101,19 @@ class PyEventGenShell(cmd.Cmd):
         else:
             os.system('clear')
 
+    def database_available(self):
+        """
+        Verifies that the shell is connected to MongoDB (it isn't when started from a snapshot).
+        :return: (bool)
+        """
+
+        if self.data_manager is None:
+            message = "Not connected to MongoDB. Restart the shell without --snapshot to use this command."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        return True
+
     def collection_exists(self, collection):
         """
         Verifies that collection exists
@@ -78,6 +121,8 @@ class PyEventGenShell(cmd.Cmd):
         :return: (bool)
         """
 
+        if not self.database_available():
+            return False
         if not collection.strip() in self.data_manager.collections:
             message = f"Collection {collection} doesn't exist."
             print(f"{Colors.FAIL}{message}{Colors.ENDC}")
@@ -86,16 +131,17 @@ class PyEventGenShell(cmd.Cmd):
         self.logger.info(f"Collection '{collection}' successfully verified.")
         return True
 
-    def verify_arguments(self, args, num_arg, error_prompt):
+    def verify_arguments(self, args, num_arg, error_prompt, num_optional=0):
         """
         Verify the given args meets the minimum requirements for the function to work
         :param args: Given args by the user
         :param num_arg: Number of args required for the function to work
         :param error_prompt: Error message to prompt
+        :param num_optional: Number of optional args accepted after the required ones
         :return: Boolean
         """
 
-        if len(args) != num_arg:
+        if not num_arg <= len(args) <= num_arg + num_optional:
             print(f"{Colors.OKCYAN}{error_prompt}{Colors.ENDC}")
             self.logger.error("Arguments verification failed.")
             return False
@@ -137,6 +183,193 @@ class PyEventGenShell(cmd.Cmd):
         self.logger.info("Query validation succeeded")
         return True, query
 
+    def apply_event_mix(self):
+        """
+        Loads the event mix from the 'event_mix' config into the event generator.
+        :return: Boolean
+        """
+
+        try:
+            self.event_manager.set_event_mix(self.event_manager.load_event_mix())
+        except (OSError, ValueError) as e:
+            message = f"Invalid event mix: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        return True
+
+    def apply_event_details(self, enabled):
+        """
+        Enables or disables the action specific details of the events in the event generator.
+        :param enabled: [Boolean] Whether events get the details of their action.
+        :return: Boolean, False if the vocabulary file couldn't be mapped
+        """
+
+        try:
+            self.event_manager.set_event_details(enabled)
+        except (OSError, ValueError) as e:
+            message = f"Invalid vocabulary file: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        return True
+
+    def apply_ip_enrichment(self, tables=None):
+        """
+        Loads the IP tables the events are enriched with into the event generator.
+        :param tables: [List-of String] CSV tables. Defaults to the ones of the 'ip_enrichment' config.
+        :return: [List-of String] Tables loaded, or None if one of them is invalid
+        """
+
+        if tables is None:
+            tables = self.config_manager.get_global_config("ip_enrichment")["ip_enrichment"]
+            tables = [path.strip() for path in tables.split(",") if path.strip()]
+        try:
+            self.event_manager.set_ip_enrichment(tables)
+        except (OSError, ValueError) as e:
+            message = f"Invalid IP enrichment table: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return None
+        return tables
+
+    def warn_default_schema(self, formats, event_details, ip_enrichment):
+        """
+        Warns that csv and tsv files exported with the default event schema leave out the
+        action specific details and IP enrichment fields, which only a schema file can list.
+        :param formats: [List-of String] Export formats.
+        :param event_details: [Boolean] Whether events get the details of their action.
+        :param ip_enrichment: [List-of String] IP tables the events are enriched with.
+        """
+
+        flat_formats = [format_str for format_str in formats if format_str in ("csv", "tsv")]
+        if not flat_formats or self.config_manager.get_global_config("event_schema")["event_schema"]:
+            return
+        left_out = [name for name, enabled in (("action details", event_details),
+                                               ("IP enrichment fields", ip_enrichment)) if enabled]
+        if left_out:
+            message = (f"The {' and '.join(left_out)} of the events aren't in the default columns of the "
+                       f"{'/'.join(flat_formats)} files. Set 'event_schema' to a schema listing them to export them.")
+            print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+            self.logger.warning(message)
+
+    def load_entities(self, users_query, servers_query):
+        """
+        Loads the users and servers matching the queries into the event generator,
+        from the snapshot if one is loaded, or from the database otherwise.
+        :param users_query: [Dict] Users query.
+        :param servers_query: [Dict] Servers query.
+        :return: Entity pool, or None if there aren't users or servers to generate events with
+        """
+
+        if self.event_manager.snapshot is None:
+            if not self.database_available():
+                return None
+            # Cheap existence checks before loading anything
+            if not self.data_manager.exists_doc("servers", servers_query):
+                message = f"No servers found with query {servers_query}."
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.info(message)
+                return None
+            if not self.data_manager.exists_doc("users", users_query):
+                message = f"No users found with query {users_query}."
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.info(message)
+                return None
+
+        try:
+            pool = self.event_manager.load_entities(users_query, servers_query)
+        except ValueError as e:
+            print(f"{Colors.FAIL}{e}{Colors.ENDC}")
+            self.logger.error(str(e))
+            return None
+        if not pool:
+            message = f"No users or servers found with queries {users_query} {servers_query}."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.info(message)
+            return None
+        if isinstance(pool, SampledEntityPool):
+            print(f"{Colors.OKCYAN}Too many users or servers to load, they are sampled from the database "
+                  f"(seeded runs aren't reproducible).{Colors.ENDC}")
+        return pool
+
+    def load_campaigns(self):
+        """
+        Reads the attack campaigns from the JSON file in the 'campaigns' config.
+        :return: [List] Campaigns (empty if none are configured), or None if the file isn't valid
+        """
+
+        path = self.config_manager.get_global_config("campaigns")["campaigns"]
+        if not path:
+            return []
+        try:
+            with open(path, "r") as file:
+                campaigns = json.load(file)
+        except (OSError, ValueError) as e:
+            message = f"Couldn't read the campaigns file '{path}': {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return None
+        error = CampaignInjector.validate(campaigns)
+        if error:
+            print(f"{Colors.FAIL}{error}{Colors.ENDC}")
+            self.logger.error(error)
+            return None
+        return campaigns
+
+    def bulk_create(self, collection, documents, count=None):
+        """
+        Inserts documents using the bulk connection profile. The current connection
+        profile isn't switched, so other commands and background jobs aren't affected.
+        :param collection: [String] Collection name.
+        :param documents: [Iterable] Documents to be inserted.
+        :param count: [int] Number of documents, shown as the total of a background job.
+        :return: (bool)
+        """
+
+        bulk_profile = self.config_manager.get_global_config()["bulk_connection_profile"]
+        if self.config_manager.get_connection_profile(bulk_profile) is None:
+            message = f"Connection profile '{bulk_profile}' doesn't exist."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        if self.job is not None:
+            self.job.set_total(count)
+            documents = self.job.track(documents)
+        try:
+            inserted = self.data_manager.create_docs(collection, documents, bulk_profile)
+        except errors.PyMongoError as e:
+            message = f"Couldn't create the {collection}: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        if self.job is not None and self.job.cancelled:
+            message = f"Cancelled after {inserted} {collection} created."
+            print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+            self.logger.warning(message)
+            return False
+        return True
+
+    def display_documents(self, cursor):
+        """
+        Prints the documents of a cursor one page at the time. The page size is taken from
+        the 'page_size' config, and the next page is only fetched if the user asks for it.
+        :param cursor: Cursor returned by the data manager
+        :return: [int] Number of documents printed
+        """
+
+        page_size = int(self.config_manager.get_global_config("page_size")["page_size"])
+        cursor = cursor.batch_size(page_size)
+        shown = 0
+        for document in cursor:
+            if shown and shown % page_size == 0:
+                if not self.get_confirmation("Show more? (Y/n): "):
+                    break
+            print(document)
+            shown += 1
+        self.logger.info(f"{shown} documents displayed.")
+        return shown
+
     # Command Functions
 
     def do_init(self, arg):
@@ -165,12 +398,14 @@ class PyEventGenShell(cmd.Cmd):
         # Verifies number of arguments passed
         args = arg.split()
         if not self.verify_arguments(args, 4, "Usage: create_users <count> <username> <role> <group>"):
-            return
+            return False
+        if not self.database_available():
+            return False
 
         # Verifies 'count' is a valid integer
         is_valid, count = self.verify_integer(args[0], "Invalid number of users. Please enter a valid integer.")
         if not is_valid:
-            return
+            return False
 
         # Assigns given strings to their variables
         name = args[1].strip()
@@ -185,10 +420,10 @@ class PyEventGenShell(cmd.Cmd):
         #   return
 
         print(f"Creating {count} users...")
-        for i in range(1, count + 1):
-            self.data_manager.create_doc("users",
-                                         {"username": f"{name}_{i}", "role": role, "group": group,
-                                          "active_hours": "8:00-17:00"})
+        users = ({"username": f"{name}_{i}", "role": role, "group": group, "active_hours": "8:00-17:00"}
+                 for i in range(1, count + 1))
+        if not self.bulk_create("users", users, count):
+            return False
         message = f"{count} users created successfully."
         print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
         self.logger.info(message)
@@ -203,22 +438,24 @@ class PyEventGenShell(cmd.Cmd):
         # Verifies number of arguments passed
         args = arg.split()
         if not self.verify_arguments(args, 3, "Usage: create_servers <count> <server_name> <group_name>"):
-            return
+            return False
+        if not self.database_available():
+            return False
 
         # Verifies provided count is a valid integer
         server_name = args[1]
         is_valid, count = self.verify_integer(args[0], "Invalid number of servers. Please enter a valid integer.")
         if not is_valid:
-            return
+            return False
 
         # TODO: verify that group exists, if doesn't exist, create a new one with default values
         group = args[2].strip()
 
         print(f"Creating {count} servers...")
-        for i in range(1, count + 1):
-            self.data_manager.create_doc("servers",
-                                         {"server_name": f"{server_name}_{i}", "server_type": "server",
-                                          "group": group})  # server_type should be changed
+        servers = ({"server_name": f"{server_name}_{i}", "server_type": "server", "group": group}
+                   for i in range(1, count + 1))  # server_type should be changed
+        if not self.bulk_create("servers", servers, count):
+            return False
         message = f"{count} servers created successfully."
         print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
         self.logger.info(message)
@@ -251,13 +488,9 @@ class PyEventGenShell(cmd.Cmd):
         if not is_valid:
             return
 
-        # Converts returned cursor into a list,
-        # and print each document on the list
+        # Streams the documents from the cursor and prints them page by page
         cursor = self.data_manager.read_doc(collection, query)
-        results = list(cursor)
-        if results:
-            for document in results:
-                print(document)
+        if self.display_documents(cursor):
             self.logger.info("Documents were successfully read.")
         else:
             message = f"No documents found with the given collection and query."
@@ -302,31 +535,30 @@ class PyEventGenShell(cmd.Cmd):
         if not is_valid_new_value:
             return
 
-        # Shows the list of documents to be deleted
-        print("The following documents will be updated:")
+        # Counts the documents on the server instead of fetching them
+        events_count = self.data_manager.count_doc(collection, query)
+        if not events_count:
+            message = f"No documents found with the given collection and query."
+            self.logger.info(message)
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            return
+
+        # Shows the list of documents to be updated
+        print(f"The following {events_count} documents will be updated:")
         # This caused issues
         # # Can't use 'arg' directly cause it contains 3 args, read only receives 2
         # if not self.do_read(f"{collection} {query}"):
         #     return
-        cursor = self.data_manager.read_doc(collection, query)
-        results = list(cursor)
-        if not results:
-            message = f"No documents found with the given collection and query."
-            self.logger.info(message)
-            print("{Colors.FAIL}message{Colors.ENDC}")
-            return
-        for document in results:
-            print(document)
+        self.display_documents(self.data_manager.read_doc(collection, query))
 
         # Gets confirmation from the user
         if not self.get_confirmation():
             return
 
         # Updates the documents
-        self.data_manager.update_doc(collection, query, new_value)
+        events_count = self.data_manager.update_doc(collection, query, new_value)
 
         message = "Documents updated"
-        events_count = len(results)
         print(f"{Colors.OKGREEN}{message}!{Colors.ENDC}")
         self.logger.info(f"{events_count} {message.lower()}.")
 
@@ -356,36 +588,36 @@ class PyEventGenShell(cmd.Cmd):
         if not is_valid:
             return
 
-        # Shows the list of documents to be deleted
-        print("The following documents will be deleted:")
-        cursor = self.data_manager.read_doc(collection, query)
-        results = list(cursor)
-        if not results:
+        # Counts the documents on the server instead of fetching them
+        events_count = self.data_manager.count_doc(collection, query)
+        if not events_count:
             message = "No documents found with the given collection and query."
             print(f"{Colors.FAIL}{message}{Colors.ENDC}")
             self.logger.info(message)
             return
-        for document in results:
-            print(document)
+
+        # Shows the list of documents to be deleted
+        print(f"The following {events_count} documents will be deleted:")
+        self.display_documents(self.data_manager.read_doc(collection, query))
 
         # Gets confirmation from the user
         if not self.get_confirmation():
             return
 
         # Removes the documents
-        self.data_manager.remove_doc(collection, query)
+        events_count = self.data_manager.remove_doc(collection, query)
 
         message = "Documents removed"
-        events_count = len(results)
         print(f"{Colors.OKGREEN}{message}!{Colors.ENDC}")
         self.logger.info(f"{events_count} {message.lower()}.")
 
     def do_generate_events(self, arg):
         """
         Generate and exports events based on the given parameters.
-        Usage: generate_events <count> <servers_query> <users_query> <export_format>
+        Usage: generate_events <count> <servers_query> <users_query> <export_format> [seed]
 
-        Export format: [json, log, none], (csv, xml) -> to be implemented
+        Export format: [json, log, csv, tsv, xml, none], or several of them separated by commas
+        (e.g. json,log,csv) to export the same events to every format at once.
         Event type: [random, or a string] to be implemented
 
         Examples of usage:
@@ -398,65 +630,979 @@ class PyEventGenShell(cmd.Cmd):
         - generate 20 {} {"role":"user","group":"test"} none : Generates 50 events from server "apache_1" and random
           users with role "user" and group "sales" but doesn't export them.
 
+        - generate 1000000 {} {} log 42 : Generates a reproducible run of one million events seeded with 42.
+
+        - generate 1000 {} {} json,log,csv : Generates 1000 events once and exports them in JSON, log and CSV formats.
+
           {} = ALL
+        While generating, the run is checkpointed every 'checkpoint_interval' events next to the
+        exported file, so it can be continued with the 'resume' command if it gets interrupted.
         :param arg: [int] Count of events, [Dict] Servers query in JSON format, [Dict] Users query in JSON format,
-        [String] export format
+        [String] export format(s), [int] Optional seed
         """
 
         # Verifies number of arguments passed
         args = arg.split()
-        if not self.verify_arguments(args, 4, "Usage: generate_events <count> <servers_query> <users_query> <format>"):
-            return
+        if not self.verify_arguments(args, 4, "Usage: generate_events <count> <servers_query> <users_query> <format> "
+                                              "[seed]", num_optional=1):
+            return False
 
         # Verifies that count is a valid integer
         is_valid, count = self.verify_integer(args[0], "Invalid number of events. Please enter a valid integer.")
         if not is_valid:
-            return
+            return False
 
         # Validates users and servers query. If queries are valid,
         # they get successfully assigned to variables
         is_valid_s, servers_query = self.validate_query(args[1])
         is_valid_u, users_query = self.validate_query(args[2])
         if not is_valid_s or not is_valid_u:
-            return
+            return False
 
-        # Verifies that the provided format is valid
-        format_str = args[3]
-        if not self.export_manager.verify_export_format(format_str):
-            return
+        # Verifies that the provided formats are valid
+        formats = self.export_manager.verify_export_formats(args[3])
+        if not formats:
+            return False
+
+        # Verifies that the seed, if provided, is a valid integer
+        seed = None
+        if len(args) == 5:
+            is_valid, seed = self.verify_integer(args[4], "Invalid seed. Please enter a valid integer.")
+            if not is_valid:
+                return False
 
         # Verifies that the provided collections and queries sucesfully
         # finds match/documents (If not, it won't be able to generate events)
-        servers = self.data_manager.read_doc("servers", servers_query)
-        if len(list(servers)) <= 0:
-            message = f"No servers found with query {servers_query}."
+        pool = self.load_entities(users_query, servers_query)
+        if pool is None:
+            return False
+
+        # Seeded runs take their timestamps from a simulated clock, so
+        # the same seed and start time always produce the same events
+        config = self.config_manager.get_global_config("event_rate", "start_time", "event_details")
+        start_time = float(config["start_time"] or time.time())
+        self.event_manager.seed(seed, start_time, float(config["event_rate"]))
+        if not self.apply_event_mix():
+            return False
+        event_details = config["event_details"] == "True"
+        if not self.apply_event_details(event_details):
+            return False
+        ip_enrichment = self.apply_ip_enrichment()
+        if ip_enrichment is None:
+            return False
+        campaigns = self.load_campaigns()
+        if campaigns is None:
+            return False
+        self.warn_default_schema(formats, event_details, ip_enrichment)
+
+        # The job holds everything needed to continue the run from a checkpoint
+        job = {
+            "count": count,
+            "servers_query": servers_query,
+            "users_query": users_query,
+            "formats": formats,
+            "seed": seed,
+            "event_mix": self.event_manager.event_mix,
+            "event_details": event_details,
+            "ip_enrichment": ip_enrichment,
+            "events_emitted": 0,
+            "snapshot_version": pool.version,
+            "outputs": [],
+            # Unseeded runs take their timestamps from the wall clock, so their campaigns
+            # start counting from the first generated event instead (see open_injector)
+            "start_time": start_time if seed is not None else None,
+            "campaigns": campaigns,
+            # Unseeded runs get a random one, stored so a resumed run injects the same campaign events
+            "campaign_seed": seed if seed is not None else random.getrandbits(32),
+            "injected_emitted": 0,
+            "labels_offset": None
+        }
+        sinks = self.export_manager.open_sinks(formats, prefix=self.export_prefix)
+        if sinks is None:
+            return False
+        return self.run_generation(job, sinks, self.get_checkpoint_path(sinks))
+
+    def do_distribute(self, arg):
+        """
+        Generate and export events on several worker processes, possibly on other hosts.
+        The job is split in chunks of 'distributed_chunk_size' events that are handed out to
+        the workers as they finish the previous ones. Each worker exports its events to its
+        own files (<name>_w<worker>.<format>). With 'distributed_eps', the job is throttled
+        to that many events per second across all the workers. Files the workers read (a loaded
+        snapshot, IP tables) must be at the same paths on their hosts.
+        Usage: distribute <count> <servers_query> <users_query> <export_format> <workers> [seed]
+        Workers: 'local:<n>' starts n worker processes on this host, or a comma separated list of
+        host:port of workers started with 'python distributed_gen.py worker --port <port>', which
+        only serve coordinators with the same PYEVENTGEN_WORKER_SECRET.
+        Examples of usage:
+        - distribute 10000000 {} {} log local:4 : Generates ten million events on 4 local workers.
+        - distribute 1000000 {} {} json,log 10.0.0.5:9100,10.0.0.6:9100 42 : Generates a seeded run on two hosts.
+        :param arg: [int] Count of events, [Dict] Servers query in JSON format, [Dict] Users query in JSON format,
+        [String] export format(s), [String] workers, [int] Optional seed
+        """
+
+        # Verifies number of arguments passed
+        args = arg.split()
+        if not self.verify_arguments(args, 5, "Usage: distribute <count> <servers_query> <users_query> <format> "
+                                              "<workers> [seed]", num_optional=1):
+            return
+
+        # Verifies that count is a valid integer
+        is_valid, count = self.verify_integer(args[0], "Invalid number of events. Please enter a valid integer.")
+        if not is_valid:
+            return
+
+        # Validates users and servers query
+        is_valid_s, servers_query = self.validate_query(args[1])
+        is_valid_u, users_query = self.validate_query(args[2])
+        if not is_valid_s or not is_valid_u:
+            return
+
+        # Verifies that the provided formats are valid
+        formats = self.export_manager.verify_export_formats(args[3])
+        if not formats:
+            return
+
+        # Verifies that the seed, if provided, is a valid integer
+        seed = None
+        if len(args) == 6:
+            is_valid, seed = self.verify_integer(args[5], "Invalid seed. Please enter a valid integer.")
+            if not is_valid:
+                return
+
+        # The entities are read once here and sent to every worker
+        if not self.apply_event_mix():
+            return
+        pool = self.load_entities(users_query, servers_query)
+        if pool is None:
+            return
+        # Workers would only get the documents in the reservoir, not a sample of the whole collections
+        if isinstance(pool, SampledEntityPool):
+            self.event_manager.close_entity_pool()
+            message = ("distribute can't sample users and servers. Load a snapshot of them, "
+                       "or disable 'entity_sampling' if they fit in memory.")
             print(f"{Colors.FAIL}{message}{Colors.ENDC}")
-            self.logger.info(message)
+            self.logger.error(message)
+            return
+        # Loaded here too, so a broken table is reported before any worker starts
+        ip_enrichment = self.apply_ip_enrichment()
+        if ip_enrichment is None:
+            return
+        # Sent with the job, workers don't read the schema file
+        schema = None
+        if {"csv", "tsv"} & set(formats):
+            schema = self.export_manager.get_schema()
+            if schema is None:
+                return
+
+        config = self.config_manager.get_global_config()
+        self.warn_default_schema(formats, config["event_details"] == "True", ip_enrichment)
+        job = {
+            "count": count,
+            "servers_query": servers_query,
+            "users_query": users_query,
+            "formats": formats,
+            "seed": seed,
+            "event_mix": self.event_manager.event_mix,
+            "event_details": config["event_details"] == "True",
+            "ip_enrichment": ip_enrichment,
+            "start_time": float(config["start_time"] or time.time()),
+            "event_rate": float(config["event_rate"]),
+            "eps": float(config["distributed_eps"]),
+            "rate": 0,
+            "chunk_size": int(config["distributed_chunk_size"]),
+            "prefix": f"events_{time.strftime('%Y%m%d_%H%M%S')}",
+            "schema": schema.fields if schema is not None else None,
+            "config": config
+        }
+        # Workers map the same snapshot file instead of getting the entities. The path is the one
+        # of this host, so remote workers need the file at the same path (e.g. on a shared file system)
+        if self.event_manager.snapshot is not None:
+            job["snapshot"] = os.path.abspath(self.event_manager.snapshot.path)
+            job["snapshot_version"] = pool.version
+        else:
+            job["entities"] = {"users": pool.users, "servers": pool.servers}
+        # Workers insert their events into the same database
+        if "mongo" in formats:
+            job["mongo"] = {"uri": self.data_manager.uri, "db": self.data_manager.db_name,
+                            "profiles": self.config_manager.get_connection_profiles()}
+
+        try:
+            addresses = self.coordinator.parse_workers(args[4])
+            print(f"Generating events on {len(addresses)} workers...")
+            summary = self.coordinator.run(job, addresses)
+        except (OSError, ValueError, IndexError) as e:
+            message = f"Distributed generation failed: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            self.coordinator.close({})
+            return
+
+        for worker in summary["workers"]:
+            print(f"{worker['address']}: {worker['events']} events in {worker['chunks']} chunks "
+                  f"({worker['eps']:.0f} events/s)")
+        for output in summary["outputs"]:
+            if output["format"] == "mongo":
+                print(f"{Colors.OKGREEN}{output['events']} events exported to the 'events' collection "
+                      f"(run '{output['filename']}'){Colors.ENDC}")
+            elif output["filename"]:
+                print(f"{Colors.OKGREEN}{output['events']} events exported to {output['filename']}{Colors.ENDC}")
+        # Files of lost remote workers end with events that were generated again by the others
+        for output in summary["partial"]:
+            if output["format"] == "mongo":
+                message = f"Run '{output['filename']}' of a lost worker may hold events that were generated again."
+            else:
+                message = (f"'{output['filename']}' of a lost worker only holds {output['events']} valid events: "
+                           f"truncate it at byte {output['offset']} before using it.")
+            print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+            self.logger.warning(message)
+        message = (f"{summary['events']} events generated successfully in {summary['seconds']:.1f}s "
+                   f"({summary['eps']:.0f} events/s)!")
+        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
+        self.logger.info(message)
+
+    def do_merge(self, arg):
+        """
+        Merges time-sorted event files (e.g. the files of each worker of a distribute run) into
+        a single time-ordered stream, exported in the given formats. The shards can be in any
+        file format (log, ndjson, json, csv, tsv, xml), compressed or not, and are read in buffers of
+        'merge_buffer_size' bytes, never fully loaded into memory. Events slightly out of order
+        within a shard (up to 'merge_reorder_window' events away from their place) are put back in order,
+        and the merge fails if an event is further than that.
+        Usage: merge <export_format> <shard> [shard ...]
+        Examples of usage:
+        - merge log events_20240101_120000_w*.log : Merges the log files of every worker into one.
+        - merge json,csv a.log.gz b.json c.csv : Merges shards of different formats into a json and a csv file.
+        :param arg: [String] export format(s), [String] Shard files or patterns
+        """
+
+        args = arg.split()
+        usage = "Usage: merge <export_format> <shard> [shard ...]"
+        if len(args) < 2:
+            print(f"{Colors.OKCYAN}{usage}{Colors.ENDC}")
+            return
+        formats = self.export_manager.verify_export_formats(args[0])
+        if not formats:
+            return
+
+        config = self.config_manager.get_global_config("merge_buffer_size", "merge_reorder_window")
+        merger = ShardMerger(None, int(config["merge_buffer_size"]), int(config["merge_reorder_window"]))
+        # Patterns are expanded here, since the shell doesn't do it
+        shards = []
+        for pattern in args[1:]:
+            shards.extend(sorted(glob.glob(pattern)) or [pattern])
+        for shard in shards:
+            if not os.path.isfile(shard) or merger.get_format(shard) is None:
+                message = f"'{shard}' isn't an event file that can be merged."
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.error(message)
+                return
+        # Only csv and tsv shards need the columns of the schema to be read
+        if any(merger.get_format(shard) in ("csv", "tsv") for shard in shards):
+            merger.schema = self.export_manager.get_schema()
+            if merger.schema is None:
+                return
+
+        prefix = f"merged_{time.strftime('%Y%m%d_%H%M%S')}"
+        if any(self.export_manager.build_filename(format_str, prefix) in shards for format_str in formats):
+            print(f"{Colors.FAIL}The merged file would overwrite one of the shards.{Colors.ENDC}")
             return
-        users = self.data_manager.read_doc("users", users_query)
-        if len(list(users)) <= 0:
-            message = f"No users found with query {servers_query}."
+        sinks = self.export_manager.open_sinks(formats, prefix=prefix)
+        if sinks is None:
+            return
+        print(f"Merging {len(shards)} shards...")
+        try:
+            count = merger.merge(shards, sinks)
+            self.export_manager.close_sinks(sinks)
+        except (OSError, ValueError, KeyError, SinkError) as e:
+            message = f"Merge failed, the merged files are incomplete: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            self.export_manager.discard_sinks(sinks)
+            return
+        message = f"{count} events merged from {len(shards)} shards."
+        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
+        self.logger.info(message)
+
+    def do_replay(self, arg):
+        """
+        Replays an exported event file (log, ndjson, csv or tsv, uncompressed) to new files in the
+        given formats, with the original time between events, N times faster, or as fast as possible.
+        The file is memory-mapped and read through a line index, built the first time and saved
+        next to it ('<file>.lines'). With 'now', the timestamps are moved to the time of the replay.
+        Usage: replay <file> <export_format> [max|<speed>] [now]
+        Examples of usage:
+        - replay events_20240101_120000.log log : Replays the events with their original pacing.
+        - replay events_20240101_120000.csv ndjson 60 now : Replays an hour of events per minute, timestamped now.
+        - replay events_20240101_120000.ndjson json max : Replays the events as fast as possible.
+        :param arg: [String] Event file, [String] export format(s), [String] speed, [String] now
+        """
+
+        args = arg.split()
+        usage = "Usage: replay <file> <export_format> [max|<speed>] [now]"
+        rewrite_now = len(args) > 2 and args[-1] == "now"
+        if rewrite_now:
+            args.pop()
+        if len(args) not in (2, 3):
+            print(f"{Colors.OKCYAN}{usage}{Colors.ENDC}")
+            return False
+        speed = 1.0
+        if len(args) == 3:
+            try:
+                speed = None if args[2] == "max" else float(args[2])
+            except ValueError:
+                speed = 0
+            if speed is not None and speed <= 0:
+                print(f"{Colors.FAIL}The speed must be 'max' or a number greater than 0.{Colors.ENDC}")
+                return False
+        formats = self.export_manager.verify_export_formats(args[1])
+        if not formats:
+            return False
+
+        path = args[0]
+        prefix = self.export_prefix or f"replay_{time.strftime('%Y%m%d_%H%M%S')}"
+        if any(self.export_manager.build_filename(format_str, prefix) == path for format_str in formats):
+            print(f"{Colors.FAIL}The replayed file would overwrite '{path}'.{Colors.ENDC}")
+            return False
+        schema = None
+        if path.rsplit(".", 1)[-1] in ("csv", "tsv"):
+            schema = self.export_manager.get_schema()
+            if schema is None:
+                return False
+        try:
+            replayer = EventReplayer(path, schema)
+        except (OSError, ValueError) as e:
+            message = f"Can't replay '{path}': {e}"
             print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+
+        sinks = self.export_manager.open_sinks(formats, prefix=prefix)
+        if sinks is None:
+            replayer.close()
+            return False
+        tick = None
+        if self.job is not None:
+            self.job.set_total(replayer.count)
+            tick = self.job.tick
+        print(f"Replaying {replayer.count} events at {'max speed' if speed is None else f'{speed:g}x'}...")
+        try:
+            count = replayer.replay(sinks, speed, rewrite_now, tick)
+            self.export_manager.close_sinks(sinks)
+        except (ValueError, KeyError, IndexError, OSError, SinkError) as e:
+            message = f"Replay failed, the replayed files are incomplete: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            self.export_manager.discard_sinks(sinks)
+            return False
+        finally:
+            replayer.close()
+
+        if self.job is not None and self.job.cancelled:
+            print(f"{Colors.WARNING}Replay cancelled after {count} events.{Colors.ENDC}")
+            return
+        message = f"{count} events replayed from '{path}'."
+        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
+        self.logger.info(message)
+
+    def do_snapshot(self, arg):
+        """
+        Saves users and servers to a snapshot file, or loads one to generate events
+        without touching MongoDB. A loaded snapshot is memory-mapped, so it's ready
+        right away and every process using it (e.g. local distribute workers) shares it.
+        Generating from a snapshot only supports {} or {"group":"<name>"} queries.
+        Usage: snapshot [save <file> <servers_query> <users_query> | load <file> | unload]
+        Examples of usage:
+        - snapshot save entities.snap {} {} : Saves every server and user to 'entities.snap'.
+        - snapshot save sales.snap {"group":"sales"} {"group":"sales"} : Saves the servers and users of group "sales".
+        - snapshot load entities.snap : Uses 'entities.snap' for the next generate_events and distribute commands.
+        - snapshot unload : Goes back to reading users and servers from MongoDB.
+        - snapshot : Shows the loaded snapshot.
+        :param arg: [String] Action, [String] File, [Dict] Servers query in JSON format,
+        [Dict] Users query in JSON format
+        """
+
+        args = arg.split()
+        usage = "Usage: snapshot [save <file> <servers_query> <users_query> | load <file> | unload]"
+        action = args[0] if args else ""
+        snapshot = self.event_manager.snapshot
+
+        if not args:
+            if snapshot is None:
+                print("No snapshot loaded.")
+            else:
+                print(f"Snapshot '{snapshot.path}': {snapshot.n_users} users, {snapshot.n_servers} servers "
+                      f"(version {snapshot.version}).")
+        elif action == "save" and self.verify_arguments(args, 4, usage):
+            if not self.database_available():
+                return
+            is_valid_s, servers_query = self.validate_query(args[2])
+            is_valid_u, users_query = self.validate_query(args[3])
+            if not is_valid_s or not is_valid_u:
+                return
+            # Sorted by group, so the entities of each group end up next to each other
+            order = [("group", 1), ("_id", 1)]
+            users = self.data_manager.read_doc("users", users_query, {field: 1 for field in USER_FIELDS},
+                                               batch_size=10000).sort(order)
+            servers = self.data_manager.read_doc("servers", servers_query, {field: 1 for field in SERVER_FIELDS},
+                                                 batch_size=10000).sort(order)
+            n_users, n_servers, version = write_snapshot(args[1], users, servers)
+            message = f"Snapshot saved to {args[1]}: {n_users} users, {n_servers} servers (version {version})."
+            print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
             self.logger.info(message)
+        elif action in ("load", "unload") and self.job_manager.active():
+            print(f"{Colors.FAIL}The snapshot can't be changed while background jobs are running.{Colors.ENDC}")
+        elif action == "load" and self.verify_arguments(args, 2, usage):
+            try:
+                new_snapshot = EntitySnapshot(args[1])
+            except (OSError, ValueError) as e:
+                message = f"Couldn't load snapshot '{args[1]}': {e}"
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.error(message)
+                return
+            if snapshot is not None:
+                snapshot.close()
+            self.event_manager.use_snapshot(new_snapshot)
+            message = (f"Snapshot '{args[1]}' loaded: {new_snapshot.n_users} users, "
+                       f"{new_snapshot.n_servers} servers.")
+            print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
+        elif action == "unload" and self.verify_arguments(args, 1, usage):
+            if snapshot is None:
+                print("No snapshot loaded.")
+                return
+            if not self.database_available():
+                return
+            self.event_manager.use_snapshot(None)
+            snapshot.close()
+            print(f"{Colors.OKGREEN}Snapshot unloaded.{Colors.ENDC}")
+        elif action not in ("save", "load", "unload"):
+            print(f"{Colors.OKCYAN}{usage}{Colors.ENDC}")
+
+    def do_resume(self, arg):
+        """
+        Resumes an interrupted generate_events run from its last checkpoint.
+        The events are appended to the same exported files. A seeded run produces the
+        same files it would have produced if it had never been interrupted.
+        Given a job number instead, resumes a paused background job.
+        Usage: resume <checkpoint_file|job>
+        Examples of usage:
+        - resume events_20240101_120000.log.checkpoint.json
+        - resume 2 : Resumes background job 2.
+        :param arg: [String] Checkpoint file or job number
+        """
+
+        # Verifies number of arguments passed
+        args = arg.split()
+        if not self.verify_arguments(args, 1, "Usage: resume <checkpoint_file|job>"):
+            return False
+
+        # A number is a paused background job
+        if args[0].isdigit():
+            background_job = self.job_manager.get(args[0])
+            if background_job is None:
+                print(f"{Colors.FAIL}Job {args[0]} doesn't exist.{Colors.ENDC}")
+                return False
+            if background_job.state != "paused":
+                print(f"{Colors.FAIL}Job {args[0]} isn't paused ({background_job.state}).{Colors.ENDC}")
+                return False
+            background_job.resume()
+            print(f"{Colors.OKGREEN}Job {args[0]} resumed.{Colors.ENDC}")
             return
 
-        # For each event generated within the 'for' iteration, the event
-        # will be appended to the list events
+        checkpoint_path = args[0].strip()
+        job = self.checkpoint_manager.load(checkpoint_path)
+        if not job:
+            return False
+
+        # The entities must be the same ones the run started with,
+        # otherwise the random picks would land on different documents
+        pool = self.load_entities(job["users_query"], job["servers_query"])
+        if pool is None:
+            return False
+        if pool.version != job["snapshot_version"]:
+            message = (f"Users or servers changed since the checkpoint was saved "
+                       f"(version {pool.version}, expected {job['snapshot_version']}). Can't resume.")
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        self.event_manager.set_state(job)
+        self.event_manager.set_event_mix(job["event_mix"])
+        # Checkpoints saved before events had action details don't have the key
+        if not self.apply_event_details(job.get("event_details", False)):
+            return False
+        if self.apply_ip_enrichment(job.get("ip_enrichment", [])) is None:
+            return False
+        self.warn_default_schema([output["format"] for output in job["outputs"]], job.get("event_details", False),
+                                 job.get("ip_enrichment", []))
+
+        # Reopens the exported files at the offsets of the checkpoint
+        try:
+            sinks = self.export_manager.open_sinks(outputs=job["outputs"])
+        except FileNotFoundError as e:
+            message = f"Exported file '{e.filename}' doesn't exist. Can't resume."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return False
+        if sinks is None:
+            return False
+
+        print(f"Resuming from event {job['events_emitted']} of {job['count']}...")
+        self.logger.info(f"Resuming run from checkpoint '{checkpoint_path}'.")
+        return self.run_generation(job, sinks, checkpoint_path)
+
+    def get_checkpoint_path(self, sinks):
+        """
+        Gets the checkpoint file of a run, stored next to its first exported file.
+        :param sinks: [EventFanout] Sinks of the run.
+        :return: [String] Checkpoint file, or None if nothing is exported to a file
+        """
+
+        for writer in sinks.writers:
+            if writer.filename is not None:
+                return self.checkpoint_manager.checkpoint_path(writer.filename)
+        return None
+
+    def run_generation(self, job, sinks, checkpoint_path):
+        """
+        Generates the remaining events of a job and streams them to the sinks.
+        Saves a checkpoint every 'checkpoint_interval' events.
+        :param job: [Dictionary] Job parameters and progress.
+        :param sinks: [EventFanout] Sinks the events are exported to.
+        :param checkpoint_path: [String] Checkpoint file, or None to disable checkpoints.
+        :return: False if the generation failed
+        """
+
+        stats = self.open_stats(job)
+        injector = self.open_injector(job, sinks)
+        try:
+            self.generate_job_events(job, sinks, checkpoint_path, stats, injector)
+        except (SinkError, OSError) as e:
+            # The last checkpoint is kept: it only points at data that was synced before it was saved
+            message = f"Generation failed after {job['events_emitted']} of {job['count']} events: {e}."
+            if checkpoint_path and os.path.exists(checkpoint_path):
+                message += f" It can be resumed with 'resume {checkpoint_path}' once the problem is fixed."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            if injector is not None:
+                injector.close()
+            self.export_manager.discard_sinks(sinks)
+            return False
+
+    def generate_job_events(self, job, sinks, checkpoint_path, stats, injector):
+        """
+        Generation loop of run_generation.
+        :param job: [Dictionary] Job parameters and progress.
+        :param sinks: [EventFanout] Sinks the events are exported to.
+        :param checkpoint_path: [String] Checkpoint file, or None to disable checkpoints.
+        :param stats: [EventStats] Statistics of the job, or None if it doesn't keep them.
+        :param injector: [CampaignInjector] Campaigns of the job, or None if it has none.
+        :raises SinkError: If a sink failed
+        :raises OSError: If a checkpoint or the labels of the campaigns couldn't be written
+        """
+
+        interval = self.checkpoint_manager.get_interval()
+        verbose = self.config_manager.get_global_config("shell_verbose")["shell_verbose"] == "True"
+        if checkpoint_path:
+            self.save_checkpoint(job, sinks, checkpoint_path, stats, injector)
+
+        def emit(event):
+            self.event_manager.enrich(event)
+            sinks.write(event)
+            if stats is not None:
+                stats.add(event)
+            if verbose:
+                print(f"{event}")
+
+        # Each generated event is handed to the sinks right away instead
+        # of being appended to a list and exported at the end
         print("Generating events...")
-        events = []
-        for i in range(count):
-            event = self.event_manager.generate_event(users_query, servers_query)
+        if self.job is not None:
+            self.job.set_total(job["count"], job["events_emitted"])
+        for i in range(job["events_emitted"], job["count"]):
+            event = self.event_manager.generate_event(job["users_query"], job["servers_query"])
             if event:
-                events.append(event)
-                print(f"{event}")
+                # Campaign events due before this one go first, so the stream stays in time order
+                if injector is not None:
+                    for campaign_event in injector.pop_until(event["timestamp"], i + job["injected_emitted"]):
+                        emit(campaign_event)
+                    job["injected_emitted"] = injector.injected
+                    job["start_time"] = injector.start_time
+                # The sequence number is the position of the event in the exported stream
+                event["sequence"] = i + job.get("injected_emitted", 0)
+                emit(event)
+            job["events_emitted"] = i + 1
+            if checkpoint_path and job["events_emitted"] % interval == 0:
+                self.save_checkpoint(job, sinks, checkpoint_path, stats, injector)
+            if self.job is not None and not self.job.tick():
+                break
+
+        if job["events_emitted"] < job["count"]:
+            # A cancelled background job keeps its checkpoint, so it can be resumed later
+            message = f"Cancelled after {job['events_emitted']} of {job['count']} events."
+            if checkpoint_path:
+                self.save_checkpoint(job, sinks, checkpoint_path, stats, injector)
+                message += f" It can be resumed with 'resume {checkpoint_path}'."
+            if injector is not None:
+                injector.close()
+            self.export_manager.close_sinks(sinks)
+            print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+            self.logger.warning(message)
+            return
 
-        message = f"{count} events generated successfully!"
+        # Failures of the sinks are raised here rather than after the success is reported
+        sinks.sync()
+        message = f"{job['count']} events generated successfully!"
         print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
         self.logger.info(message)
+        if injector is not None:
+            self.close_injector(injector)
+
+        self.export_manager.close_sinks(sinks)
+        if stats is not None:
+            self.report_stats(stats, sinks)
+        if checkpoint_path:
+            self.checkpoint_manager.remove(checkpoint_path)
+
+    def open_injector(self, job, sinks):
+        """
+        Prepares the attack campaigns of a job, and opens their labels file next to its
+        first exported file ('<export_file>.labels.jsonl'). Jobs without a start time
+        get their campaigns anchored to their first generated event, which is then
+        stored as their start time so a resumed job injects the same events.
+        :param job: [Dictionary] Job parameters and progress.
+        :param sinks: [EventFanout] Sinks of the run.
+        :return: CampaignInjector, or None if the job has no campaigns
+        """
+
+        if not job.get("campaigns"):
+            return None
+        injector = CampaignInjector(job["campaigns"], job["campaign_seed"], job["start_time"],
+                                    self.event_manager.entity_pool, self.event_manager.build_event,
+                                    job["injected_emitted"])
+        for writer in sinks.writers:
+            if writer.filename is not None:
+                injector.open_labels(f"{writer.filename}.labels.jsonl", job["labels_offset"])
+                break
+        return injector
+
+    def close_injector(self, injector):
+        """
+        Closes the labels file of the campaigns and reports what was injected.
+        :param injector: [CampaignInjector] Campaigns of the run.
+        """
+
+        left_out = injector.close()
+        message = f"{injector.injected} campaign events injected"
+        if injector.labels_path:
+            message += f", labels saved to {injector.labels_path}"
+        print(f"{Colors.OKGREEN}{message}.{Colors.ENDC}")
+        self.logger.info(message)
+        if left_out:
+            message = f"{left_out} campaign events fall after the last generated event and were left out."
+            print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+            self.logger.warning(message)
+
+    def open_stats(self, job):
+        """
+        Gets the statistics of a job: new ones if the 'event_stats' config is enabled,
+        or the ones stored in its checkpoint if the job is being resumed.
+        :param job: [Dictionary] Job parameters and progress.
+        :return: EventStats, or None if the job doesn't keep statistics
+        """
+
+        if "stats" in job:
+            if job["stats"] is None:
+                return None
+            stats = EventStats()
+            stats.set_state(job["stats"])
+            return stats
+        config = self.config_manager.get_global_config("event_stats", "stats_interval")
+        if config["event_stats"] != "True":
+            return None
+        return EventStats(int(config["stats_interval"]))
+
+    def report_stats(self, stats, sinks):
+        """
+        Prints the statistics of a run and saves them next to its first exported file
+        ('<export_file>.stats.json').
+        :param stats: [EventStats] Statistics of the run.
+        :param sinks: [EventFanout] Sinks the events were exported to.
+        """
+
+        for line in stats.report():
+            print(line)
+        for writer in sinks.writers:
+            if writer.filename is not None:
+                path = f"{writer.filename}.stats.json"
+                stats.save(path)
+                print(f"{Colors.OKGREEN}Statistics saved to {path}{Colors.ENDC}")
+                return
+
+    def save_checkpoint(self, job, sinks, checkpoint_path, stats=None, injector=None):
+        """
+        Stores the progress of a job: events emitted, generator state, output offsets and statistics.
+        :param job: [Dictionary] Job parameters and progress.
+        :param sinks: [EventFanout] Sinks the events are exported to.
+        :param checkpoint_path: [String] Checkpoint file.
+        :param stats: [EventStats] Statistics of the job, or None if it doesn't keep them.
+        :param injector: [CampaignInjector] Campaigns of the job, or None if it has none.
+        """
+
+        # Every sink must have written the events emitted so far before their offsets are read,
+        # and they must be on disk before the checkpoint is, or a crash could leave it pointing past them
+        sinks.sync()
+        for writer in sinks.writers:
+            try:
+                writer.sync()
+            except (OSError, errors.PyMongoError) as e:
+                # e.g. an insert of the 'mongo' format that was still running
+                raise SinkError(f"Sink '{writer.filename}' failed: {e}") from e
+        job.update(self.event_manager.get_state())
+        job["stats"] = stats.get_state() if stats is not None else None
+        if injector is not None:
+            job["labels_offset"] = injector.tell()
+        job["outputs"] = [{"format": format_str, "filename": writer.filename,
+                           "offset": writer.tell(), "events": writer.count}
+                          for format_str, writer in zip(job["formats"], sinks.writers)]
+        self.checkpoint_manager.save(checkpoint_path, job)
+
+    def background_shell(self, job):
+        """
+        Gets a copy of the shell to run a background job with. It has its own event
+        generator, so jobs don't share random state, clock or entities, and its own
+        export file names. The managers and the database connections are shared.
+        :param job: [BackgroundJob] Job the copy reports its progress to.
+        :return: PyEventGenShell
+        """
+
+        shell = copy.copy(self)
+        shell.event_manager = VirtualEventGen(self.config_manager, self.data_manager)
+        if self.event_manager.snapshot is not None:
+            shell.event_manager.use_snapshot(self.event_manager.snapshot)
+        shell.job = job
+        shell.export_prefix = f"events_{time.strftime('%Y%m%d_%H%M%S')}_job{job.id}"
+        return shell
+
+    def get_background_job(self, arg, usage):
+        """
+        Gets the background job given as argument of a jobs command.
+        :param arg: [String] Job number.
+        :param usage: [String] Usage of the command.
+        :return: BackgroundJob, or None if there's no such job
+        """
+
+        args = arg.split()
+        if not self.verify_arguments(args, 1, usage):
+            return None
+        job = self.job_manager.get(args[0])
+        if job is None:
+            print(f"{Colors.FAIL}Job {args[0]} doesn't exist.{Colors.ENDC}")
+        return job
+
+    def do_bg(self, arg):
+        """
+        Runs a command as a background job, so the shell can be used while it runs.
+        Several jobs can run at the same time. What a job prints is kept with the job
+        (see status) instead of being shown in the shell.
+        Usage: bg <command> [arguments]
+        Commands: generate_events, resume (of a checkpoint), create_users, create_servers and replay.
+        Examples of usage:
+        - bg generate_events 10000000 {"group":"sales"} {"group":"sales"} log 1 : Generates events in the background.
+        - bg create_users 1000000 user user sales : Creates users in the background.
+        :param arg: [String] Command with its arguments
+        """
+
+        command = arg.strip()
+        name = command.split()[0] if command else ""
+        if name not in self.background_commands:
+            print(f"{Colors.OKCYAN}Usage: bg <command> [arguments]. "
+                  f"Commands: {', '.join(self.background_commands)}{Colors.ENDC}")
+            return
+        job = self.job_manager.start(command, lambda job: self.background_shell(job).onecmd(command))
+        print(f"{Colors.OKGREEN}Job {job.id} started: {command}{Colors.ENDC}")
+
+    def do_jobs(self, arg):
+        """
+        Lists the background jobs with their state, progress and live throughput.
+        Usage: jobs
+        """
+
+        if not self.job_manager.jobs:
+            print("No background jobs.")
+            return
+        print(f"{'job':<5}{'state':<12}{'progress':>22}{'per second':>12}{'elapsed':>10}  command")
+        for job in self.job_manager.jobs.values():
+            progress = f"{job.progress}/{job.total}" if job.total else f"{job.progress}"
+            print(f"{job.id:<5}{job.state:<12}{progress:>22}{job.rate():>12.0f}{job.elapsed():>9.0f}s  {job.command}")
+
+    def do_status(self, arg):
+        """
+        Shows the state, progress, live throughput and last output lines of a background job.
+        Usage: status <job>
+        Example of usage:
+        - status 1
+        :param arg: [int] Job number
+        """
+
+        job = self.get_background_job(arg, "Usage: status <job>")
+        if job is None:
+            return
+        print(f"Job {job.id}: {job.command}")
+        print(f"  State: {job.state}" + (f" ({job.error})" if job.error else ""))
+        if job.total:
+            print(f"  Progress: {job.progress} of {job.total} ({job.progress / job.total:.1%})")
+        else:
+            print(f"  Progress: {job.progress}")
+        print(f"  Throughput: {job.rate():.0f}/s now, {job.progress / max(job.elapsed(), 1e-9):.0f}/s on average")
+        print(f"  Elapsed: {job.elapsed():.1f}s")
+        for line in list(job.output)[-10:]:
+            print(f"  | {line}")
+
+    def do_pause(self, arg):
+        """
+        Pauses a background job. It's continued with 'resume <job>'.
+        Usage: pause <job>
+        :param arg: [int] Job number
+        """
+
+        job = self.get_background_job(arg, "Usage: pause <job>")
+        if job is None:
+            return
+        if job.state != "running":
+            print(f"{Colors.FAIL}Job {job.id} isn't running ({job.state}).{Colors.ENDC}")
+            return
+        job.pause()
+        print(f"{Colors.OKGREEN}Job {job.id} paused.{Colors.ENDC}")
+
+    def do_cancel(self, arg):
+        """
+        Cancels a background job. A cancelled generate_events job saves its checkpoint,
+        so it can still be finished with 'resume <checkpoint_file>'.
+        Usage: cancel <job>
+        :param arg: [int] Job number
+        """
+
+        job = self.get_background_job(arg, "Usage: cancel <job>")
+        if job is None:
+            return
+        if job.state not in ("running", "paused"):
+            print(f"{Colors.FAIL}Job {job.id} isn't running ({job.state}).{Colors.ENDC}")
+            return
+        job.cancel()
+        print(f"{Colors.OKGREEN}Job {job.id} is being cancelled.{Colors.ENDC}")
+
+    def do_profile(self, arg):
+        """
+        Runs a shell command under the profiler and shows where its time and memory go.
+        cpu shows the functions with the most time in the shell thread (cProfile), memory shows
+        the peak memory and the allocation sites still holding memory when the command finished
+        (tracemalloc), and all shows both. If the 'profile_collapsed' config is set, the stacks
+        of every thread are also sampled and written to that file in collapsed format, for
+        flame graph tools (flamegraph.pl, speedscope...).
+        Usage: profile [cpu|memory|all] <command> [arguments]
+        Examples of usage:
+        - profile generate_events 100000 {} {} log 42 : Shows the top functions of a seeded run.
+        - profile memory create_users 100000 user user sales : Shows the memory used to create users.
+        - profile all snapshot save entities.snap {} {} : Shows both for saving a snapshot.
+        :param arg: [String] Optional mode, [String] Command with its arguments
+        """
+
+        usage = "Usage: profile [cpu|memory|all] <command> [arguments]"
+        args = arg.split(maxsplit=1)
+        mode = "cpu"
+        if args and args[0] in PROFILE_MODES:
+            mode = args.pop(0)
+        if not args:
+            print(f"{Colors.OKCYAN}{usage}{Colors.ENDC}")
+            return
+
+        command = " ".join(args).strip()
+        name = command.split()[0]
+        if name == "profile" or not hasattr(self, f"do_{name}"):
+            message = f"Can't profile '{name}'. Please provide a shell command to profile."
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return
+        sort = self.config_manager.get_global_config("profile_sort")["profile_sort"]
+        if sort not in PROFILE_SORTS:
+            print(f"{Colors.FAIL}Invalid profile_sort '{sort}'. Options: {', '.join(PROFILE_SORTS)}{Colors.ENDC}")
+            return
+
+        try:
+            lines = self.profiler.run(self.onecmd, command, mode)
+        except OSError as e:
+            message = f"Couldn't write the profile: {e}"
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            self.logger.error(message)
+            return
+        print(f"{Colors.OKGREEN}{lines[0]}{Colors.ENDC}")
+        for line in lines[1:]:
+            print(line)
+
+    def do_config(self, arg):
+        """
+        Shows or modifies the global configuration.
+        Usage: config [attribute] [value]
+        Examples of usage:
+        - config : Shows the whole global configuration.
+        - config page_size : Shows the value of 'page_size'.
+        - config page_size 50 : Sets 'page_size' to 50.
+        - config bulk.compressors zlib : Sets the wire compression of the 'bulk' connection profile.
+        MongoDB connection profiles are set with '<profile>.<setting>'. A new profile name creates
+        a profile, and a changed profile takes effect the next time it's applied.
+        :param arg: [String] Optional attribute, [String] Optional new value
+        """
+
+        # Verifies number of arguments passed
+        args = arg.split(maxsplit=1)
+        if not self.verify_arguments(args, 0, "Usage: config [attribute] [value]", num_optional=2):
+            return
+
+        if len(args) == 2:
+            attribute, value = args[0], args[1].strip()
+            # Values are checked here, so a bad one can't break the commands that read it later
+            reason = self.config_manager.validate_value(attribute.split(".", 1)[-1], value)
+            if reason is not None:
+                message = f"Invalid value '{value}' for '{attribute}': {reason}."
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.error(message)
+                return
+            if "." in attribute:
+                profile, setting = attribute.split(".", 1)
+                is_set = self.config_manager.set_connection_profile(profile, setting, value)
+                if is_set and self.data_manager is not None and self.data_manager.profile == profile:
+                    # Forces the profile in use to be applied again with the new value
+                    self.data_manager.profile = None
+                    self.data_manager.apply_profile(profile)
+            elif (attribute in ("connection_profile", "bulk_connection_profile")
+                  and value not in self.config_manager.get_connection_profiles()):
+                message = f"Connection profile '{value}' doesn't exist."
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                return
+            else:
+                is_set = self.config_manager.set_global_config(attribute, value)
+                if attribute == "connection_profile" and self.data_manager is not None:
+                    self.data_manager.apply_profile(value)
+            if not is_set:
+                message = f"Config attribute '{attribute}' doesn't exist."
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                return
+            print(f"{Colors.OKGREEN}'{attribute}' set to '{value}'.{Colors.ENDC}")
+            return
+
+        if args and "." in args[0]:
+            profile, setting = args[0].split(".", 1)
+            settings = self.config_manager.get_connection_profiles().get(profile, {})
+            if setting in settings:
+                print(f"{args[0]} = {settings[setting]}")
+            return
 
-        # Exports the generated events in 'events' list
-        # and exports it in the format specified by the user
-        self.export_manager.export(events, format_str)
+        for attribute, value in self.config_manager.get_global_config(*args).items():
+            print(f"{attribute} = {value}")
+        if not args:
+            for profile, settings in self.config_manager.get_connection_profiles().items():
+                for setting, value in settings.items():
+                    print(f"{profile}.{setting} = {value}")
 
     def do_clear(self, arg):
         """
@@ -481,7 +1627,12 @@ class PyEventGenShell(cmd.Cmd):
         if not self.verify_arguments(args, 0, "Usage: exit"):
             return
 
+        active = self.job_manager.active()
+        if active:
+            print(f"{Colors.WARNING}{len(active)} background jobs are running, they will be cancelled.{Colors.ENDC}")
         if self.get_confirmation():
+            # Cancelled generation jobs save their checkpoint before the shell exits
+            self.job_manager.cancel_all()
             print(f"{Colors.OKGREEN}Exiting...{Colors.ENDC}")
             self.logger.info(f"Exiting the program (Exit command executed).")
             exit(0)
@@ -509,5 +1660,8 @@ class PyEventGenShell(cmd.Cmd):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PyEventGen interactive shell.")
+    parser.add_argument("--snapshot", help="Start from an entity snapshot file, without connecting to MongoDB.")
+    args = parser.parse_args()
     setup_logging()
-    PyEventGenShell().cmdloop()
+    PyEventGenShell(args.snapshot).cmdloop()
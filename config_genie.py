@@ -1,4 +1,5 @@
 import logging
+import math
 
 
 class ConfigGenie:
@@ -7,7 +8,114 @@ class ConfigGenie:
         # Global Configuration
         self._global_config = {
             "shell_verbose": "True",  # just some examples on how this could be used
-            "log_level": "INFO"
+            "log_level": "INFO",
+            "page_size": "20",  # documents shown per page by read, update and remove
+            "checkpoint_interval": "100000",  # events generated between two checkpoints
+            "event_rate": "10",  # events per simulated second in seeded runs
+            "start_time": "",  # epoch seconds of the first event in seeded runs (empty = now)
+            "event_mix": "",  # JSON file with the weight of each event type (empty = uniform)
+            "event_details": "True",  # adds action specific details (file paths, processes, ports...) to events
+            "ip_enrichment": "",  # comma separated CSV tables of IP ranges added to the events (empty = none)
+            "ip_enrichment_fields": "user_ip,server_ip",  # event details looked up in the IP tables
+            "ip_enrichment_cache": "65536",  # IPs whose enrichment fields are kept in memory
+            "entity_sampling": "False",  # samples users and servers from MongoDB when they don't fit in the reservoir
+            "sample_reservoir_size": "100000",  # users and servers kept in memory when sampling
+            "sample_batch_size": "5000",  # users or servers replaced in the reservoir per round trip
+            "export_compression": "none",  # none, gzip or xz
+            "compression_level": "6",
+            "compression_block_size": "4194304",  # uncompressed bytes per block
+            "compression_threads": "0",  # 0 = one thread per CPU
+            "compression_index": "True",  # writes a '<file>.idx' seek index of the blocks
+            "output_buffer_size": "1048576",  # bytes of events buffered per exported file before they're written
+            "output_fsync": "checkpoint",  # when exported files are synced to disk: none, close, checkpoint or always
+            "event_schema": "",  # JSON file with the csv/tsv columns (empty = default columns)
+            "sink_batch_size": "256",  # events handed to each sink thread at once
+            "sink_queue_size": "64",  # batches kept in memory per sink
+            "sink_overflow": "spill",  # when a sink falls behind: spill (to disk) or block (the generator)
+            "spill_dir": "",  # directory of the spill files (empty = system temp directory)
+            "distributed_chunk_size": "10000",  # events per chunk handed to a worker
+            "distributed_eps": "0",  # target events per second of a distributed job (0 = as fast as possible)
+            "connection_profile": "interactive",  # MongoDB connection profile used by the shell
+            "bulk_connection_profile": "bulk",  # MongoDB connection profile used while creating users and servers
+            "mongo_batch_size": "1000",  # events per insert of the 'mongo' export format
+            "mongo_inflight_batches": "4",  # inserts of the 'mongo' export format running at once
+            "events_ttl": "0",  # seconds the 'events' collection keeps events (0 = forever)
+            "event_stats": "True",  # keeps summary statistics of generate_events runs
+            "stats_interval": "60",  # seconds of event time per rate bucket of the statistics
+            "campaigns": "",  # JSON file with the attack campaigns injected by generate_events (empty = none)
+            "profile_top": "20",  # functions and allocation sites shown by profile
+            "profile_sort": "cumulative",  # order of the functions shown by profile: cumulative, tottime or calls
+            "profile_collapsed": "",  # file the sampled stacks of profile are written to (empty = no sampling)
+            "profile_sample_interval": "0.005",  # seconds between two stack samples
+            "profile_memory_frames": "1",  # frames kept per allocation by profile memory
+            "merge_buffer_size": "1048576",  # bytes read at once from each shard by merge
+            "merge_reorder_window": "10000"  # events of each shard merge sorts in memory to fix small disorder
+        }
+        # MongoDB connection profiles
+        # compressors: wire compression, in order of preference (zstd and snappy need
+        # the zstandard and python-snappy packages, zlib is always available)
+        # write_concern: 'w' of the writes (empty = server default), journal: 'True', 'False' or empty
+        # batch_size: documents per round trip when reading and inserting (0 = server default)
+        self._connection_profiles = {
+            "interactive": {
+                "max_pool_size": "10",
+                "compressors": "",
+                "write_concern": "",
+                "journal": "",
+                "read_preference": "primary",
+                "batch_size": "0"
+            },
+            "bulk": {
+                "max_pool_size": "4",
+                "compressors": "zstd,snappy,zlib",
+                "write_concern": "1",
+                "journal": "False",
+                "read_preference": "primary",
+                "batch_size": "1000"
+            }
+        }
+        # Values accepted by the settings that aren't free text: (type, minimum, maximum)
+        # for numbers, or the tuple of choices. Settings with an empty default also accept ''
+        self._empty_defaults = {attribute for attribute, value in self._global_config.items() if value == ""}
+        booleans = ("True", "False")
+        self._config_rules = {
+            "shell_verbose": booleans,
+            "log_level": ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"),
+            "page_size": (int, 1, None),
+            "checkpoint_interval": (int, 1, None),
+            "event_rate": (float, 0.000001, None),
+            "start_time": (float, 0, None),
+            "event_details": booleans,
+            "ip_enrichment_cache": (int, 0, None),
+            "entity_sampling": booleans,
+            "sample_reservoir_size": (int, 1, None),
+            "sample_batch_size": (int, 1, None),
+            "export_compression": ("none", "gzip", "xz"),
+            "compression_level": (int, 0, 9),
+            "compression_block_size": (int, 1, None),
+            "compression_threads": (int, 0, None),
+            "compression_index": booleans,
+            "output_buffer_size": (int, 1, None),
+            "output_fsync": ("none", "close", "checkpoint", "always"),
+            "sink_batch_size": (int, 1, None),
+            "sink_queue_size": (int, 1, None),
+            "sink_overflow": ("spill", "block"),
+            "distributed_chunk_size": (int, 1, None),
+            "distributed_eps": (float, 0, None),
+            "mongo_batch_size": (int, 1, None),
+            "mongo_inflight_batches": (int, 1, None),
+            "events_ttl": (int, 0, None),
+            "event_stats": booleans,
+            "stats_interval": (float, 0.000001, None),
+            "profile_top": (int, 1, None),
+            "profile_sort": ("cumulative", "tottime", "calls"),
+            "profile_sample_interval": (float, 0.000001, None),
+            "profile_memory_frames": (int, 1, None),
+            "merge_buffer_size": (int, 1, None),
+            "merge_reorder_window": (int, 0, None),
+            "max_pool_size": (int, 1, None),
+            "journal": ("True", "False", ""),
+            "batch_size": (int, 0, None)
         }
         # Group configuration
         self._group_config = {
@@ -29,11 +137,13 @@ class ConfigGenie:
         Example: set_config("dhcp", False)
         :param attribute: [String] The attribute to be modified
         :param new_value: [String or Boolean] The new value to be set to the specified attribute
+        :return: Boolean
         """
 
         # Verifies if attribute is allowed in global config
         if not attribute in self._global_config:
             self.logger.error(f"Attribute: '{attribute}' doesn't exist in '_configuration' dictionary.")
+            return False
 
         # Stores the old attribute value
         # and updates the attribute
@@ -42,6 +152,74 @@ class ConfigGenie:
 
         self.logger.info(
             f"Attribute '{attribute}' has been modified. Old value: '{old_value}', New value: '{new_value}'")
+        return True
+
+    def validate_value(self, attribute, value):
+        """
+        Verifies that a value is accepted by a global config attribute or a connection profile setting.
+        :param attribute: [String] Attribute, or setting of a connection profile.
+        :param value: [String] New value.
+        :return: [String] Why the value isn't valid, or None if it is
+        """
+
+        rule = self._config_rules.get(attribute)
+        if rule is None or (value == "" and attribute in self._empty_defaults):
+            return None
+        if isinstance(rule[0], str):
+            return None if value in rule else f"it must be one of {', '.join(repr(choice) for choice in rule)}"
+        kind, minimum, maximum = rule
+        try:
+            number = kind(value)
+        except ValueError:
+            number = None
+        # nan and inf pass the bounds (nan compares false to everything), but no setting can use them
+        if (number is None or not math.isfinite(number) or number < minimum
+                or (maximum is not None and number > maximum)):
+            name = "an integer" if kind is int else "a number"
+            bounds = f"from {minimum} to {maximum}" if maximum is not None else f"of at least {minimum:g}"
+            return f"it must be {name} {bounds}"
+        return None
+
+    def get_connection_profile(self, name):
+        """
+        Gets the settings of a MongoDB connection profile.
+        :param name: [String] Profile name
+        :return: Dictionary, or None if the profile doesn't exist
+        """
+
+        if name not in self._connection_profiles:
+            self.logger.error(f"Connection profile '{name}' doesn't exist.")
+            return None
+        return self._connection_profiles[name]
+
+    def get_connection_profiles(self):
+        """
+        Gets every MongoDB connection profile.
+        :return: Dictionary
+        """
+
+        return self._connection_profiles
+
+    def set_connection_profile(self, name, attribute, new_value):
+        """
+        Replaces the value of a setting of a MongoDB connection profile.
+        The profile is created, with the settings of 'interactive', if it doesn't exist.
+        :param name: [String] Profile name
+        :param attribute: [String] The setting to be modified
+        :param new_value: [String] The new value
+        :return: Boolean
+        """
+
+        if attribute not in self._connection_profiles["interactive"]:
+            self.logger.error(f"Attribute: '{attribute}' doesn't exist in connection profiles.")
+            return False
+
+        profile = self._connection_profiles.setdefault(name, dict(self._connection_profiles["interactive"]))
+        old_value = profile[attribute]
+        profile[attribute] = new_value
+        self.logger.info(f"Attribute '{attribute}' of connection profile '{name}' has been modified. "
+                         f"Old value: '{old_value}', New value: '{new_value}'")
+        return True
 
     def set_group_config(self, group, attribute, new_value):
         """
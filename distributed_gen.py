@@ -0,0 +1,735 @@
+import argparse
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from collections import deque
+from colors import Colors
+from config_genie import ConfigGenie
+from entity_pool import EntityPool
+from entity_snapshot import EntitySnapshot
+from event_schema import EventSchema
+from export_manager import ExportManager
+from log_config import setup_logging
+from phantom_data_manager import PhantomDataManager
+from sink_fanout import SinkError
+from virtual_event_gen import VirtualEventGen
+
+# Protocol between the coordinator and the workers: one JSON message per line over TCP.
+#
+# A worker opens every connection with a challenge, and only serves coordinators that answer it
+# with the HMAC-SHA256 of the nonce keyed with the secret of the worker:
+#   worker -> coordinator: {"type": "challenge", "nonce": "..."}
+#   coordinator -> worker: {"type": "hello", "digest": "..."}
+#
+# coordinator -> worker:
+#   {"type": "job", "job": {...}}             parameters and entities of the job
+#   {"type": "chunk", "start": n, "count": m} generate the events with sequence numbers [n, n + m)
+#   {"type": "revoke", "start": n}            give chunk n back if it hasn't started yet
+#   {"type": "rate", "rate": r}               events per second the worker must keep (0 = unthrottled)
+#   {"type": "stop"}                          close the exported files
+#   {"type": "shutdown"}                      exit the worker process
+# worker -> coordinator:
+#   {"type": "started", "start": n, "outputs": [...]}
+#   {"type": "progress", "start": n, "emitted": k, "eps": e}
+#   {"type": "done", "start": n, "count": m, "eps": e, "outputs": [...]}
+#   {"type": "revoked", "start": n}
+#   {"type": "error", "error": "..."}         the job couldn't be opened (e.g. a file missing on its host)
+#   {"type": "closed", "outputs": [...]}
+#
+# The outputs of 'started' and 'done' hold the offset of every exported file at that point, so when
+# a worker is lost the coordinator knows where the events of the chunks it completed end in its files.
+
+# Environment variable holding the secret shared by the coordinator and its workers
+SECRET_VARIABLE = "PYEVENTGEN_WORKER_SECRET"
+# Settings holding paths of the coordinator's host, which workers don't take from the job
+PATH_SETTINGS = ("event_mix", "ip_enrichment", "event_schema", "spill_dir", "campaigns", "profile_collapsed")
+
+# Seconds between progress reports
+REPORT_INTERVAL = 0.5
+# Chunks a worker holds at once (the one being generated plus the next ones)
+PREFETCH = 2
+
+
+def sign(secret, nonce):
+    # Answer to the challenge of a worker
+    return hmac.new(secret.encode("utf-8"), nonce.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class Connection:
+
+    def __init__(self, sock):
+        """
+        JSON lines connection over a TCP socket.
+        :param sock: [Socket] Connected socket.
+        """
+
+        self.sock = sock
+        self.reader = sock.makefile("rb")
+
+    def send(self, message):
+        self.sock.sendall((json.dumps(message, default=str) + "\n").encode("utf-8"))
+
+    def receive(self):
+        """
+        Waits for the next message.
+        :return: [Dictionary] Message, or None if the connection was closed
+        """
+
+        try:
+            line = self.reader.readline()
+        except OSError:
+            return None
+        if not line:
+            return None
+        return json.loads(line)
+
+    def close(self):
+        # Shutting the socket down first wakes up any thread blocked reading from it
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.reader.close()
+
+
+class GenerationWorker:
+
+    def __init__(self, host="127.0.0.1", port=0, secret=None):
+        """
+        Process that generates the chunks of events it gets from a coordinator.
+        :param host: [String] Address to listen on.
+        :param port: [int] Port to listen on. 0 picks a free one.
+        :param secret: [String] Secret coordinators must prove they know. If not given, any
+        coordinator that can connect is served, so it's only allowed on a loopback address.
+        :raises ValueError: If there's no secret and the address isn't a loopback one
+        """
+
+        if not secret and not is_loopback(host):
+            raise ValueError(f"Workers listening on '{host}' need a secret in {SECRET_VARIABLE}.")
+        self.secret = secret
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        self.config_manager = ConfigGenie()
+        self.export_manager = ExportManager(self.config_manager)
+        # Entities come from the coordinator, so the worker only connects to the
+        # database to export events to it (the 'mongo' format)
+        self.event_manager = VirtualEventGen(self.config_manager, None)
+        self.logger = logging.getLogger("GenerationWorker")
+
+        self.job = None
+        self.sinks = None
+        # Updated by the connection reader thread while a chunk is being generated
+        self.rate = 0
+        self.revoked = set()
+        self.logger.info(f"GenerationWorker listening on {host}:{self.port}.")
+
+    def serve(self):
+        """
+        Serves coordinators one after the other until one of them sends 'shutdown'.
+        """
+
+        while True:
+            sock, address = self.server.accept()
+            self.logger.info(f"Coordinator connected from {address}.")
+            connection = Connection(sock)
+            if not self.authenticate(connection):
+                self.logger.warning(f"Coordinator from {address} rejected: wrong secret.")
+                connection.close()
+                continue
+            keep_serving = self.handle(connection)
+            connection.close()
+            if not keep_serving:
+                break
+        self.server.close()
+        self.logger.info("GenerationWorker shut down.")
+
+    def authenticate(self, connection):
+        """
+        Challenges a coordinator to prove it knows the secret of the worker.
+        :param connection: [Connection] Coordinator connection.
+        :return: [Boolean] True if it does, or if the worker has no secret
+        """
+
+        nonce = secrets.token_hex(16)
+        try:
+            connection.send({"type": "challenge", "nonce": nonce})
+            message = connection.receive()
+        except (OSError, ValueError):
+            return False
+        if not isinstance(message, dict) or message.get("type") != "hello":
+            return False
+        if self.secret is None:
+            return True
+        if hmac.compare_digest(str(message.get("digest")), sign(self.secret, nonce)):
+            return True
+        try:
+            connection.send({"type": "error", "error": "The worker rejected the secret of the coordinator."})
+        except OSError:
+            pass
+        return False
+
+    def read_messages(self, connection, messages):
+        # Rate changes and revokes are applied right away, everything else is queued
+        while True:
+            message = connection.receive()
+            if message is None:
+                messages.put(None)
+                return
+            if message["type"] == "rate":
+                self.rate = message["rate"]
+            elif message["type"] == "revoke":
+                self.revoked.add(message["start"])
+            else:
+                messages.put(message)
+
+    def handle(self, connection):
+        """
+        Runs the messages of a coordinator.
+        :param connection: [Connection] Coordinator connection.
+        :return: [Boolean] False if the worker must shut down
+        """
+
+        messages = queue.Queue()
+        threading.Thread(target=self.read_messages, args=(connection, messages), daemon=True).start()
+        while True:
+            message = messages.get()
+            if message is None:
+                self.logger.warning("Coordinator disconnected.")
+                self.close_job()
+                return True
+            if message["type"] == "job":
+                try:
+                    self.open_job(message["job"])
+                except (OSError, ValueError, KeyError) as e:
+                    # Files of the job (snapshot, IP tables) are read from the paths of the
+                    # coordinator, which may not exist on this host. The coordinator gives up on this worker
+                    self.logger.error(f"Can't open the job: {e}")
+                    self.close_job()
+                    connection.send({"type": "error", "error": str(e)})
+            elif message["type"] == "chunk":
+                if self.job is None:
+                    # Sent before the coordinator got the error of the job
+                    continue
+                if message["start"] in self.revoked:
+                    # The chunk may come back later, once the coordinator finds it a worker
+                    self.revoked.discard(message["start"])
+                    connection.send({"type": "revoked", "start": message["start"]})
+                    continue
+                try:
+                    self.run_chunk(connection, message["start"], message["count"])
+                except SinkError as e:
+                    # Handled like a lost worker: the chunk is generated again elsewhere
+                    self.logger.error(f"Chunk {message['start']} failed: {e}")
+                    self.close_job()
+                    connection.send({"type": "error", "error": str(e)})
+                except OSError as e:
+                    # The coordinator regenerates the chunk elsewhere and drops it from the files of this worker
+                    self.logger.warning(f"Coordinator lost while generating chunk {message['start']}: {e}")
+                    self.close_job()
+                    return True
+            elif message["type"] == "stop":
+                connection.send({"type": "closed", "outputs": self.close_job()})
+                return True
+            elif message["type"] == "shutdown":
+                self.close_job()
+                return False
+
+    def open_job(self, job):
+        """
+        Prepares the generator and the sinks for a job.
+        :param job: [Dictionary] Job sent by the coordinator.
+        """
+
+        self.close_job()
+        for attribute, value in job["config"].items():
+            # Paths of the coordinator's host would let it read and write any file here
+            if attribute not in PATH_SETTINGS:
+                self.config_manager.set_global_config(attribute, value)
+        # The files of the job are only written to the working directory of the worker
+        prefix = os.path.basename(job["prefix"])
+        if prefix in ("", ".", ".."):
+            raise ValueError(f"Invalid name for the exported files: '{job['prefix']}'.")
+        # With a snapshot, every worker on the host maps the same file instead of
+        # getting its own copy of the entities
+        if job.get("snapshot"):
+            self.event_manager.use_snapshot(EntitySnapshot(job["snapshot"]))
+            pool = self.event_manager.load_entities(job["users_query"], job["servers_query"])
+            if pool.version != job["snapshot_version"]:
+                raise ValueError(f"'{job['snapshot']}' on this host holds other entities than the snapshot of the job.")
+        else:
+            pool = EntityPool(job["entities"]["users"], job["entities"]["servers"])
+            self.event_manager.set_entity_pool(pool, job["users_query"], job["servers_query"])
+        self.event_manager.set_event_mix(job["event_mix"])
+        self.event_manager.set_event_details(job["event_details"])
+        # The tables are read from the same paths on every worker. A missing or invalid table
+        # raises here, and the worker reports the job as one it can't open (see handle)
+        self.event_manager.set_ip_enrichment(job["ip_enrichment"])
+        if job.get("mongo"):
+            self.connect_database(job["mongo"])
+        self.rate = job["rate"]
+        self.revoked = set()
+        self.job = job
+        # The columns of the flat formats come with the job instead of being read from a schema file
+        self.sinks = self.export_manager.open_sinks(job["formats"], prefix=f"{prefix}_w{job['worker_id']}",
+                                                    schema=EventSchema(job.get("schema")))
+        if self.sinks is None:
+            raise ValueError("The exported files of the job couldn't be opened.")
+        self.logger.info(f"Job opened as worker {job['worker_id']} (entities version {pool.version}).")
+
+    def connect_database(self, mongo):
+        """
+        Connects to the database of the coordinator, unless the worker is already connected to it.
+        :param mongo: [Dictionary] URI, database name and connection profiles of the coordinator.
+        """
+
+        for name, profile in mongo["profiles"].items():
+            for attribute, value in profile.items():
+                self.config_manager.set_connection_profile(name, attribute, value)
+        data_manager = self.export_manager.data_manager
+        if data_manager is None or (data_manager.uri, data_manager.db_name) != (mongo["uri"], mongo["db"]):
+            self.export_manager.data_manager = PhantomDataManager(self.config_manager, mongo["uri"], mongo["db"])
+
+    def close_job(self):
+        """
+        Closes the sinks of the current job.
+        :return: [List-of Dictionary] Exported files and their number of events
+        """
+
+        outputs = []
+        if self.sinks is not None:
+            try:
+                self.export_manager.close_sinks(self.sinks)
+            except SinkError as e:
+                # Already reported to the coordinator when the chunk failed
+                self.logger.error(f"Sinks of the job closed after a failure: {e}")
+            outputs = [{"format": format_str, "filename": writer.filename, "events": writer.count}
+                       for format_str, writer in zip(self.job["formats"], self.sinks.writers)]
+        # A job that couldn't be opened may have mapped its snapshot already
+        if self.event_manager.snapshot is not None:
+            self.event_manager.snapshot.close()
+            self.event_manager.use_snapshot(None)
+        self.sinks = None
+        self.job = None
+        return outputs
+
+    def get_outputs(self):
+        """
+        Waits for the sinks to write the events generated so far and reads the offsets of the files.
+        :return: [List-of Dictionary] Exported files (format, filename, offset, events)
+        """
+
+        self.sinks.sync()
+        return [{"format": format_str, "filename": writer.filename, "offset": writer.tell(), "events": writer.count}
+                for format_str, writer in zip(self.job["formats"], self.sinks.writers)]
+
+    def run_chunk(self, connection, start, count):
+        """
+        Generates the events of a chunk. Each chunk gets its own seed, derived from the job
+        seed and its first sequence number, so its events don't depend on which worker runs it.
+        :param connection: [Connection] Coordinator connection.
+        :param start: [int] Sequence number of the first event.
+        :param count: [int] Number of events.
+        """
+
+        job = self.job
+        connection.send({"type": "started", "start": start, "outputs": self.get_outputs()})
+        if job["seed"] is None:
+            self.event_manager.seed(None)
+        else:
+            self.event_manager.seed(f"{job['seed']}:{start}", job["start_time"] + start / job["event_rate"],
+                                    job["event_rate"])
+
+        started = time.time()
+        paced_since, paced_events, rate = started, 0, self.rate
+        next_report = started + REPORT_INTERVAL
+        for i in range(count):
+            event = self.event_manager.generate_event(job["users_query"], job["servers_query"], sequence=start + i)
+            if event:
+                self.event_manager.enrich(event)
+                self.sinks.write(event)
+            if i % 100 == 0:
+                now = time.time()
+                # Pacing restarts whenever the coordinator changes the rate
+                if self.rate != rate:
+                    paced_since, paced_events, rate = now, i, self.rate
+                if rate:
+                    ahead = paced_since + (i - paced_events) / rate - now
+                    if ahead > 0:
+                        time.sleep(ahead)
+                if now >= next_report:
+                    connection.send({"type": "progress", "start": start, "emitted": i,
+                                     "eps": i / max(now - started, 1e-9)})
+                    next_report = now + REPORT_INTERVAL
+        elapsed = max(time.time() - started, 1e-9)
+        connection.send({"type": "done", "start": start, "count": count, "eps": count / elapsed,
+                         "outputs": self.get_outputs()})
+
+
+class GenerationCoordinator:
+
+    def __init__(self, config_manager):
+        """
+        Splits a generation job in chunks of sequence numbers and hands them out to workers.
+        :param config_manager: [ConfigGenie] Configuration of the shell.
+        """
+
+        self.config_manager = config_manager
+        # Only used to truncate the files of lost local workers
+        self.export_manager = ExportManager(config_manager)
+        self.logger = logging.getLogger("GenerationCoordinator")
+        self.processes = []
+        # Shared with remote workers through the environment, local ones get a random one
+        self.secret = os.environ.get(SECRET_VARIABLE) or secrets.token_hex(16)
+        self.logger.info("GenerationCoordinator component initialized.")
+
+    def spawn_local_workers(self, count):
+        """
+        Starts worker processes on this host.
+        :param count: [int] Number of workers.
+        :return: [List-of Tuple] Worker addresses
+        """
+
+        addresses = []
+        for _ in range(count):
+            process = subprocess.Popen([sys.executable, __file__, "worker", "--port", "0"],
+                                       stdout=subprocess.PIPE, text=True,
+                                       env=dict(os.environ, **{SECRET_VARIABLE: self.secret}))
+            # The worker prints the port it got before serving,
+            # anything it prints afterwards is drained into the log
+            port = int(process.stdout.readline().split()[1])
+            threading.Thread(target=self.drain_output, args=(process,), daemon=True).start()
+            self.processes.append((process, port))
+            addresses.append(("127.0.0.1", port))
+        self.logger.info(f"{count} local workers spawned: {addresses}")
+        return addresses
+
+    def connect(self, address):
+        """
+        Connects to a worker and answers its challenge with the secret of the coordinator.
+        :param address: [Tuple] Worker address.
+        :return: [Connection] Worker connection
+        :raises ConnectionError: If the worker doesn't send a challenge
+        """
+
+        connection = Connection(socket.create_connection(address))
+        message = connection.receive()
+        if not isinstance(message, dict) or message.get("type") != "challenge":
+            connection.close()
+            raise ConnectionError(f"{address[0]}:{address[1]} isn't a PyEventGen worker.")
+        # A worker that rejects the answer reports it and disconnects, which fails it like any lost worker
+        connection.send({"type": "hello", "digest": sign(self.secret, str(message.get("nonce")))})
+        return connection
+
+    def drain_output(self, process):
+        for line in process.stdout:
+            self.logger.debug(f"Worker {process.pid}: {line.rstrip()}")
+
+    def parse_workers(self, workers_str):
+        """
+        Parses the workers argument: 'local:<n>' or a comma separated list of host:port.
+        :param workers_str: [String] Workers argument.
+        :return: [List-of Tuple] Worker addresses
+        """
+
+        if workers_str.startswith("local:"):
+            return self.spawn_local_workers(int(workers_str.split(":", 1)[1]))
+        addresses = []
+        for address in workers_str.split(","):
+            host, port = address.rsplit(":", 1)
+            addresses.append((host, int(port)))
+        return addresses
+
+    def run(self, job, addresses):
+        """
+        Runs a job on the workers and waits until every event has been generated.
+        Chunks are handed out as workers finish the previous ones, and a chunk waiting on a
+        worker that falls behind is taken back and given to an idle one. With a target rate,
+        the rate of the workers that can't keep up is moved to the others.
+        The chunks of a worker that is lost are generated again by the others, so the files of
+        a lost local worker are truncated after the last chunk it completed. Those of a lost
+        remote worker can't be, they're listed in the 'partial' outputs of the summary instead.
+        :param job: [Dictionary] Job parameters, entities included.
+        :param addresses: [List-of Tuple] Worker addresses.
+        :return: [Dictionary] Summary of the job
+        """
+
+        inbox = queue.Queue()
+        workers = {}
+        local = {("127.0.0.1", port) for _, port in self.processes}
+        for worker_id, address in enumerate(addresses):
+            connection = self.connect(address)
+            workers[worker_id] = {"address": address, "connection": connection, "queued": deque(),
+                                  "running": None, "emitted": 0, "chunk_emitted": 0, "eps": 0.0,
+                                  "chunks": 0, "rate": 0, "alive": True, "revoking": set(),
+                                  "local": address in local, "lost": False, "lost_chunk": None, "committed": []}
+            connection.send({"type": "job", "job": dict(job, worker_id=worker_id)})
+            threading.Thread(target=self.read_messages, args=(worker_id, connection, inbox), daemon=True).start()
+
+        chunk_size = job["chunk_size"]
+        chunks = {start: min(chunk_size, job["count"] - start) for start in range(0, job["count"], chunk_size)}
+        pending = deque(chunks)
+        completed = 0
+        started = time.time()
+        next_report = started + REPORT_INTERVAL
+        self.set_rates(workers, job["eps"])
+
+        for worker_id in workers:
+            self.assign_chunks(workers[worker_id], pending, chunks)
+        while completed < job["count"]:
+            if not any(worker["alive"] for worker in workers.values()):
+                raise ConnectionError("Every worker disconnected or failed before the job completed.")
+            try:
+                worker_id, message = inbox.get(timeout=REPORT_INTERVAL)
+            except queue.Empty:
+                worker_id, message = None, None
+            # Messages still coming from a worker that failed are ignored
+            if worker_id is not None and workers[worker_id]["alive"]:
+                worker = workers[worker_id]
+                completed += self.handle_message(worker, message, pending, chunks)
+            self.steal_chunks(workers, pending)
+            # Idle workers first, so a chunk taken back doesn't return to the worker it came from
+            for worker in sorted(workers.values(), key=lambda w: len(w["queued"]) + (w["running"] is not None)):
+                self.assign_chunks(worker, pending, chunks)
+            now = time.time()
+            if now >= next_report:
+                if job["eps"]:
+                    self.rebalance_rates(workers, job["eps"])
+                self.print_progress(workers, completed, job["count"], now - started)
+                next_report = now + REPORT_INTERVAL
+
+        elapsed = time.time() - started
+        outputs = []
+        for worker in workers.values():
+            if worker["alive"]:
+                worker["connection"].send({"type": "stop"})
+        for worker in workers.values():
+            while worker["alive"]:
+                worker_id, message = inbox.get()
+                if message is None:
+                    # Workers also disconnect once they're closed, which isn't losing them
+                    workers[worker_id]["lost"] |= workers[worker_id]["alive"]
+                    workers[worker_id]["alive"] = False
+                elif message["type"] == "closed":
+                    outputs.extend(message["outputs"])
+                    workers[worker_id]["alive"] = False
+        # Local workers have exited once they're closed, so their files can be truncated safely
+        self.close(workers)
+        partial = []
+        for worker in workers.values():
+            if worker["lost"] and worker["local"]:
+                outputs.extend(self.truncate_outputs(worker["committed"], worker["lost_chunk"]))
+            elif worker["lost"]:
+                partial.extend(output for output in worker["committed"] if output["filename"])
+        summary = {
+            "events": completed,
+            "seconds": elapsed,
+            "eps": completed / max(elapsed, 1e-9),
+            "workers": [{"address": f"{worker['address'][0]}:{worker['address'][1]}", "events": worker["emitted"],
+                         "chunks": worker["chunks"], "eps": worker["eps"]} for worker in workers.values()],
+            "outputs": outputs,
+            "partial": partial
+        }
+        self.logger.info(f"Distributed job completed: {summary}")
+        return summary
+
+    def read_messages(self, worker_id, connection, inbox):
+        while True:
+            message = connection.receive()
+            inbox.put((worker_id, message))
+            if message is None:
+                return
+
+    def handle_message(self, worker, message, pending, chunks):
+        """
+        Updates the state of a worker with one of its messages.
+        :return: [int] Number of events completed by the message
+        """
+
+        if message is None or message["type"] == "error":
+            # Whatever the worker held goes back to the pending chunks
+            worker["alive"] = False
+            worker["lost"] = True
+            lost = list(worker["queued"])
+            if worker["running"] is not None:
+                lost.insert(0, worker["running"])
+                worker["lost_chunk"] = (worker["running"], chunks[worker["running"]])
+            pending.extendleft(reversed(lost))
+            worker["queued"].clear()
+            worker["running"] = None
+            if message is None:
+                message = f"Worker {worker['address']} disconnected, {len(lost)} chunks will be regenerated elsewhere."
+                print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+                self.logger.warning(message)
+            else:
+                message = (f"Worker {worker['address']} failed: {message['error']}. "
+                           f"{len(lost)} chunks will be regenerated elsewhere.")
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.error(message)
+            return 0
+        if message["type"] == "started":
+            worker["queued"].remove(message["start"])
+            worker["revoking"].discard(message["start"])
+            worker["running"] = message["start"]
+            worker["chunk_emitted"] = 0
+            worker["committed"] = message["outputs"]
+        elif message["type"] == "progress":
+            worker["chunk_emitted"] = message["emitted"]
+            worker["eps"] = message["eps"]
+        elif message["type"] == "done":
+            worker["running"] = None
+            worker["committed"] = message["outputs"]
+            worker["emitted"] += message["count"]
+            worker["chunk_emitted"] = 0
+            worker["chunks"] += 1
+            worker["eps"] = message["eps"]
+            return message["count"]
+        elif message["type"] == "revoked":
+            worker["queued"].remove(message["start"])
+            worker["revoking"].discard(message["start"])
+            pending.appendleft(message["start"])
+        return 0
+
+    def truncate_outputs(self, committed, lost_chunk=None):
+        """
+        Drops the events a lost local worker wrote after the last chunk it completed, which
+        were generated again by the other workers, by truncating its files at their offsets then.
+        :param committed: [List-of Dictionary] Files of the worker with their offsets after that chunk.
+        :param lost_chunk: [Tuple] Start and size of the chunk the worker was generating when it was lost.
+        :return: [List-of Dictionary] Truncated files and their number of events
+        """
+
+        outputs = []
+        for output in committed:
+            if output["filename"] is None:
+                continue
+            if output["format"] == "mongo":
+                # Inserted events can't be truncated
+                if lost_chunk is not None:
+                    start, count = lost_chunk
+                    message = (f"Run '{output['filename']}' may hold events with sequence numbers {start} to "
+                               f"{start + count - 1} twice, they were generated again after its worker was lost.")
+                    print(f"{Colors.WARNING}{message}{Colors.ENDC}")
+                    self.logger.warning(message)
+                outputs.append({"format": output["format"], "filename": output["filename"],
+                                "events": output["events"]})
+                continue
+            try:
+                writer = self.export_manager.open_writer(output["format"], output["filename"], output["offset"],
+                                                         output["events"])
+                if writer is not None:
+                    writer.close()
+            except OSError as e:
+                self.logger.error(f"Couldn't truncate '{output['filename']}' of a lost worker: {e}")
+                continue
+            self.logger.info(f"'{output['filename']}' truncated after its last completed chunk "
+                             f"({output['events']} events).")
+            outputs.append({"format": output["format"], "filename": output["filename"], "events": output["events"]})
+        return outputs
+
+    def assign_chunks(self, worker, pending, chunks):
+        while (worker["alive"] and pending
+               and len(worker["queued"]) + (worker["running"] is not None) < PREFETCH):
+            start = pending.popleft()
+            worker["queued"].append(start)
+            worker["connection"].send({"type": "chunk", "start": start, "count": chunks[start]})
+
+    def steal_chunks(self, workers, pending):
+        # When nothing is left to hand out, chunks waiting behind a running one
+        # are taken back so an idle worker can generate them
+        if pending:
+            return
+        idle = [worker for worker in workers.values()
+                if worker["alive"] and worker["running"] is None and not worker["queued"]]
+        for worker in workers.values():
+            if not idle:
+                return
+            waiting = [start for start in worker["queued"] if start not in worker["revoking"]]
+            if worker["running"] is not None and waiting:
+                worker["revoking"].add(waiting[-1])
+                worker["connection"].send({"type": "revoke", "start": waiting[-1]})
+                idle.pop()
+
+    def set_rates(self, workers, eps):
+        alive = [worker for worker in workers.values() if worker["alive"]]
+        for worker in alive:
+            worker["rate"] = eps / len(alive) if eps else 0
+            worker["connection"].send({"type": "rate", "rate": worker["rate"]})
+
+    def rebalance_rates(self, workers, eps):
+        # Workers under 90% of their rate keep what they achieve and the rest
+        # of the target is split between the ones that keep up
+        alive = [worker for worker in workers.values() if worker["alive"] and worker["running"] is not None]
+        behind = [worker for worker in alive if worker["eps"] < worker["rate"] * 0.9]
+        keeping_up = [worker for worker in alive if worker not in behind]
+        if not behind or not keeping_up:
+            return
+        remaining = eps - sum(worker["eps"] for worker in behind)
+        for worker in behind:
+            worker["rate"] = worker["eps"]
+        for worker in keeping_up:
+            worker["rate"] = remaining / len(keeping_up)
+        for worker in alive:
+            worker["connection"].send({"type": "rate", "rate": worker["rate"]})
+        self.logger.info(f"Rates rebalanced: {[round(worker['rate'], 1) for worker in alive]}")
+
+    def print_progress(self, workers, completed, count, elapsed):
+        in_progress = sum(worker["chunk_emitted"] for worker in workers.values())
+        rates = " ".join(f"w{worker_id}:{worker['eps']:.0f}/s" for worker_id, worker in workers.items())
+        print(f"{completed + in_progress}/{count} events ({(completed + in_progress) / max(elapsed, 1e-9):.0f}/s) "
+              f"[{rates}]")
+
+    def close(self, workers):
+        for worker in workers.values():
+            worker["connection"].close()
+        # Local workers are shut down along with the job
+        for process, port in self.processes:
+            try:
+                connection = self.connect(("127.0.0.1", port))
+                connection.send({"type": "shutdown"})
+                connection.close()
+            except OSError:
+                process.terminate()
+            process.wait()
+        self.processes = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PyEventGen distributed generation worker.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="Start a generation worker.")
+    worker_parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    worker_parser.add_argument("--port", type=int, default=9100, help="Port to listen on (0 picks a free one).")
+    args = parser.parse_args()
+
+    try:
+        worker = GenerationWorker(args.host, args.port, os.environ.get(SECRET_VARIABLE))
+    except ValueError as e:
+        parser.error(str(e))
+    setup_logging(f"pyeventgen_worker_{worker.port}.log")
+    print(f"PORT {worker.port}", flush=True)
+    worker.serve()
+
+
+if __name__ == '__main__':
+    main()
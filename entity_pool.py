@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EntityPool:
+
+    def __init__(self, users, servers):
+        """
+        In-memory set of users and servers that events are generated from.
+        :param users: [List] User documents.
+        :param servers: [List] Server documents.
+        """
+
+        self.users = users
+        self.servers = servers
+        self.version = self.compute_version(users, servers)
+        self.logger = logging.getLogger("EntityPool")
+        self.logger.info(f"Entity pool loaded with {len(users)} users and {len(servers)} servers "
+                         f"(version {self.version}).")
+
+    def __bool__(self):
+        return bool(self.users) and bool(self.servers)
+
+    @staticmethod
+    def compute_version(users, servers):
+        """
+        Computes a short fingerprint of the entities, so a checkpoint can detect
+        whether the data changed between a run and its resume.
+        :param users: [List] User documents.
+        :param servers: [List] Server documents.
+        :return: [String] Hex digest
+        """
+
+        digest = hashlib.sha1()
+        for document in users + servers:
+            digest.update(json.dumps(document, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def pick_user(self, rng):
+        """
+        Picks a random user.
+        :param rng: [Random] Random generator used by the run.
+        :return: User document
+        """
+
+        return rng.choice(self.users)
+
+    def pick_server(self, rng):
+        """
+        Picks a random server.
+        :param rng: [Random] Random generator used by the run.
+        :return: Server document
+        """
+
+        return rng.choice(self.servers)
+
+
+class EntityReservoir:
+    """
+    Fixed size sample of a collection that keeps rolling: every 'batch_size' picks, the
+    oldest 'batch_size' documents are replaced by a batch of new random ones, fetched
+    in the background while the previous batch is being used.
+    """
+
+    def __init__(self, fetch, size, batch_size):
+        """
+        :param fetch: [Function] Gets n random documents of the collection.
+        :param size: [int] Documents kept in memory.
+        :param batch_size: [int] Documents replaced at once.
+        """
+
+        self.fetch = fetch
+        self.documents = fetch(size)
+        self.batch_size = min(batch_size, size)
+        self.position = 0
+        self.picks = 0
+        # Fewer documents than asked for means the whole collection fits in the reservoir
+        self.rolling = len(self.documents) == size
+        self.executor = None
+        self.next_batch = None
+        if self.rolling:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="EntityReservoir")
+            self.next_batch = self.executor.submit(self.fetch, self.batch_size)
+
+    def __bool__(self):
+        return bool(self.documents)
+
+    def pick(self, rng):
+        """
+        Picks a random document of the reservoir.
+        :param rng: [Random] Random generator used by the run.
+        :return: Document
+        """
+
+        document = rng.choice(self.documents)
+        if self.rolling:
+            self.picks += 1
+            if self.picks == self.batch_size:
+                self.roll()
+        return document
+
+    def roll(self):
+        batch = self.next_batch.result()
+        size = len(self.documents)
+        for i, document in enumerate(batch):
+            self.documents[(self.position + i) % size] = document
+        self.position = (self.position + len(batch)) % size
+        self.picks = 0
+        self.next_batch = self.executor.submit(self.fetch, self.batch_size)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+class SampledEntityPool:
+    """
+    Stands for an EntityPool when the users or servers are too many to be loaded:
+    the picks are drawn from rolling reservoirs of random documents sampled by the
+    server, so memory is bounded by the reservoir size whatever the collection size.
+    Which documents are sampled isn't seeded, so runs using it aren't reproducible.
+    """
+
+    def __init__(self, data_manager, users_query, servers_query, user_fields, server_fields, counts,
+                 size=100000, batch_size=5000):
+        """
+        :param data_manager: [PhantomDataManager] Data manager the documents are sampled with.
+        :param users_query: [Dictionary] Users query.
+        :param servers_query: [Dictionary] Servers query.
+        :param user_fields: [Dictionary] Projection of the users.
+        :param server_fields: [Dictionary] Projection of the servers.
+        :param counts: [Tuple-of int] Number of users and servers matching the queries.
+        :param size: [int] Documents kept of each collection.
+        :param batch_size: [int] Documents sampled per round trip.
+        """
+
+        self.logger = logging.getLogger("SampledEntityPool")
+        self.user_reservoir = EntityReservoir(
+            lambda n: data_manager.sample_docs("users", users_query, n, user_fields), size, batch_size)
+        self.server_reservoir = EntityReservoir(
+            lambda n: data_manager.sample_docs("servers", servers_query, n, server_fields), size, batch_size)
+        # The documents change all the time, so the version stands for the queries and counts
+        digest = hashlib.sha1(json.dumps([users_query, servers_query, *counts],
+                                         sort_keys=True, default=str).encode("utf-8"))
+        self.version = f"sampled-{digest.hexdigest()[:16]}"
+        self.logger.info(f"Sampled entity pool with reservoirs of {len(self.users)} users and "
+                         f"{len(self.servers)} servers (version {self.version}).")
+
+    def __bool__(self):
+        return bool(self.user_reservoir) and bool(self.server_reservoir)
+
+    @property
+    def users(self):
+        return self.user_reservoir.documents
+
+    @property
+    def servers(self):
+        return self.server_reservoir.documents
+
+    def pick_user(self, rng):
+        return self.user_reservoir.pick(rng)
+
+    def pick_server(self, rng):
+        return self.server_reservoir.pick(rng)
+
+    def close(self):
+        """
+        Waits for the batches being sampled and stops sampling.
+        """
+
+        self.user_reservoir.close()
+        self.server_reservoir.close()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import mmap
+import struct
+
+from array import array
+
+# File layout (little endian, every section aligned to 8 bytes):
+#   header        magic, entities version and the count and position of each section
+#   string table  n_strings + 1 offsets (u64) followed by the utf-8 blob they point into
+#   users         n_users records of 4 string ids (u32): username, role, ip_address, group
+#   servers       n_servers records of 4 string ids (u32): server_name, server_type, ip_address, group
+#   user groups   n_user_groups entries (u32): group string id, first record, number of records
+#   server groups n_server_groups entries, same as user groups
+# Records are sorted by group, so the entities of a group are a contiguous range.
+MAGIC = b"PEGSNAP1"
+HEADER = struct.Struct("<8s16s11Q")
+MISSING = 0xFFFFFFFF
+USER_FIELDS = ("username", "role", "ip_address", "group")
+SERVER_FIELDS = ("server_name", "server_type", "ip_address", "group")
+
+
+def align(file):
+    padding = -file.tell() % 8
+    file.write(b"\0" * padding)
+    return file.tell()
+
+
+def write_snapshot(path, users, servers):
+    """
+    Writes users and servers to a snapshot file. The documents are streamed,
+    only the string table and the fixed-width records are kept in memory.
+    :param path: [String] Snapshot file.
+    :param users: [Iterable] User documents, sorted by group.
+    :param servers: [Iterable] Server documents, sorted by group.
+    :return: [Tuple] Number of users and servers written, version of the entities
+    """
+
+    strings = {}
+    digest = hashlib.sha1()
+
+    def string_id(value):
+        if value is None:
+            return MISSING
+        return strings.setdefault(str(value), len(strings))
+
+    def build_records(documents, fields):
+        records = array("I")
+        groups = array("I")
+        for i, document in enumerate(documents):
+            digest.update(json.dumps(document, sort_keys=True, default=str).encode("utf-8"))
+            records.extend(string_id(document.get(field)) for field in fields)
+            group = records[-1]
+            if not groups or groups[-3] != group:
+                groups.extend((group, i, 0))
+            groups[-1] += 1
+        return records, groups
+
+    user_records, user_groups = build_records(users, USER_FIELDS)
+    server_records, server_groups = build_records(servers, SERVER_FIELDS)
+
+    blob = bytearray()
+    offsets = array("Q", [0])
+    for value in strings:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+
+    version = digest.hexdigest()[:16]
+    with open(path, "wb") as file:
+        file.write(b"\0" * HEADER.size)
+        positions = []
+        for section in (offsets, blob, user_records, server_records, user_groups, server_groups):
+            positions.append(align(file))
+            file.write(section)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, version.encode("ascii"), len(strings), positions[0], positions[1],
+                               len(user_records) // 4, positions[2], len(server_records) // 4, positions[3],
+                               len(user_groups) // 3, positions[4], len(server_groups) // 3, positions[5]))
+    return len(user_records) // 4, len(server_records) // 4, version
+
+
+class EntitySnapshot:
+
+    def __init__(self, path):
+        """
+        Memory-maps a snapshot file. Nothing is read up front, and every process
+        mapping the same file shares its pages.
+        :param path: [String] Snapshot file.
+        """
+
+        self.path = path
+        self.logger = logging.getLogger("EntitySnapshot")
+        with open(path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = buffer = memoryview(self.mmap)
+
+        (magic, version, n_strings, offsets_pos, blob_pos, self.n_users, users_pos, self.n_servers, servers_pos,
+         n_user_groups, user_groups_pos, n_server_groups, server_groups_pos) = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a PyEventGen snapshot.")
+        self.version = version.decode("ascii")
+        self.offsets = buffer[offsets_pos:offsets_pos + (n_strings + 1) * 8].cast("Q")
+        self.blob = buffer[blob_pos:]
+        self.users = buffer[users_pos:users_pos + self.n_users * 16].cast("I")
+        self.servers = buffer[servers_pos:servers_pos + self.n_servers * 16].cast("I")
+        self.user_groups = self.read_groups(buffer, user_groups_pos, n_user_groups)
+        self.server_groups = self.read_groups(buffer, server_groups_pos, n_server_groups)
+        self.logger.info(f"Snapshot '{path}' mapped: {self.n_users} users, {self.n_servers} servers "
+                         f"(version {self.version}).")
+
+    def read_groups(self, buffer, position, count):
+        # Small enough to be decoded once: group name -> (first record, number of records)
+        entries = buffer[position:position + count * 12].cast("I")
+        return {self.string(entries[i]): (entries[i + 1], entries[i + 2]) for i in range(0, count * 3, 3)}
+
+    def string(self, string_id):
+        if string_id == MISSING:
+            return None
+        return str(self.blob[self.offsets[string_id]:self.offsets[string_id + 1]], "utf-8")
+
+    def record(self, records, fields, index):
+        document = {}
+        base = index * 4
+        for i, field in enumerate(fields):
+            value = self.string(records[base + i])
+            if value is not None:
+                document[field] = value
+        return document
+
+    def user(self, index):
+        return self.record(self.users, USER_FIELDS, index)
+
+    def server(self, index):
+        return self.record(self.servers, SERVER_FIELDS, index)
+
+    def select_range(self, groups, total, query, collection):
+        """
+        Gets the range of records matching a query. Only '{}' and '{"group": <name>}' are supported.
+        :return: [Tuple] First record, number of records
+        """
+
+        if not query:
+            return 0, total
+        if set(query) != {"group"} or not isinstance(query["group"], str):
+            raise ValueError(f"Snapshots can only be filtered by group, got {collection} query {query}.")
+        return groups.get(query["group"], (0, 0))
+
+    def select(self, users_query, servers_query):
+        """
+        Gets an entity pool with the users and servers matching the queries.
+        :param users_query: [Dictionary] '{}' or '{"group": <name>}'.
+        :param servers_query: [Dictionary] '{}' or '{"group": <name>}'.
+        :return: SnapshotPool
+        """
+
+        user_range = self.select_range(self.user_groups, self.n_users, users_query, "users")
+        server_range = self.select_range(self.server_groups, self.n_servers, servers_query, "servers")
+        digest = hashlib.sha1(f"{self.version}:{user_range}:{server_range}".encode("ascii"))
+        return SnapshotPool(self, user_range, server_range, digest.hexdigest()[:16])
+
+    def close(self):
+        self.offsets.release()
+        self.blob.release()
+        self.users.release()
+        self.servers.release()
+        self.buffer.release()
+        self.mmap.close()
+        self.logger.info(f"Snapshot '{self.path}' unmapped.")
+
+
+class SnapshotPool:
+
+    def __init__(self, snapshot, user_range, server_range, version):
+        """
+        Entity pool backed by a memory-mapped snapshot. Entities are decoded
+        from the file when they get picked.
+        :param snapshot: [EntitySnapshot] Snapshot.
+        :param user_range: [Tuple] First user record and number of records.
+        :param server_range: [Tuple] First server record and number of records.
+        :param version: [String] Version of the selected entities.
+        """
+
+        self.snapshot = snapshot
+        self.user_start, self.user_count = user_range
+        self.server_start, self.server_count = server_range
+        self.version = version
+
+    def __bool__(self):
+        return self.user_count > 0 and self.server_count > 0
+
+    def pick_user(self, rng):
+        return self.snapshot.user(self.user_start + rng.randrange(self.user_count))
+
+    def pick_server(self, rng):
+        return self.snapshot.server(self.server_start + rng.randrange(self.server_count))
@@ -0,0 +1,404 @@
+import itertools
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+from array import array
+
+# Bump when the vocabularies change, so processes don't map a stale file
+VOCABULARY_VERSION = 1
+MAGIC = b"PEGVOCAB"
+HEADER = struct.Struct("<8sQ")
+
+DIRECTORIES = (
+    "/home/{user}", "/home/{user}/Documents", "/home/{user}/Downloads", "/home/{user}/Desktop", "/home/{user}/.ssh",
+    "/home/{user}/projects", "/etc", "/etc/ssh", "/etc/nginx", "/etc/systemd/system", "/var/log", "/var/log/nginx",
+    "/var/lib/mysql", "/var/lib/postgresql/data", "/var/www/html", "/var/backups", "/opt/app", "/opt/app/config",
+    "/opt/app/data", "/srv/share", "/srv/share/finance", "/srv/share/hr", "/srv/share/engineering", "/tmp",
+    "/usr/local/bin", "/usr/share/doc", "/mnt/nfs/reports", "/data/exports", "/data/warehouse", "/root",
+    "C:/Users/{user}/Documents", "C:/Users/{user}/Desktop", "C:/Users/{user}/AppData/Local/Temp", "C:/Windows/System32",
+    "C:/Program Files/App", "C:/ProgramData", "D:/Shares/Finance", "D:/Shares/HR", "D:/Backups", "E:/Archive"
+)
+FILE_STEMS = (
+    "report", "invoice", "payroll", "budget", "forecast", "customers", "employees", "contracts", "notes", "draft",
+    "summary", "backup", "dump", "export", "import", "config", "settings", "credentials", "keys", "id_rsa",
+    "access", "error", "audit", "metrics", "inventory", "orders", "sales", "leads", "roadmap", "design",
+    "schema", "migration", "deploy", "build", "release", "changelog", "readme", "license", "presentation", "minutes",
+    "q1_results", "q2_results", "q3_results", "q4_results", "annual_report", "tax_return", "benefits", "salaries",
+    "passwords", "vpn_profile", "certificate", "private", "archive", "snapshot", "cache", "session", "history",
+    "index", "main", "app"
+)
+FILE_EXTENSIONS = (
+    ".txt", ".csv", ".xlsx", ".docx", ".pdf", ".pptx", ".json", ".xml", ".yaml", ".conf", ".log", ".sql",
+    ".zip", ".tar.gz", ".bak", ".py", ".sh", ".ps1", ".exe", ".dll"
+)
+PROCESSES = (
+    "bash", "sh", "zsh", "python3", "perl", "ruby", "node", "java", "sshd", "sudo", "cron", "systemd", "nginx",
+    "apache2", "httpd", "mysqld", "postgres", "mongod", "redis-server", "dockerd", "containerd", "kubelet", "rsync",
+    "scp", "curl", "wget", "tar", "gzip", "7z", "vim", "nano", "less", "cat", "cp", "mv", "rm", "chmod", "chown",
+    "explorer.exe", "cmd.exe", "powershell.exe", "pwsh.exe", "winword.exe", "excel.exe", "outlook.exe",
+    "chrome.exe", "firefox.exe", "msedge.exe", "svchost.exe", "lsass.exe", "services.exe", "rundll32.exe",
+    "regsvr32.exe", "mshta.exe", "wmic.exe", "certutil.exe", "bitsadmin.exe", "schtasks.exe", "taskmgr.exe",
+    "notepad.exe", "onedrive.exe", "teams.exe", "zoom.exe", "slack.exe", "code.exe", "git.exe", "psexec.exe",
+    "robocopy.exe", "backup.exe", "sqlservr.exe", "w3wp.exe", "msiexec.exe", "setup.exe", "update.exe"
+)
+PACKAGE_NAMES = (
+    "openssl", "openssh", "nginx", "apache2", "mysql", "postgresql", "mongodb", "redis", "docker", "kubernetes",
+    "python3", "nodejs", "openjdk", "golang", "rust", "gcc", "make", "cmake", "git", "curl", "wget", "vim", "emacs",
+    "tmux", "htop", "zip", "unzip", "rsync", "samba", "nfs", "bind9", "dnsmasq", "iptables", "nftables", "fail2ban",
+    "clamav", "auditd", "rsyslog", "logrotate", "cron", "sudo", "bash", "zsh", "perl", "ruby", "php", "composer",
+    "npm", "yarn", "pip", "virtualenv", "ansible", "terraform", "vault", "consul", "prometheus", "grafana",
+    "elasticsearch", "kibana", "logstash", "filebeat", "kafka", "zookeeper", "rabbitmq", "memcached", "haproxy",
+    "varnish", "squid", "postfix", "dovecot", "thunderbird", "firefox", "chromium", "libreoffice", "gimp",
+    "inkscape", "vlc", "ffmpeg", "imagemagick", "pandoc", "texlive", "jq", "yq", "awscli", "azure-cli",
+    "google-cloud-sdk", "kubectl", "helm", "minikube", "podman", "buildah", "skopeo", "containerd", "runc",
+    "7zip", "notepad++", "putty", "winscp", "teamviewer", "anydesk", "zoom", "slack", "teams"
+)
+PACKAGE_SUFFIXES = ("", "-dev", "-utils", "-common", "-libs", "-server", "-client", "-doc")
+SERVICES = (
+    "sshd", "nginx", "apache2", "mysql", "postgresql", "mongod", "redis", "docker", "kubelet", "cron", "rsyslog",
+    "auditd", "firewalld", "ufw", "fail2ban", "clamav-daemon", "postfix", "dovecot", "named", "dnsmasq", "ntpd",
+    "chronyd", "smbd", "nfs-server", "cups", "bluetooth", "NetworkManager", "systemd-resolved", "snapd",
+    "elasticsearch", "kibana", "logstash", "filebeat", "prometheus", "grafana-server", "kafka", "zookeeper",
+    "rabbitmq-server", "memcached", "haproxy", "vault", "consul", "jenkins", "gitlab-runner", "tomcat",
+    "W32Time", "WinDefend", "wuauserv", "Spooler", "LanmanServer", "LanmanWorkstation", "Dnscache", "EventLog",
+    "MpsSvc", "BITS", "Schedule", "TermService", "RemoteRegistry", "WinRM", "MSSQLSERVER"
+)
+MALWARE_FAMILIES = (
+    "Emotet", "TrickBot", "QakBot", "IcedID", "Dridex", "Ursnif", "AgentTesla", "FormBook", "LokiBot", "RedLine",
+    "Raccoon", "Vidar", "AsyncRAT", "njRAT", "Remcos", "NanoCore", "CobaltStrike", "Mimikatz", "Ryuk", "Conti",
+    "LockBit", "BlackCat", "REvil", "WannaCry", "NotPetya", "Mirai", "XMRig", "Gh0st", "PlugX", "ShadowPad"
+)
+MALWARE_PLATFORMS = ("Win32", "Win64", "Linux", "MSIL", "Script", "Macro")
+MALWARE_KINDS = ("Trojan", "Backdoor", "Ransom", "Worm", "Spyware", "HackTool", "CoinMiner", "Downloader")
+FIRST_NAMES = (
+    "alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy", "mallory", "niaj", "olivia",
+    "peggy", "rupert", "sybil", "trent", "victor", "walter", "yasmin", "zoe", "liam", "noah", "emma", "ava", "mia",
+    "lucas", "ethan", "sofia", "mateo", "leo", "chloe", "hugo", "ines", "omar", "priya", "ravi", "sara", "tomas",
+    "uma", "wei", "xin", "yuki", "jonas", "karin", "lars", "marta", "nils", "oscar", "paula", "quinn", "rosa",
+    "sam", "tara", "ugo", "vera", "will", "ximena", "yara", "zack"
+)
+EMAIL_DOMAINS = (
+    "example.com", "example.org", "example.net", "corp.example.com", "mail.example.com", "partner.example.org",
+    "vendor.example.net", "gmail.com", "outlook.com", "yahoo.com", "proton.me", "icloud.com", "contoso.com",
+    "fabrikam.com", "northwind.example"
+)
+ALERTS = (
+    "Suspicious PowerShell command line", "Possible credential dumping", "Unusual outbound traffic volume",
+    "Login from new country", "Impossible travel", "Multiple failed logins", "Privilege escalation attempt",
+    "Suspicious scheduled task created", "Known malicious IP contacted", "DNS tunneling suspected",
+    "Ransomware behavior detected", "Unsigned driver loaded", "Shadow copies deleted", "Security log cleared",
+    "New local administrator added", "Encoded command executed", "Port scan detected", "Web shell suspected",
+    "Anomalous service installation", "Lateral movement via SMB"
+)
+POLICIES = (
+    "Acceptable use", "Password complexity", "Data classification", "Removable media", "Remote access",
+    "Software installation", "Email attachments", "Clean desk", "Encryption at rest", "Least privilege",
+    "Data retention", "Personal devices", "Cloud storage", "Screen lock", "Account sharing"
+)
+ERROR_COMPONENTS = (
+    "kernel", "disk", "filesystem", "memory", "cpu", "network", "dns", "tls", "database", "scheduler", "auth",
+    "storage", "raid", "power_supply", "fan", "nic", "gpu", "bios", "firmware", "application"
+)
+DATABASES = ("crm", "erp", "hr", "finance", "inventory", "analytics", "auth", "billing", "support", "marketing")
+TABLES = (
+    "users", "accounts", "customers", "orders", "order_items", "invoices", "payments", "products", "employees",
+    "salaries", "tickets", "sessions", "audit_log", "contracts", "leads", "campaigns", "shipments", "suppliers"
+)
+PRINTERS = tuple(f"{floor}-{kind}" for floor in ("hq1", "hq2", "hq3", "lab", "branch")
+                 for kind in ("laser-01", "laser-02", "color-01", "mfp-01"))
+
+AUTH_METHODS = ("password", "ssh_key", "kerberos", "saml", "oauth", "certificate")
+LOGIN_FAILURES = ("bad_password", "unknown_user", "account_locked", "expired_password", "mfa_timeout")
+MFA_FACTORS = ("totp", "push", "sms", "hardware_key", "email")
+SHUTDOWN_REASONS = ("scheduled_maintenance", "update", "power_loss", "user_request", "kernel_panic", "watchdog")
+PRIVILEGES = ("sudo", "admin", "Domain Admins", "backup_operators", "db_owner", "developers", "readonly")
+PROTOCOLS = ("tcp", "tcp", "tcp", "udp")
+VPN_PROTOCOLS = ("ipsec", "openvpn", "wireguard", "sslvpn")
+SEVERITIES = ("low", "medium", "high", "critical")
+RESOURCES = ("cpu", "memory", "disk", "network", "inodes", "connections")
+COMMON_PORTS = array("H", (20, 21, 22, 23, 25, 53, 67, 80, 110, 123, 135, 139, 143, 161, 389, 443, 445, 465,
+                           587, 636, 993, 995, 1433, 1521, 2049, 3306, 3389, 5432, 5900, 5985, 6379, 8080, 8443,
+                           9200, 27017))
+
+
+def build_vocabularies():
+    """
+    Builds every vocabulary, in a fixed order so seeded runs always pick the same values.
+    '{user}' in the paths is filled with names, so each pool is large enough to rarely repeat.
+    :return: [Dictionary] Vocabulary name -> list of strings
+    """
+
+    paths = [directory.replace("{user}", FIRST_NAMES[(len(stem) + len(extension)) % len(FIRST_NAMES)])
+             + "/" + stem + extension
+             for directory, stem, extension in itertools.product(DIRECTORIES, FILE_STEMS, FILE_EXTENSIONS)]
+    return {
+        "paths": paths,
+        "processes": list(PROCESSES),
+        "packages": [name + suffix for name, suffix in itertools.product(PACKAGE_NAMES, PACKAGE_SUFFIXES)],
+        "versions": [f"{major}.{minor}.{patch}" for major, minor, patch in
+                     itertools.product(range(10), range(20), range(10))],
+        "services": list(SERVICES),
+        "malware": [f"{kind}:{platform}/{family}.{variant}" for kind, platform, family, variant in
+                    itertools.product(MALWARE_KINDS, MALWARE_PLATFORMS, MALWARE_FAMILIES, "ABCDEFGH")],
+        "emails": [f"{first}.{last[0]}@{domain}" for first, last, domain in
+                   itertools.product(FIRST_NAMES, FIRST_NAMES, EMAIL_DOMAINS)],
+        "error_codes": [f"0x{code:04X}" for code in range(4096)],
+        "alerts": list(ALERTS),
+        "policies": list(POLICIES),
+        "components": list(ERROR_COMPONENTS),
+        "databases": list(DATABASES),
+        "tables": list(TABLES),
+        "printers": list(PRINTERS)
+    }
+
+
+def write_vocabularies(path, vocabularies):
+    """
+    Writes the vocabularies to a file: a header with the size of a JSON index, the index
+    (position and count of each vocabulary), and for each one its u32 offsets and utf-8 blob.
+    :param path: [String] Vocabulary file.
+    :param vocabularies: [Dictionary] Vocabulary name -> list of strings.
+    """
+
+    sections = []
+    index = {}
+    position = 0
+    for name, values in vocabularies.items():
+        encoded = [value.encode("utf-8") for value in values]
+        offsets = array("I", itertools.accumulate((len(value) for value in encoded), initial=0))
+        blob = b"".join(encoded)
+        index[name] = [position, len(values), position + len(offsets) * offsets.itemsize]
+        sections += [offsets.tobytes(), blob, b"\0" * (-len(blob) % 4)]
+        position += len(offsets) * offsets.itemsize + len(blob) + (-len(blob) % 4)
+
+    index_bytes = json.dumps(index).encode("utf-8")
+    index_bytes += b" " * (-len(index_bytes) % 4)
+    # Written to a new file of its own and renamed, so a process never maps a half written file
+    # and the name can't be taken over by another user beforehand
+    fd, temp_path = tempfile.mkstemp(prefix=".vocabulary.", dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(HEADER.pack(MAGIC, len(index_bytes)))
+            file.write(index_bytes)
+            for section in sections:
+                file.write(section)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def get_vocabulary_path():
+    """
+    Gets the default vocabulary file, in the cache directory of the user
+    ($XDG_CACHE_HOME/pyeventgen, or ~/.cache/pyeventgen), which is created if needed.
+    :return: [String] Vocabulary file
+    """
+
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    directory = os.path.join(cache, "pyeventgen")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, f"vocabulary_v{VOCABULARY_VERSION}.bin")
+
+
+class Vocabulary:
+    """
+    One pool of values, read from the memory-mapped vocabulary file.
+    """
+
+    def __init__(self, buffer, position, count, blob_position):
+        self.count = count
+        self.offsets = buffer[position:position + (count + 1) * 4].cast("I")
+        self.blob = buffer[blob_position:blob_position + self.offsets[count]]
+
+    def pick(self, rng):
+        i = rng.randrange(self.count)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class EventDetails:
+    """
+    Registry of the detail generators of each action. The values are drawn from vocabulary
+    pools stored in a file that every process maps, so the pools are built once per host
+    and their memory is shared by every worker.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: [String] Vocabulary file. If not given, a file in the cache directory of the user
+        is used, and it's built if it doesn't exist yet.
+        :raises ValueError: If the file belongs to another user or isn't a vocabulary file
+        """
+
+        self.logger = logging.getLogger("EventDetails")
+        self.path = path or get_vocabulary_path()
+        if not os.path.exists(self.path):
+            write_vocabularies(self.path, build_vocabularies())
+            self.logger.info(f"Vocabulary file '{self.path}' built.")
+
+        with open(self.path, "rb") as file:
+            # The values end up in the exported events, so only files of this user are trusted
+            if hasattr(os, "getuid") and os.fstat(file.fileno()).st_uid != os.getuid():
+                raise ValueError(f"'{self.path}' belongs to another user.")
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_size = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise ValueError(f"'{self.path}' is not a PyEventGen vocabulary file.")
+        index = json.loads(bytes(self.mmap[HEADER.size:HEADER.size + index_size]))
+        buffer = memoryview(self.mmap)[HEADER.size + index_size:]
+        self.pools = {name: Vocabulary(buffer, *entry) for name, entry in index.items()}
+
+        self.generators = {
+            "login_success": self.login_details,
+            "login_failure": self.login_failure_details,
+            "multi_factor_authentication": self.mfa_details,
+            "file_access": self.file_details,
+            "file_deletion": self.file_details,
+            "file_modification": self.file_modification_details,
+            "system_start": self.system_start_details,
+            "system_shutdown": self.system_shutdown_details,
+            "user_creation": self.account_details,
+            "user_deletion": self.account_details,
+            "user_privilege_change": self.privilege_details,
+            "network_connection": self.network_details,
+            "network_disconnection": self.network_details,
+            "vpn_connection": self.vpn_details,
+            "vpn_disconnection": self.vpn_details,
+            "malware_detection": self.malware_details,
+            "firewall_rule_change": self.firewall_details,
+            "configuration_change": self.configuration_details,
+            "software_installation": self.package_details,
+            "software_uninstallation": self.package_details,
+            "service_start": self.service_details,
+            "service_stop": self.service_details,
+            "backup_creation": self.backup_details,
+            "backup_restoration": self.backup_details,
+            "data_export": self.data_transfer_details,
+            "data_import": self.data_transfer_details,
+            "security_alert": self.alert_details,
+            "policy_violation": self.policy_details,
+            "resource_overuse": self.resource_details,
+            "database_query": self.database_details,
+            "database_update": self.database_details,
+            "system_error": self.error_details,
+            "hardware_failure": self.error_details,
+            "password_change": self.password_details,
+            "password_reset": self.password_details,
+            "email_sent": self.email_details,
+            "email_received": self.email_details,
+            "print_job_started": self.print_details,
+            "print_job_completed": self.print_details
+        }
+        self.logger.info(f"Vocabularies mapped from '{self.path}': "
+                         f"{sum(pool.count for pool in self.pools.values())} values.")
+
+    def generate(self, event_type, rng):
+        """
+        Generates the details specific to an action.
+        :param event_type: [String] Action.
+        :param rng: [Random] Random generator of the run.
+        :return: [Dictionary] Details, empty if the action has no generator
+        """
+
+        generator = self.generators.get(event_type)
+        return generator(rng) if generator else {}
+
+    def port(self, rng):
+        # Mostly well known ports, sometimes an ephemeral one
+        if rng.random() < 0.8:
+            return COMMON_PORTS[rng.randrange(len(COMMON_PORTS))]
+        return rng.randrange(1024, 65536)
+
+    def address(self, rng):
+        return f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+
+    def login_details(self, rng):
+        return {"auth_method": rng.choice(AUTH_METHODS), "process": self.pools["processes"].pick(rng)}
+
+    def login_failure_details(self, rng):
+        return {"auth_method": rng.choice(AUTH_METHODS), "reason": rng.choice(LOGIN_FAILURES)}
+
+    def mfa_details(self, rng):
+        return {"factor": rng.choice(MFA_FACTORS), "result": "success" if rng.random() < 0.95 else "denied"}
+
+    def file_details(self, rng):
+        return {"file_path": self.pools["paths"].pick(rng), "process": self.pools["processes"].pick(rng)}
+
+    def file_modification_details(self, rng):
+        return {"file_path": self.pools["paths"].pick(rng), "process": self.pools["processes"].pick(rng),
+                "bytes_written": rng.randrange(1, 1 << 24)}
+
+    def system_start_details(self, rng):
+        return {"kernel": self.pools["versions"].pick(rng), "boot_seconds": rng.randrange(5, 240)}
+
+    def system_shutdown_details(self, rng):
+        return {"reason": rng.choice(SHUTDOWN_REASONS)}
+
+    def account_details(self, rng):
+        return {"target_account": self.pools["emails"].pick(rng).split("@")[0]}
+
+    def privilege_details(self, rng):
+        return {"target_account": self.pools["emails"].pick(rng).split("@")[0], "privilege": rng.choice(PRIVILEGES),
+                "change": rng.choice(("granted", "revoked"))}
+
+    def network_details(self, rng):
+        return {"destination_ip": self.address(rng), "destination_port": self.port(rng),
+                "protocol": rng.choice(PROTOCOLS), "bytes": rng.randrange(64, 1 << 22)}
+
+    def vpn_details(self, rng):
+        return {"vpn_gateway": f"vpn{rng.randrange(1, 5)}.example.com", "tunnel_protocol": rng.choice(VPN_PROTOCOLS),
+                "assigned_ip": f"172.16.{rng.randrange(256)}.{rng.randrange(1, 255)}"}
+
+    def malware_details(self, rng):
+        return {"signature": self.pools["malware"].pick(rng), "file_path": self.pools["paths"].pick(rng),
+                "action_taken": rng.choice(("quarantined", "deleted", "blocked", "detected_only"))}
+
+    def firewall_details(self, rng):
+        return {"rule_id": rng.randrange(1, 10000), "destination_port": self.port(rng),
+                "protocol": rng.choice(PROTOCOLS), "rule_action": rng.choice(("allow", "deny"))}
+
+    def configuration_details(self, rng):
+        return {"file_path": self.pools["paths"].pick(rng), "process": self.pools["processes"].pick(rng)}
+
+    def package_details(self, rng):
+        return {"package": self.pools["packages"].pick(rng), "version": self.pools["versions"].pick(rng)}
+
+    def service_details(self, rng):
+        return {"service": self.pools["services"].pick(rng)}
+
+    def backup_details(self, rng):
+        return {"backup_path": self.pools["paths"].pick(rng), "size_bytes": rng.randrange(1 << 20, 1 << 36)}
+
+    def data_transfer_details(self, rng):
+        return {"file_path": self.pools["paths"].pick(rng), "records": rng.randrange(1, 1000000),
+                "database": self.pools["databases"].pick(rng)}
+
+    def alert_details(self, rng):
+        return {"alert": self.pools["alerts"].pick(rng), "severity": rng.choice(SEVERITIES)}
+
+    def policy_details(self, rng):
+        return {"policy": self.pools["policies"].pick(rng), "severity": rng.choice(SEVERITIES)}
+
+    def resource_details(self, rng):
+        return {"resource": rng.choice(RESOURCES), "usage_percent": rng.randrange(85, 101)}
+
+    def database_details(self, rng):
+        return {"database": self.pools["databases"].pick(rng), "table": self.pools["tables"].pick(rng),
+                "rows": rng.randrange(0, 100000)}
+
+    def error_details(self, rng):
+        return {"error_code": self.pools["error_codes"].pick(rng), "component": self.pools["components"].pick(rng)}
+
+    def password_details(self, rng):
+        return {"method": rng.choice(("self_service", "helpdesk", "expired", "admin"))}
+
+    def email_details(self, rng):
+        return {"address": self.pools["emails"].pick(rng), "attachments": rng.choice((0, 0, 0, 1, 1, 2, 5))}
+
+    def print_details(self, rng):
+        return {"printer": self.pools["printers"].pick(rng), "document": self.pools["paths"].pick(rng),
+                "pages": rng.randrange(1, 120)}
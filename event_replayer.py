@@ -0,0 +1,161 @@
+import logging
+import mmap
+import os
+import struct
+import time
+
+from array import array
+from shard_merger import read_log, read_ndjson, read_flat
+
+INDEX_MAGIC = b"PEGLINES"
+# Magic, size and modification time of the indexed file
+INDEX_HEADER = struct.Struct("<8sQQ")
+
+
+class LineIndex:
+    """
+    Byte offsets of the lines of a file. It's built once by scanning the file and saved
+    next to it ('<file>.lines'), and reused as long as the file doesn't change.
+    """
+
+    def __init__(self, path, buffer):
+        """
+        :param path: [String] Indexed file.
+        :param buffer: [mmap] Contents of the file.
+        """
+
+        self.logger = logging.getLogger("LineIndex")
+        self.path = f"{path}.lines"
+        stat = os.stat(path)
+        self.key = (stat.st_size, stat.st_mtime_ns)
+        self.offsets = self.load()
+        if self.offsets is None:
+            self.offsets = self.build(buffer)
+            self.save()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as file:
+                magic, size, mtime = INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC or (size, mtime) != self.key:
+                    return None
+                offsets = array("Q")
+                offsets.frombytes(file.read())
+        except (OSError, struct.error):
+            return None
+        self.logger.info(f"Line index '{self.path}' loaded ({len(offsets) - 1} lines).")
+        return offsets
+
+    def build(self, buffer):
+        # Offset of the start of every line, plus the end of the file
+        offsets = array("Q", [0])
+        position = buffer.find(b"\n")
+        while position != -1:
+            offsets.append(position + 1)
+            position = buffer.find(b"\n", position + 1)
+        if offsets[-1] != len(buffer):
+            offsets.append(len(buffer))
+        self.logger.info(f"Line index built for {len(offsets) - 1} lines.")
+        return offsets
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(INDEX_HEADER.pack(INDEX_MAGIC, *self.key))
+                file.write(self.offsets.tobytes())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            # Read-only directories still get the replay, just without a saved index
+            self.logger.warning(f"Couldn't save the line index '{self.path}': {e}")
+
+
+class EventReplayer:
+    """
+    Replays an exported event file. The file is memory-mapped and read through its line
+    index, so it's never loaded whole, and the events are re-emitted with their original
+    pacing, a multiple of it, or as fast as possible.
+    """
+
+    formats = ("log", "ndjson", "csv", "tsv")
+
+    def __init__(self, path, schema):
+        """
+        :param path: [String] File exported in one of the line based formats.
+        :param schema: [EventSchema] Columns of csv and tsv files.
+        """
+
+        self.logger = logging.getLogger("EventReplayer")
+        self.path = path
+        self.format = path.rsplit(".", 1)[-1]
+        if self.format not in self.formats:
+            raise ValueError(f"Only {', '.join(self.formats)} files (uncompressed) can be replayed.")
+        self.schema = schema
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.close()
+            raise ValueError(f"'{path}' is empty.")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = LineIndex(path, self.mmap)
+        # The first line of csv and tsv files is the header
+        self.count = len(self.index) - (1 if self.format in ("csv", "tsv") else 0)
+
+    def lines(self):
+        offsets, buffer = self.index.offsets, self.mmap
+        for i in range(len(self.index)):
+            yield str(buffer[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def events(self):
+        """
+        Reads the events of the file one at the time.
+        :return: [Generator] Events
+        """
+
+        if self.format == "log":
+            return read_log(self.lines())
+        if self.format == "ndjson":
+            return read_ndjson(self.lines())
+        return read_flat(self.lines(), "," if self.format == "csv" else "\t", self.schema)
+
+    def replay(self, sinks, speed=1.0, rewrite_now=False, tick=None):
+        """
+        Writes the events of the file to the sinks.
+        :param sinks: [EventFanout] Sinks the events are written to.
+        :param speed: [float] Multiple of the original pacing (2 = twice as fast). None replays as fast as possible.
+        :param rewrite_now: [Boolean] Whether the timestamps are moved to the time the events are replayed at.
+        :param tick: [Function] Called after each event. Returning False stops the replay.
+        :return: [int] Number of events replayed
+        """
+
+        count = 0
+        first = None
+        started = time.perf_counter()
+        started_wall = time.time()
+        for event in self.events():
+            timestamp = event["timestamp"]
+            if first is None:
+                first = timestamp
+            if speed:
+                offset = (timestamp - first) / speed
+                delay = started + offset - time.perf_counter()
+                # Events less than a millisecond early are sent right away, instead of a sleep each
+                if delay > 0.001:
+                    # The events due so far reach the files before the wait, instead of staying
+                    # in the batches of the sinks and the buffers of the writers until the end
+                    sinks.push()
+                    time.sleep(delay)
+            if rewrite_now:
+                event["timestamp"] = started_wall + offset if speed else time.time()
+            sinks.write(event)
+            count += 1
+            if tick is not None and not tick():
+                break
+        self.logger.info(f"{count} events of '{self.path}' replayed (speed {speed or 'max'}).")
+        return count
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
@@ -0,0 +1,168 @@
+import json
+import logging
+
+from functools import reduce
+from operator import getitem, itemgetter
+
+# Columns of the flat formats (csv, tsv). Nested fields are addressed with dots. Only the generic
+# fields are here: action specific details and IP enrichment fields need an 'event_schema' listing them
+DEFAULT_FIELDS = [
+    {"path": "timestamp", "type": "float", "default": 0.0},
+    {"path": "user", "type": "str", "default": ""},
+    {"path": "server", "type": "str", "default": ""},
+    {"path": "action", "type": "str", "default": ""},
+    {"path": "details.user_role", "type": "str", "default": ""},
+    {"path": "details.user_ip", "type": "str", "default": "unknown"},
+    {"path": "details.server_role", "type": "str", "default": ""},
+    {"path": "details.server_ip", "type": "str", "default": "unknown"},
+    {"path": "sequence", "type": "int", "default": None}
+]
+
+
+def tuple_getter(keys):
+    # itemgetter returns a bare value instead of a tuple when it has a single key
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda item: (item[key],)
+    return itemgetter(*keys)
+
+
+def reduce_getter(keys):
+    # Follows a path of keys through nested dictionaries
+    if not keys:
+        return lambda item: item
+    if len(keys) == 1:
+        return itemgetter(keys[0])
+    return lambda item: reduce(getitem, keys, item)
+
+
+class EventSchema:
+
+    types = {
+        "str": str,
+        "int": int,
+        "float": float,
+        "bool": bool
+    }
+
+    def __init__(self, fields=None):
+        """
+        Describes the columns an event is flattened into.
+        :param fields: [List-of Dictionary] Fields with their 'path', 'type' and 'default'.
+        If not given, the default event fields are used.
+        """
+
+        self.logger = logging.getLogger("EventSchema")
+        self.fields = []
+        for field in fields or DEFAULT_FIELDS:
+            if field["type"] not in self.types:
+                raise ValueError(f"Unsupported type '{field['type']}' for field '{field['path']}'.")
+            default = field.get("default")
+            if default is not None:
+                default = self.convert(field["type"], default)
+            self.fields.append({"path": field["path"], "type": field["type"], "default": default})
+        self.logger.info(f"Event schema with {len(self.fields)} fields loaded.")
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads a schema from a JSON file containing the list of fields.
+        :param path: [String] Schema file.
+        :return: EventSchema
+        """
+
+        with open(path, "r") as file:
+            return cls(json.load(file))
+
+    def header(self):
+        """
+        Gets the column names.
+        :return: [List-of String] Field paths
+        """
+
+        return [field["path"] for field in self.fields]
+
+    def convert(self, kind, value):
+        """
+        Converts a field value to the type of its column. Booleans are parsed from their
+        text ('True'/'False', as written to the flat formats), not from their truthiness.
+        :param kind: [String] Type of the column.
+        :param value: Value of the field.
+        :return: The converted value
+        :raises ValueError: If the value can't be converted
+        """
+
+        if kind == "bool" and isinstance(value, str):
+            if value not in ("True", "False"):
+                raise ValueError(f"'{value}' isn't a boolean.")
+            return value == "True"
+        return self.types[kind](value)
+
+    def compile_field(self, field):
+        """
+        Builds the function that reads one column from an event. The path is split and the
+        conversion picked once, so a row only costs the dictionary lookups of its fields.
+        Missing fields take their default value, and so do values that can't be converted.
+        :param field: [Dictionary] Field of the schema.
+        :return: [Function] event -> value
+        """
+
+        *parents, leaf = field["path"].split(".")
+        kind, default = field["type"], field["default"]
+        type_class = self.types[kind]
+        convert = self.convert
+        empty = {}
+
+        def extract(event):
+            for parent in parents:
+                event = event.get(parent, empty)
+                if not isinstance(event, dict):
+                    return default
+            value = event.get(leaf, default)
+            # Values that already have the type of the column (nearly all of them) are kept as they are
+            if value is None or type(value) is type_class:
+                return value
+            try:
+                return convert(kind, value)
+            except (TypeError, ValueError):
+                return default
+
+        return extract
+
+    def compile_extractor(self):
+        """
+        Compiles a function that flattens an event into a row, following the schema.
+        The columns are read with an itemgetter per dictionary they're in (one for the top
+        level fields, one for 'details'...), built once, so there is no per-row walking of
+        the schema. Rows with missing fields, or values of another type than their column,
+        are read again field by field, converting them or taking the defaults.
+        :return: [Function] event -> tuple
+        """
+
+        groups = {}
+        for column, field in enumerate(self.fields):
+            *parents, leaf = field["path"].split(".")
+            groups.setdefault(tuple(parents), []).append((leaf, column))
+        readers = []
+        order = []
+        for parents, leaves in groups.items():
+            readers.append((reduce_getter(parents), tuple_getter([leaf for leaf, _ in leaves])))
+            order.extend(column for _, column in leaves)
+        # Puts the columns read dictionary by dictionary back in the order of the schema
+        reorder = tuple_getter([order.index(column) for column in range(len(order))])
+        types = tuple(self.types[field["type"]] for field in self.fields)
+        extractors = [self.compile_field(field) for field in self.fields]
+
+        def extract_row(event):
+            try:
+                values = []
+                for get_parent, get_leaves in readers:
+                    values.extend(get_leaves(get_parent(event)))
+            except (KeyError, TypeError):
+                return tuple([extract(event) for extract in extractors])
+            row = reorder(values)
+            if tuple(map(type, row)) != types:
+                return tuple([extract(event) for extract in extractors])
+            return row
+
+        return extract_row
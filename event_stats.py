@@ -0,0 +1,257 @@
+import base64
+import hashlib
+import json
+import logging
+import math
+
+from array import array
+
+
+def hash64(value):
+    # Stable across processes (unlike hash()), so sketches survive a checkpoint
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """
+    Estimates the number of distinct values seen, using 2^precision one-byte registers
+    (about 1.04 / sqrt(2^precision) relative error).
+    """
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+        self.alpha = 0.7213 / (1 + 1.079 / self.size)
+
+    def add(self, value_hash):
+        """
+        :param value_hash: [int] 64 bit hash of the value.
+        """
+
+        index = value_hash >> (64 - self.precision)
+        remaining = value_hash & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        estimate = self.alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def get_state(self):
+        return base64.b64encode(self.registers).decode("ascii")
+
+    def set_state(self, state):
+        self.registers = bytearray(base64.b64decode(state))
+
+
+class CountMinSketch:
+    """
+    Estimates how many times each value was seen (never less than the real count),
+    and keeps the 'top' values with the highest estimates.
+    """
+
+    def __init__(self, width=2048, depth=4, top=10):
+        self.width = width
+        self.depth = depth
+        self.table = array("Q", bytes(8 * width * depth))
+        self.top_size = top
+        self.top = {}
+        self.top_min = 0
+
+    def add(self, value, value_hash):
+        """
+        :param value: [String] Value.
+        :param value_hash: [int] 64 bit hash of the value.
+        """
+
+        # Double hashing gives the position of the value on each row
+        h1, h2 = value_hash & 0xFFFFFFFF, (value_hash >> 32) | 1
+        estimate = None
+        for row in range(self.depth):
+            position = row * self.width + (h1 + row * h2) % self.width
+            self.table[position] += 1
+            if estimate is None or self.table[position] < estimate:
+                estimate = self.table[position]
+
+        top = self.top
+        if value in top or len(top) < self.top_size:
+            top[value] = estimate
+        elif estimate > self.top_min:
+            lowest = min(top, key=top.get)
+            if estimate > top[lowest]:
+                del top[lowest]
+                top[value] = estimate
+            self.top_min = min(top.values())
+
+    def heavy_hitters(self):
+        return sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+
+    def get_state(self):
+        return {"table": base64.b64encode(self.table.tobytes()).decode("ascii"), "top": self.top}
+
+    def set_state(self, state):
+        self.table = array("Q")
+        self.table.frombytes(base64.b64decode(state["table"]))
+        self.top = state["top"]
+        self.top_min = min(self.top.values(), default=0)
+
+
+class RateBuckets:
+    """
+    Counts events per interval of event time. When there are more than 'max_buckets'
+    buckets, neighbouring buckets are merged and the interval doubles, so memory stays
+    bounded however long the run is.
+    """
+
+    def __init__(self, interval=60, max_buckets=1440):
+        self.interval = interval
+        self.max_buckets = max_buckets
+        self.start = None
+        self.counts = []
+
+    def add(self, timestamp):
+        if self.start is None:
+            self.start = timestamp - timestamp % self.interval
+        bucket = max(int((timestamp - self.start) // self.interval), 0)
+        while bucket >= self.max_buckets:
+            self.counts = [sum(self.counts[i:i + 2]) for i in range(0, len(self.counts), 2)]
+            self.interval *= 2
+            bucket = int((timestamp - self.start) // self.interval)
+        if bucket >= len(self.counts):
+            self.counts.extend([0] * (bucket + 1 - len(self.counts)))
+        self.counts[bucket] += 1
+
+    def get_state(self):
+        return {"interval": self.interval, "start": self.start, "counts": self.counts}
+
+    def set_state(self, state):
+        self.interval = state["interval"]
+        self.start = state["start"]
+        self.counts = state["counts"]
+
+
+class EventStats:
+    """
+    Summary statistics of a run, updated as events are generated, in fixed memory:
+    exact counts per action, HyperLogLog estimates of distinct users, servers and IPs,
+    count-min sketches of the busiest users and servers, and events per interval.
+    """
+
+    def __init__(self, interval=60):
+        """
+        :param interval: [int] Seconds of event time per rate bucket.
+        """
+
+        self.logger = logging.getLogger("EventStats")
+        self.events = 0
+        self.actions = {}
+        self.distinct = {"users": HyperLogLog(), "servers": HyperLogLog(), "ips": HyperLogLog()}
+        self.heavy_hitters = {"users": CountMinSketch(), "servers": CountMinSketch()}
+        self.rate = RateBuckets(interval)
+
+    def add(self, event):
+        """
+        Accounts for one event.
+        :param event: [Dictionary] Event.
+        """
+
+        self.events += 1
+        self.actions[event["action"]] = self.actions.get(event["action"], 0) + 1
+        for name, key in (("users", "user"), ("servers", "server")):
+            value = event[key]
+            value_hash = hash64(value)
+            self.distinct[name].add(value_hash)
+            self.heavy_hitters[name].add(value, value_hash)
+        details = event.get("details", {})
+        for key in ("user_ip", "server_ip"):
+            ip = details.get(key)
+            if ip and ip != "unknown":
+                self.distinct["ips"].add(hash64(ip))
+        self.rate.add(event["timestamp"])
+
+    def summary(self):
+        """
+        Gets the statistics of the events seen so far.
+        :return: Dictionary
+        """
+
+        counts = self.rate.counts
+        return {
+            "events": self.events,
+            "actions": dict(sorted(self.actions.items(), key=lambda item: item[1], reverse=True)),
+            "distinct": {name: sketch.estimate() for name, sketch in self.distinct.items()},
+            "heavy_hitters": {name: sketch.heavy_hitters() for name, sketch in self.heavy_hitters.items()},
+            "rate": {
+                "interval": self.rate.interval,
+                "start": self.rate.start,
+                "average": self.events / len(counts) if counts else 0,
+                "min": min(counts, default=0),
+                "max": max(counts, default=0),
+                "counts": counts
+            }
+        }
+
+    def report(self, summary=None):
+        """
+        Formats the statistics for the console.
+        :param summary: [Dictionary] Statistics, as returned by summary(). If not given, they are computed.
+        :return: [List-of String] Lines
+        """
+
+        summary = summary or self.summary()
+        events = max(summary["events"], 1)
+        rate = summary["rate"]
+        lines = [f"Summary of {summary['events']} events:"]
+        lines.append("  Actions: " + ", ".join(f"{action} {count} ({count / events:.1%})"
+                                               for action, count in summary["actions"].items()))
+        lines.append("  Distinct (estimated): " + ", ".join(f"{count} {name}"
+                                                            for name, count in summary["distinct"].items()))
+        for name, hitters in summary["heavy_hitters"].items():
+            lines.append(f"  Busiest {name}: " + ", ".join(f"{value} (~{count})" for value, count in hitters[:5]))
+        lines.append(f"  Events per {rate['interval']}s: average {rate['average']:.1f}, min {rate['min']}, "
+                     f"max {rate['max']} ({len(rate['counts'])} intervals)")
+        return lines
+
+    def save(self, path):
+        """
+        Saves the statistics to a JSON file.
+        :param path: [String] Statistics file.
+        """
+
+        with open(path, "w") as file:
+            json.dump(self.summary(), file, indent=4)
+        self.logger.info(f"Statistics of {self.events} events saved to '{path}'.")
+
+    def get_state(self):
+        """
+        Gets the state of every aggregator, to be stored in a checkpoint.
+        :return: Dictionary
+        """
+
+        return {
+            "events": self.events,
+            "actions": self.actions,
+            "distinct": {name: sketch.get_state() for name, sketch in self.distinct.items()},
+            "heavy_hitters": {name: sketch.get_state() for name, sketch in self.heavy_hitters.items()},
+            "rate": self.rate.get_state()
+        }
+
+    def set_state(self, state):
+        """
+        Restores the state of every aggregator from a checkpoint.
+        :param state: [Dictionary] State returned by get_state().
+        """
+
+        self.events = state["events"]
+        self.actions = state["actions"]
+        for name, sketch_state in state["distinct"].items():
+            self.distinct[name].set_state(sketch_state)
+        for name, sketch_state in state["heavy_hitters"].items():
+            self.heavy_hitters[name].set_state(sketch_state)
+        self.rate.set_state(state["rate"])
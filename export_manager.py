@@ -1,22 +1,321 @@
+import io
 import json
 import logging
 import csv
 import xml.etree.ElementTree as ET
 
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from block_compressor import BlockCompressor
+from output_buffer import OutputBuffer
+from event_schema import EventSchema
+from sink_fanout import EventFanout, SinkError
+from pymongo import errors
 from colors import Colors
 
 
+class EventWriter:
+    """
+    Writes events to a file one at the time, so they don't need to be kept in memory.
+    Every format subclasses it and renders the header, each event and the footer.
+    """
+
+    extension = None
+
+    def __init__(self, filename, resume_offset=None, resume_events=0, compression=None, schema=None, output=None):
+        """
+        Opens the output file.
+        :param filename: [String] File to write the events to.
+        :param resume_offset: [int] If given, the file is truncated at this byte
+        offset and the events are appended after it (used to resume a run).
+        :param resume_events: [int] Number of events already in the file when resuming.
+        :param compression: [Dictionary] BlockCompressor settings (codec, level, block_size,
+        threads, index_path). If not given, the file is written uncompressed.
+        :param schema: [EventSchema] Columns of the flat formats.
+        :param output: [Dictionary] OutputBuffer settings (buffer_size, fsync). Defaults to its own.
+        """
+
+        self.filename = filename
+        self.schema = schema
+        self.count = resume_events
+        self.is_empty = resume_events == 0
+        # If file already exists, overwrites the content (or truncates it at the resume offset)
+        # If file doesn't exist, creates a new one
+        self.file = OutputBuffer(filename, resume_offset, **(output or {}))
+        if compression:
+            self.file = BlockCompressor(self.file, **compression)
+        if resume_offset is None:
+            self.file.write(self.render_header().encode("utf-8"))
+
+    def render_header(self):
+        return ""
+
+    def render_event(self, event):
+        raise NotImplementedError
+
+    def render_footer(self):
+        return ""
+
+    def write(self, event):
+        """
+        Writes one event to the file.
+        :param event: [Dictionary] Event to be written.
+        """
+
+        self.file.write(self.render_event(event).encode("utf-8"))
+        self.is_empty = False
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def push(self):
+        # Writes the buffered events out without syncing them, e.g. while a paced replay waits
+        self.file.push()
+
+    def sync(self):
+        """
+        Writes the buffered events out and syncs the file to disk, whatever the fsync policy.
+        """
+
+        self.file.flush()
+        self.file.sync()
+
+    def tell(self):
+        """
+        Gets the current byte offset of the file, after flushing it.
+        :return: [int] Offset
+        """
+
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.write(self.render_footer().encode("utf-8"))
+        self.file.close()
+
+
+class JsonEventWriter(EventWriter):
+    extension = "json"
+
+    def render_header(self):
+        return "["
+
+    def render_event(self, event):
+        # Same layout json.dump(events, file, indent=4) produces for the whole list
+        separator = "\n" if self.is_empty else ",\n"
+        return separator + "    " + json.dumps(event, indent=4).replace("\n", "\n    ")
+
+    def render_footer(self):
+        return "]" if self.is_empty else "\n]"
+
+
+class LogEventWriter(EventWriter):
+    extension = "log"
+
+    def render_event(self, event):
+        # The event timestamp is used instead of the export time, so a re-run
+        # of a seeded generation produces the same file
+        return f"{datetime.fromtimestamp(event['timestamp'])} - {json.dumps(event)}\n"
+
+
+class NdjsonEventWriter(EventWriter):
+    extension = "ndjson"
+
+    def render_event(self, event):
+        # One JSON document per line, so the file can be read (and replayed) line by line
+        return json.dumps(event) + "\n"
+
+
+class CsvEventWriter(EventWriter):
+    extension = "csv"
+    delimiter = ","
+
+    def __init__(self, filename, resume_offset=None, resume_events=0, compression=None, schema=None, output=None):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, delimiter=self.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        # Rows are flattened by an extractor compiled once from the schema,
+        # so every row has the same columns in the same order
+        schema = schema or EventSchema()
+        self.extract_row = schema.compile_extractor()
+        super().__init__(filename, resume_offset, resume_events, compression, schema, output)
+
+    def render_row(self, row):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerow(row)
+        return self.buffer.getvalue()
+
+    def render_header(self):
+        return self.render_row(self.schema.header())
+
+    def render_event(self, event):
+        return self.render_row(self.extract_row(event))
+
+
+class TsvEventWriter(CsvEventWriter):
+    extension = "tsv"
+    delimiter = "\t"
+
+
+class XmlEventWriter(EventWriter):
+    extension = "xml"
+
+    def render_header(self):
+        return "<?xml version='1.0' encoding='utf-8'?>\n<Events>"
+
+    def render_event(self, event):
+        event_element = ET.Element("Event")
+        for key, value in event.items():
+            child = ET.SubElement(event_element, key)
+            child.text = str(value)
+        return ET.tostring(event_element, encoding="unicode")
+
+    def render_footer(self):
+        return "</Events>"
+
+
+class NoneEventWriter(EventWriter):
+    """
+    Receives events but doesn't write them anywhere. Useful for testing.
+    """
+
+    def __init__(self, filename=None, resume_offset=None, resume_events=0, compression=None, schema=None,
+                 output=None):
+        self.filename = None
+        self.count = resume_events
+        self.is_empty = resume_events == 0
+
+    def write(self, event):
+        self.count += 1
+
+    def flush(self):
+        pass
+
+    def push(self):
+        pass
+
+    def sync(self):
+        pass
+
+    def tell(self):
+        return self.count
+
+    def close(self):
+        pass
+
+
+class MongoEventWriter(EventWriter):
+    """
+    Inserts events into the 'events' time-series collection with unordered bulk inserts.
+    Batches are inserted on a thread pool, and at most 'window' of them are in flight:
+    when the window is full, the writer waits for the oldest one, so the generator is
+    only slowed down when MongoDB can't keep up.
+    """
+
+    def __init__(self, run, collection, batch_size=1000, window=4, resume_events=0):
+        """
+        :param run: [String] Name of the export. Stored in the meta field of every event, and used
+        as the 'filename' of the writer.
+        :param collection: [Collection] Time-series collection.
+        :param batch_size: [int] Events per insert.
+        :param window: [int] Inserts running at once.
+        :param resume_events: [int] Number of events already inserted when resuming.
+        """
+
+        self.filename = run
+        self.collection = collection
+        self.batch_size = batch_size
+        self.window = window
+        self.count = resume_events
+        self.is_empty = resume_events == 0
+        self.batch = []
+        self.pending = deque()
+        self.executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="MongoEventWriter")
+
+    def render_event(self, event):
+        # The time field must be a date, user and server go to the meta field
+        document = {
+            "timestamp": datetime.fromtimestamp(event["timestamp"], timezone.utc),
+            "meta": {"run": self.filename, "user": event["user"], "server": event["server"]}
+        }
+        for key, value in event.items():
+            if key not in document and key not in document["meta"]:
+                document[key] = value
+        return document
+
+    def write(self, event):
+        self.batch.append(self.render_event(event))
+        self.is_empty = False
+        self.count += 1
+        if len(self.batch) >= self.batch_size:
+            self.submit_batch()
+
+    def submit_batch(self):
+        if not self.batch:
+            return
+        while len(self.pending) >= self.window:
+            self.pending.popleft().result()
+        self.pending.append(self.executor.submit(self.collection.insert_many, self.batch, ordered=False))
+        self.batch = []
+
+    def flush(self):
+        """
+        Inserts the buffered events and waits for every insert in flight.
+        """
+
+        self.submit_batch()
+        while self.pending:
+            self.pending.popleft().result()
+
+    def push(self):
+        # Inserts the buffered events without waiting for them
+        self.submit_batch()
+
+    def sync(self):
+        # Acknowledged inserts are as durable as the write concern of the collection makes them
+        self.flush()
+
+    def tell(self):
+        self.flush()
+        return self.count
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown()
+
+
 class ExportManager:
 
-    def __init__(self):
+    def __init__(self, config_manager=None, data_manager=None):
+        # Manager components get imported from command_line.py initialization/instantiation
+        self.config_manager = config_manager
+        # Needed by the 'mongo' format only
+        self.data_manager = data_manager
         self.export_strategies = {
             "csv": self.export_to_csv,
+            "tsv": self.export_to_tsv,
             "json": self.export_to_json,
             "xml": self.export_to_xml,
             "log": self.export_to_log,
+            "ndjson": self.export_to_ndjson,
+            "mongo": self.export_to_mongo,
             "none": self.export_to_none
         }
+        # Streaming writer used by each format
+        self.event_writers = {
+            "csv": CsvEventWriter,
+            "tsv": TsvEventWriter,
+            "json": JsonEventWriter,
+            "xml": XmlEventWriter,
+            "log": LogEventWriter,
+            "ndjson": NdjsonEventWriter,
+            "mongo": MongoEventWriter,
+            "none": NoneEventWriter
+        }
         self.logger = logging.getLogger("ExportManager")
         self.logger.info("ExportManager component initialized.")
 
@@ -32,6 +331,11 @@ class ExportManager:
             self.logger.error(message)
             print(f"{Colors.FAIL}{message}{Colors.ENDC}")
             return False
+        if format_str.strip() == "mongo" and self.data_manager is None:
+            message = "The 'mongo' format needs a connection to MongoDB."
+            self.logger.error(message)
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            return False
         self.logger.info(f"Verified format successfully: {format_str}")
         return True
 
@@ -50,15 +354,315 @@ class ExportManager:
         # Crazy line of code here
         # It replaces the line with the needed function from 'export_strategies'
 
+    def verify_export_formats(self, formats_str):
+        """
+        Verifies a comma separated list of formats, e.g. 'json,log,csv'.
+        :param formats_str: [String] Formats to be used.
+        :return: [List-of String] Formats, or None if any of them isn't valid
+        """
+
+        formats = [format_str.strip() for format_str in formats_str.split(",")]
+        if not all(self.verify_export_format(format_str) for format_str in formats):
+            return None
+        if len(set(formats)) != len(formats):
+            message = f"Duplicated format in: {formats_str}"
+            self.logger.error(message)
+            print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+            return None
+        return formats
+
+    def open_sinks(self, formats=None, outputs=None, prefix=None, schema=None):
+        """
+        Opens a writer for each format and fans the events out to all of them, each
+        writer running on its own thread.
+        :param formats: [List-of String] Formats of new exports.
+        :param outputs: [List-of Dictionary] Exports to resume, as stored in a checkpoint
+        (format, filename, offset, events). Used instead of 'formats'.
+        :param prefix: [String] Name of the new exported files, without extension.
+        :param schema: [EventSchema] Columns of the flat formats. Defaults to the schema of the 'event_schema' config.
+        :return: EventFanout, or None if a writer couldn't be opened
+        """
+
+        if outputs:
+            arguments = [(output["format"], output["filename"], output["offset"], output["events"])
+                         for output in outputs]
+        else:
+            arguments = [(format_str, self.build_filename(format_str, prefix)) for format_str in formats]
+        # Loaded once for all the flat formats, and before any file is created
+        if schema is None and any(issubclass(self.event_writers[writer_arguments[0]], CsvEventWriter)
+                                  for writer_arguments in arguments):
+            schema = self.get_schema()
+            if schema is None:
+                return None
+        writers = []
+        for writer_arguments in arguments:
+            try:
+                writer = self.open_writer(*writer_arguments, schema=schema)
+            except OSError:
+                # The writers opened so far are closed, so their files aren't left truncated and open
+                self.discard_writers(writers)
+                raise
+            if writer is None:
+                self.discard_writers(writers)
+                return None
+            writers.append(writer)
+        options = {}
+        if self.config_manager is not None:
+            config = self.config_manager.get_global_config("sink_batch_size", "sink_queue_size",
+                                                           "sink_overflow", "spill_dir")
+            options = {
+                "batch_size": int(config["sink_batch_size"]),
+                "capacity": int(config["sink_queue_size"]),
+                "overflow": config["sink_overflow"],
+                "spill_dir": config["spill_dir"]
+            }
+        return EventFanout(writers, **options)
+
+    def close_sinks(self, fanout):
+        """
+        Waits for every sink to write its remaining events and closes their writers.
+        If a sink failed, every writer is still closed, without being reported, before
+        the error is raised. Sinks that are already closed are left as they are.
+        :param fanout: [EventFanout] Sinks to be closed.
+        :raises SinkError: If a sink failed
+        """
+
+        if fanout.closed:
+            return
+        try:
+            fanout.close()
+        except SinkError:
+            self.discard_writers(fanout.writers)
+            raise
+        for i, writer in enumerate(fanout.writers):
+            try:
+                self.close_writer(writer)
+            except (OSError, ValueError, errors.PyMongoError) as e:
+                self.discard_writers(fanout.writers[i + 1:])
+                raise SinkError(f"Sink '{writer.filename}' failed: {e}") from e
+
+    def discard_sinks(self, fanout):
+        """
+        Closes the sinks of an export that failed, without reporting the exported files,
+        unless they're already closed. Their errors were already reported, so they're only logged.
+        :param fanout: [EventFanout] Sinks to be closed.
+        """
+
+        if fanout.closed:
+            return
+        try:
+            fanout.close()
+        except SinkError as e:
+            self.logger.warning(f"Sinks closed after a failure: {e}")
+        self.discard_writers(fanout.writers)
+
+    def discard_writers(self, writers):
+        """
+        Closes writers without reporting them, e.g. after another writer failed.
+        :param writers: [List-of EventWriter] Writers to be closed.
+        """
+
+        for writer in writers:
+            try:
+                writer.close()
+            except (OSError, ValueError, errors.PyMongoError) as e:
+                self.logger.warning(f"Couldn't close the writer of '{writer.filename}': {e}")
+
+    def open_writer(self, format_str, filename=None, resume_offset=None, resume_events=0, schema=None):
+        """
+        Opens a streaming writer for the given format.
+        If the 'export_compression' config is set, the file is compressed in blocks
+        on a thread pool and gets the extension of the codec appended.
+        :param format_str: [String] Format to be used.
+        :param filename: [String] Output file. If not given, a timestamped name is used.
+        :param resume_offset: [int] Byte offset to truncate the file at and continue from.
+        :param resume_events: [int] Number of events already in the file when resuming.
+        :param schema: [EventSchema] Columns of the flat formats. If not given, it's loaded from the config.
+        :return: EventWriter, or None if the event schema couldn't be loaded
+        """
+
+        writer_class = self.event_writers[format_str]
+        if filename is None:
+            filename = self.build_filename(format_str)
+        if writer_class is MongoEventWriter:
+            return self.open_mongo_writer(filename, resume_events)
+        # Only the flat formats have columns
+        if not issubclass(writer_class, CsvEventWriter):
+            schema = None
+        elif schema is None:
+            schema = self.get_schema()
+            if schema is None:
+                return None
+        # The codec is given by the extension, so a resumed file keeps its own
+        compression = self.get_compression(filename)
+        writer = writer_class(filename, resume_offset, resume_events, compression, schema, self.get_output())
+        self.logger.info(f"Opened '{format_str}' writer for '{filename}' (resume offset: {resume_offset}).")
+        return writer
+
+    def build_filename(self, format_str, prefix=None):
+        """
+        Builds the name of a new exported file. If the 'export_compression' config is set,
+        the extension of the codec is appended.
+        :param format_str: [String] Format to be used.
+        :param prefix: [String] File name without extension. If not given, a timestamped name is used.
+        :return: [String] File name, or None if the format doesn't write to a file
+        """
+
+        writer_class = self.event_writers[format_str]
+        prefix = prefix or f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if writer_class is MongoEventWriter:
+            # Names the run the events are tagged with
+            return prefix
+        extension = writer_class.extension
+        if not extension:
+            return None
+        filename = f"{prefix}.{extension}"
+        if self.config_manager is not None:
+            codec = self.config_manager.get_global_config("export_compression")["export_compression"]
+            if codec in BlockCompressor.codecs:
+                filename = f"{filename}.{BlockCompressor.codecs[codec][1]}"
+        return filename
+
+    def open_mongo_writer(self, run, resume_events=0):
+        """
+        Opens a writer inserting events into the 'events' time-series collection, through
+        the bulk connection profile. When resuming, the events of the run inserted after
+        the checkpoint are removed first, so they aren't inserted twice.
+        :param run: [String] Name of the export.
+        :param resume_events: [int] Number of events inserted up to the checkpoint.
+        :return: MongoEventWriter, or None if the events inserted after the checkpoint couldn't be removed
+        """
+
+        config = self.config_manager.get_global_config("bulk_connection_profile", "mongo_batch_size",
+                                                       "mongo_inflight_batches", "events_ttl")
+        collection = self.data_manager.open_events_collection(int(config["events_ttl"]),
+                                                              config["bulk_connection_profile"])
+        if resume_events:
+            try:
+                result = collection.delete_many({"meta.run": run, "sequence": {"$gte": resume_events}})
+                self.logger.info(f"{result.deleted_count} events of run '{run}' inserted after the checkpoint removed.")
+            except errors.PyMongoError as e:
+                # Resuming anyway would leave those events twice in the collection
+                message = (f"Couldn't remove the events of run '{run}' inserted after the checkpoint, so it can't "
+                           f"be resumed without inserting them twice (deleting by sequence number from a "
+                           f"time-series collection needs MongoDB 7.0 or later): {e}")
+                print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                self.logger.error(message)
+                return None
+        writer = MongoEventWriter(run, collection, int(config["mongo_batch_size"]),
+                                  int(config["mongo_inflight_batches"]), resume_events)
+        self.logger.info(f"Opened 'mongo' writer for run '{run}' (resumed events: {resume_events}).")
+        return writer
+
+    def get_schema(self):
+        """
+        Gets the event schema used by the flat formats, from the file in the
+        'event_schema' config or the default one.
+        :return: EventSchema, or None if the schema file couldn't be loaded
+        """
+
+        if self.config_manager is not None:
+            path = self.config_manager.get_global_config("event_schema")["event_schema"]
+            if path:
+                try:
+                    return EventSchema.from_file(path)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    # JSONDecodeError is a ValueError, fields without 'path' or 'type' raise KeyError
+                    message = f"Can't load the event schema '{path}': {e}"
+                    print(f"{Colors.FAIL}{message}{Colors.ENDC}")
+                    self.logger.error(message)
+                    return None
+        return EventSchema()
+
+    def get_codec(self, filename):
+        """
+        Gets the compression codec matching the extension of a file.
+        :param filename: [String] File name.
+        :return: [String] Codec, or None if the file isn't compressed
+        """
+
+        for codec, (_, extension) in BlockCompressor.codecs.items():
+            if filename.endswith(f".{extension}"):
+                return codec
+        return None
+
+    def get_compression(self, filename):
+        """
+        Gets the block compression settings for a file from the config.
+        :param filename: [String] Output file.
+        :return: [Dictionary] BlockCompressor settings, or None if the file isn't compressed
+        """
+
+        if self.config_manager is None or filename is None:
+            return None
+        codec = self.get_codec(filename)
+        if codec is None:
+            return None
+        config = self.config_manager.get_global_config("compression_level", "compression_block_size",
+                                                       "compression_threads", "compression_index")
+        return {
+            "codec": codec,
+            "level": int(config["compression_level"]),
+            "block_size": int(config["compression_block_size"]),
+            "threads": int(config["compression_threads"]) or None,
+            "index_path": f"{filename}.idx" if config["compression_index"] == "True" else None
+        }
+
+    def get_output(self):
+        """
+        Gets the settings of the buffer the exported files are written through from the config.
+        :return: [Dictionary] OutputBuffer settings, or None to use its defaults
+        """
+
+        if self.config_manager is None:
+            return None
+        config = self.config_manager.get_global_config("output_buffer_size", "output_fsync")
+        fsync = config["output_fsync"]
+        if fsync not in OutputBuffer.fsync_policies:
+            self.logger.warning(f"Unknown output_fsync '{fsync}', using 'checkpoint'.")
+            fsync = "checkpoint"
+        return {"buffer_size": int(config["output_buffer_size"]), "fsync": fsync}
+
+    def close_writer(self, writer):
+        """
+        Closes a streaming writer and reports where the events were exported.
+        :param writer: [EventWriter] Writer to be closed.
+        """
+
+        writer.close()
+        if writer.filename is None:
+            message = f"The export format is 'none' so nothing was exported."
+            print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
+            self.logger.info(f"{writer.count} events were provided. {message}")
+            return
+        if isinstance(writer, MongoEventWriter):
+            message = f"Events exported to the 'events' collection (run '{writer.filename}')"
+        else:
+            message = f"Events exported to {writer.filename}"
+        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
+        self.logger.info(f"{writer.count} {message.lower()}")
+
+    def write_events(self, events, format_str):
+        """
+        Writes a list of events through the streaming writer of the given format.
+        :param events: [List] Events to be exported
+        :param format_str: [String] Format to be used.
+        """
+
+        writer = self.open_writer(format_str)
+        if writer is None:
+            return
+        for event in events:
+            writer.write(event)
+        self.close_writer(writer)
+
     def export_to_none(self, events):
         """
         Receives events but doesn't export them. Useful for testing.
         :param events: [List] Events to be exported
         """
 
-        message = f"The export format is 'none' so nothing was exported."
-        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
-        self.logger.info(f"{(len(list(events)))} events were provided. {message}")
+        self.write_events(events, "none")
 
     def export_to_json(self, events):
         """
@@ -66,16 +670,7 @@ class ExportManager:
         :param events: [List] Events to be exported
         """
 
-        # Opens a file 'filename' with Write permission
-        # If file already exists, overwrites the content
-        # If file doesn't exist, creates a new one
-        filename = f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(filename, "w") as file:
-            json.dump(events, file, indent=4)
-
-        message = f"Events exported to {filename}"
-        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
-        self.logger.info(f"{(len(list(events)))} {message.lower()}")
+        self.write_events(events, "json")
 
     def export_to_log(self, events):
         """
@@ -83,17 +678,15 @@ class ExportManager:
         :param events: [List] Events to be exported
         """
 
-        # Opens a file 'filename' with Write permission
-        # If file already exists, overwrites the content
-        # If file doesn't exist, creates a new one
-        filename = f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        with open(filename, "w") as file:
-            for event in events:
-                file.write(f"{datetime.now()} - {json.dumps(event)}\n")
+        self.write_events(events, "log")
 
-        message = f"Events exported to {filename}"
-        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
-        self.logger.info(f"{(len(list(events)))} {message.lower()}")
+    def export_to_ndjson(self, events):
+        """
+        Exports list of events to a file in NDJSON format (one JSON event per line)
+        :param events: [List] Events to be exported
+        """
+
+        self.write_events(events, "ndjson")
 
     def export_to_csv(self, events):
         """
@@ -101,41 +694,28 @@ class ExportManager:
         :param events: [List] Events to be exported
         """
 
-        # If file doesn't exist, it creates a new one
-        filename = f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        with open(filename, "w", newline='') as file:
-            writer = csv.writer(file, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
-            # Write header based on event keys
-            if events:
-                header = events[0].keys()
-                writer.writerow(header)
-                for event in events:
-                    writer.writerow(event.values())
-
-        message = f"Events exported to {filename}"
-        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
-        self.logger.info(f"{(len(list(events)))} {message.lower()}")
+        self.write_events(events, "csv")
 
-    def export_to_xml(self, events):
+    def export_to_tsv(self, events):
         """
-        Exports list of events to a file in xml format
+        Exports list of events to a file in tsv format
         :param events: [List] Events to be exported
         """
 
-        # If file doesn't exist, it creates a new one
-        filename = f"events_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xml"
+        self.write_events(events, "tsv")
 
-        root = ET.Element("Events")
-        for event in events:
-            event_element = ET.Element("Event")
-            for key, value in event.items():
-                child = ET.SubElement(event_element, key)
-                child.text = str(value)
-            root.append(event_element)
+    def export_to_mongo(self, events):
+        """
+        Exports list of events to the 'events' collection of the database
+        :param events: [List] Events to be exported
+        """
 
-        tree = ET.ElementTree(root)
-        tree.write(filename, encoding="utf-8", xml_declaration=True)
+        self.write_events(events, "mongo")
 
-        message = f"Events exported to {filename}"
-        print(f"{Colors.OKGREEN}{message}{Colors.ENDC}")
-        self.logger.info(f"{(len(list(events)))} {message.lower()}")
+    def export_to_xml(self, events):
+        """
+        Exports list of events to a file in xml format
+        :param events: [List] Events to be exported
+        """
+
+        self.write_events(events, "xml")
@@ -0,0 +1,201 @@
+import csv
+import functools
+import heapq
+import logging
+import os
+import socket
+
+from bisect import bisect_right
+
+
+def parse_ip(ip):
+    """
+    Converts an IP address to the integer it's compared as.
+    :param ip: [String] IPv4 or IPv6 address.
+    :return: (int, int) IP version and address, or None if it isn't an IP address (e.g. 'unknown')
+    """
+
+    # inet_pton is several times faster than the ipaddress module
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big")
+    except (OSError, ValueError, TypeError):
+        pass
+    try:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big")
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def parse_cidr(cidr):
+    """
+    Converts a network to the range of addresses it holds. Host bits are ignored (10.1.2.3/16 is 10.1.0.0/16).
+    :param cidr: [String] Network, e.g. 10.1.0.0/16. Without a prefix length, a single address.
+    :return: (int, int, int) IP version, first and last address, or (None, None, None) if it isn't valid
+    """
+
+    address, _, prefix = cidr.partition("/")
+    parsed = parse_ip(address)
+    if parsed is None:
+        return None, None, None
+    version, value = parsed
+    bits = 32 if version == 4 else 128
+    host_bits = bits - int(prefix) if prefix.isdigit() else (0 if not prefix else -1)
+    if not 0 <= host_bits <= bits:
+        return None, None, None
+    first = value >> host_bits << host_bits
+    return version, first, first | ((1 << host_bits) - 1)
+
+
+def flatten(ranges):
+    """
+    Turns possibly nested or overlapping ranges into sorted, non-overlapping segments, where
+    the narrowest range wins (e.g. a /24 subnet inside a /16 site).
+    :param ranges: [List-of (int, int, int)] First address, last address and row of each range.
+    :return: [List-of (int, int, int)] First address, last address and row of each segment
+    """
+
+    ranges = sorted(ranges)
+    points = sorted({first for first, _, _ in ranges} | {last + 1 for _, last, _ in ranges})
+    segments = []
+    active = []
+    position = 0
+    for point, next_point in zip(points, points[1:]):
+        while position < len(ranges) and ranges[position][0] == point:
+            first, last, row = ranges[position]
+            # Narrowest first, and the last row of the table among ranges of the same size
+            heapq.heappush(active, (last - first, -row, last))
+            position += 1
+        # Ranges that ended are only dropped when they'd be picked
+        while active and active[0][2] < point:
+            heapq.heappop(active)
+        if not active:
+            continue
+        row = -active[0][1]
+        if segments and segments[-1][2] == row and segments[-1][1] == point - 1:
+            segments[-1] = (segments[-1][0], next_point - 1, row)
+        else:
+            segments.append((point, next_point - 1, row))
+    return segments
+
+
+class IntervalTable:
+    """
+    IP ranges loaded from a CSV file, with the other columns of each range as its fields.
+    A range is given by a 'cidr' column (e.g. 10.1.0.0/16) or by 'start' and 'end' columns
+    (e.g. 10.1.0.0 and 10.1.255.255). Lookups are a binary search over the sorted segments.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: [String] CSV file with a header row.
+        """
+
+        self.logger = logging.getLogger("IntervalTable")
+        self.path = path
+        self.rows = []
+        ranges = {4: [], 6: []}
+        with open(path, newline="", encoding="utf-8") as file:
+            reader = csv.DictReader(file)
+            columns = reader.fieldnames or []
+            if "cidr" not in columns and not {"start", "end"} <= set(columns):
+                raise ValueError(f"'{path}' needs a 'cidr' column or 'start' and 'end' columns.")
+            for line, record in enumerate(reader, start=2):
+                if record.get("cidr"):
+                    text = record["cidr"].strip()
+                    version, first, last = parse_cidr(text)
+                else:
+                    text = f"{(record['start'] or '').strip()}-{(record['end'] or '').strip()}"
+                    start, end = (parse_ip(address) for address in text.split("-", 1))
+                    if start is None or end is None or start[0] != end[0] or start[1] > end[1]:
+                        version = None
+                    else:
+                        version, first, last = start[0], start[1], end[1]
+                if version is None:
+                    raise ValueError(f"'{path}' line {line}: invalid IP range '{text}'.")
+                ranges[version].append((first, last, len(self.rows)))
+                self.rows.append({column: value for column, value in record.items()
+                                  if column not in ("cidr", "start", "end") and column is not None})
+
+        # Parallel arrays per IP version, searched with bisect
+        self.segments = {}
+        for version, version_ranges in ranges.items():
+            segments = flatten(version_ranges)
+            self.segments[version] = ([first for first, _, _ in segments], [last for _, last, _ in segments],
+                                      [row for _, _, row in segments])
+        self.logger.info(f"IP table '{path}' loaded ({len(self.rows)} ranges, "
+                         f"{sum(len(starts) for starts, _, _ in self.segments.values())} segments).")
+
+    def find(self, version, address):
+        """
+        :param version: [int] IP version.
+        :param address: [int] Address.
+        :return: [int] Row of the narrowest range holding the address, or None
+        """
+
+        starts, ends, rows = self.segments[version]
+        i = bisect_right(starts, address) - 1
+        if i < 0 or ends[i] < address:
+            return None
+        return rows[i]
+
+
+class IpEnricher:
+    """
+    Adds the fields of the ranges holding the IPs of an event to its details, as
+    '<ip field>_<column>' (e.g. 'user_ip_site'). Repeated IPs are served from an LRU cache.
+    """
+
+    def __init__(self, paths, fields, cache_size=65536):
+        """
+        :param paths: [List-of String] CSV tables. When several hold an IP, the later tables win.
+        :param fields: [List-of String] Fields of the details holding the IPs (e.g. user_ip).
+        :param cache_size: [int] IPs whose fields are kept in the cache.
+        """
+
+        self.logger = logging.getLogger("IpEnricher")
+        self.version = self.get_version(paths)
+        self.tables = [IntervalTable(path) for path in paths]
+        self.fields = fields
+        # Fields of each row already looked up, named after the IP field
+        self.named_rows = {}
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self.find)
+        self.logger.info(f"IpEnricher initialized with {len(self.tables)} tables for {', '.join(fields)}.")
+
+    @staticmethod
+    def get_version(paths):
+        """
+        Identifies the contents of the tables, to know when they have to be loaded again.
+        :param paths: [List-of String] CSV tables.
+        :return: [Tuple] Path and modification time of each table
+        """
+
+        return tuple((path, os.stat(path).st_mtime_ns) for path in paths)
+
+    def find(self, field, ip):
+        parsed = parse_ip(ip)
+        if parsed is None:
+            return {}
+        found = None
+        for index, table in enumerate(self.tables):
+            row = table.find(*parsed)
+            if row is None:
+                continue
+            named = self.named_rows.get((field, index, row))
+            if named is None:
+                named = {f"{field}_{column}": value for column, value in table.rows[row].items()}
+                self.named_rows[(field, index, row)] = named
+            # Only IPs in several tables need a dictionary of their own
+            found = named if found is None else {**found, **named}
+        return found or {}
+
+    def enrich(self, event):
+        """
+        Adds the fields of the IPs of an event to its details.
+        :param event: [Dictionary] Event.
+        """
+
+        details = event["details"]
+        for field in self.fields:
+            ip = details.get(field)
+            if ip is not None:
+                details.update(self.lookup(field, ip))
@@ -0,0 +1,225 @@
+import logging
+import sys
+import threading
+import time
+
+from collections import deque
+
+
+class JobOutput:
+    """
+    Stands for sys.stdout while background jobs exist: what a job thread prints goes
+    to the output of its job, and everything else to the real stdout.
+    """
+
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.jobs = {}
+
+    def write(self, text):
+        job = self.jobs.get(threading.get_ident())
+        if job is None:
+            return self.stdout.write(text)
+        job.write(text)
+        return len(text)
+
+    def flush(self):
+        self.stdout.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stdout, name)
+
+
+class BackgroundJob:
+    """
+    A shell command running on its own thread. The command reports its progress with
+    tick(), which is also where it waits while paused and learns it was cancelled.
+    """
+
+    # Seconds of progress samples the live throughput is computed over
+    rate_window = 5
+
+    def __init__(self, job_id, command, output_lines=200):
+        """
+        :param job_id: [int] Job number.
+        :param command: [String] Shell command.
+        :param output_lines: [int] Last lines of output kept.
+        """
+
+        self.id = job_id
+        self.command = command
+        self.state = "running"
+        self.progress = 0
+        self.total = None
+        self.started = time.time()
+        self.finished = None
+        self.error = None
+        self.thread = None
+        self.output = deque(maxlen=output_lines)
+        self.partial_line = ""
+        self.cancelled = False
+        # Cleared while paused, the job thread waits on it in tick()
+        self.running = threading.Event()
+        self.running.set()
+        self.samples = deque([(time.time(), 0)])
+
+    def set_total(self, total, done=0):
+        """
+        Sets the size of the work of the job, once the command knows it.
+        :param total: [int] Events or documents the command will go through.
+        :param done: [int] Events or documents already done (e.g. by a resumed run).
+        """
+
+        self.total = total
+        self.progress = done
+        self.samples.clear()
+        self.samples.append((time.time(), done))
+
+    def write(self, text):
+        lines = (self.partial_line + text).split("\n")
+        self.partial_line = lines.pop()
+        self.output.extend(lines)
+
+    def tick(self, count=1):
+        """
+        Reports progress. Blocks while the job is paused.
+        :param count: [int] Events or documents done since the last call.
+        :return: [Boolean] False if the job was cancelled and the command should stop
+        """
+
+        self.progress += count
+        if self.progress % 256 < count:
+            now = time.time()
+            if now - self.samples[-1][0] >= 0.5:
+                self.samples.append((now, self.progress))
+                while now - self.samples[0][0] > self.rate_window:
+                    self.samples.popleft()
+        if not self.running.is_set():
+            self.running.wait()
+            # The time paused doesn't count towards the throughput
+            self.samples.clear()
+            self.samples.append((time.time(), self.progress))
+        return not self.cancelled
+
+    def track(self, items):
+        """
+        Iterates over items, ticking once per item and stopping if the job is cancelled.
+        :param items: [Iterable] Items processed by the command (e.g. documents to insert).
+        :return: [Generator] Items
+        """
+
+        for item in items:
+            if not self.tick():
+                return
+            yield item
+
+    def rate(self):
+        """
+        Gets the live throughput, over the last 'rate_window' seconds.
+        :return: [float] Events or documents per second
+        """
+
+        if self.state != "running":
+            return 0.0
+        (first_time, first_progress), now = self.samples[0], time.time()
+        if now - first_time <= 0:
+            return 0.0
+        return (self.progress - first_progress) / (now - first_time)
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def pause(self):
+        if self.state == "running":
+            self.running.clear()
+            self.state = "paused"
+
+    def resume(self):
+        if self.state == "paused":
+            self.state = "running"
+            self.running.set()
+
+    def cancel(self):
+        if self.state in ("running", "paused"):
+            self.cancelled = True
+            self.state = "cancelling"
+            self.running.set()
+
+
+class JobManager:
+    """
+    Runs shell commands as background jobs and keeps track of them.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger("JobManager")
+        self.jobs = {}
+        self.next_id = 1
+        self.output = None
+        self.logger.info("JobManager component initialized.")
+
+    def start(self, command, function):
+        """
+        Starts a background job.
+        :param command: [String] Shell command, as shown by the jobs command.
+        :param function: [Function] Runs the command, gets the job as argument. Returns False if the command failed.
+        :return: BackgroundJob
+        """
+
+        if self.output is None:
+            self.output = JobOutput(sys.stdout)
+            sys.stdout = self.output
+        job = BackgroundJob(self.next_id, command)
+        self.next_id += 1
+        self.jobs[job.id] = job
+        job.thread = threading.Thread(target=self.run, args=(job, function), name=f"Job-{job.id}", daemon=True)
+        job.thread.start()
+        self.logger.info(f"Job {job.id} started: {command}")
+        return job
+
+    def run(self, job, function):
+        self.output.jobs[threading.get_ident()] = job
+        try:
+            # Commands print their errors and return False, rather than raising
+            failed = function(job) is False
+            if job.cancelled:
+                job.state = "cancelled"
+            else:
+                job.state = "failed" if failed else "done"
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            job.output.append(f"Job failed: {e}")
+            self.logger.exception(f"Job {job.id} failed.")
+        finally:
+            job.finished = time.time()
+            if job.partial_line:
+                job.output.append(job.partial_line)
+                job.partial_line = ""
+            del self.output.jobs[threading.get_ident()]
+        self.logger.info(f"Job {job.id} {job.state} after {job.elapsed():.1f}s ({job.progress} done).")
+
+    def get(self, job_id):
+        """
+        :param job_id: [String] Job number, as typed in the shell.
+        :return: BackgroundJob, or None if there's no such job
+        """
+
+        try:
+            return self.jobs.get(int(job_id))
+        except ValueError:
+            return None
+
+    def active(self):
+        return [job for job in self.jobs.values() if job.state in ("running", "paused", "cancelling")]
+
+    def cancel_all(self):
+        """
+        Cancels every active job and waits for them to stop.
+        """
+
+        jobs = self.active()
+        for job in jobs:
+            job.cancel()
+        for job in jobs:
+            job.thread.join()
@@ -0,0 +1,117 @@
+import logging
+import os
+
+
+class OutputBuffer:
+    """
+    Unbuffered binary file with a buffer of its own: a bytearray allocated once, which the
+    rendered events are copied into and written out with a single system call once it's
+    full, instead of going through Python's text and buffered I/O layers. Data that doesn't
+    fit is written together with the buffered bytes with writev, without being copied.
+    """
+
+    # When the file is synced to disk. Each policy also syncs at the moments of the previous ones
+    fsync_policies = ("none", "close", "checkpoint", "always")
+
+    def __init__(self, filename, resume_offset=None, buffer_size=1048576, fsync="checkpoint"):
+        """
+        Opens the file.
+        :param filename: [String] File to write to.
+        :param resume_offset: [int] If given, the file is truncated at this byte offset and
+        written after it, instead of being overwritten. The file must exist.
+        :param buffer_size: [int] Bytes buffered before they're written.
+        :param fsync: [String] none, close (once, when the file is closed), checkpoint (also
+        every time it's flushed, e.g. for a checkpoint) or always (also every time the buffer is written).
+        """
+
+        self.logger = logging.getLogger("OutputBuffer")
+        self.filename = filename
+        self.fsync = self.fsync_policies.index(fsync)
+        flags = os.O_WRONLY | getattr(os, "O_BINARY", 0)
+        # A resumed file that's gone raises FileNotFoundError instead of being recreated full of zeros
+        if resume_offset is None:
+            flags |= os.O_CREAT | os.O_TRUNC
+        self.fd = os.open(filename, flags, 0o666)
+        if resume_offset is not None:
+            os.ftruncate(self.fd, resume_offset)
+            os.lseek(self.fd, resume_offset, os.SEEK_SET)
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.position = 0
+        # Bytes handed to the operating system, and how many system calls it took
+        self.offset = resume_offset or 0
+        self.writes = 0
+        self.synced = True
+
+    def write(self, data):
+        """
+        Copies data into the buffer, writing the buffer out first if it doesn't fit.
+        :param data: [Bytes] Data to be written.
+        """
+
+        end = self.position + len(data)
+        if end <= len(self.buffer):
+            self.view[self.position:end] = data
+            self.position = end
+        elif len(data) < len(self.buffer):
+            self.write_out([self.view[:self.position]])
+            self.view[:len(data)] = data
+            self.position = len(data)
+        else:
+            # Large writes (e.g. compressed blocks) go straight to the file
+            self.write_out([self.view[:self.position], data])
+            self.position = 0
+
+    def write_out(self, chunks):
+        chunks = [memoryview(chunk) for chunk in chunks if len(chunk)]
+        while chunks:
+            if len(chunks) > 1 and hasattr(os, "writev"):
+                written = os.writev(self.fd, chunks)
+            else:
+                written = os.write(self.fd, chunks[0])
+            self.offset += written
+            self.writes += 1
+            # Partial writes continue where they stopped
+            while chunks and written >= len(chunks[0]):
+                written -= len(chunks.pop(0))
+            if written:
+                chunks[0] = chunks[0][written:]
+        self.synced = False
+        if self.fsync >= 3:
+            self.sync()
+
+    def sync(self):
+        if not self.synced:
+            os.fsync(self.fd)
+            self.synced = True
+
+    def push(self):
+        """
+        Writes the buffered data out without syncing it, so readers of the file get it.
+        """
+
+        if self.position:
+            self.write_out([self.view[:self.position]])
+            self.position = 0
+
+    def flush(self):
+        """
+        Writes the buffered data out, and syncs it to disk if the policy is checkpoint or always.
+        """
+
+        self.push()
+        if self.fsync >= 2:
+            self.sync()
+
+    def tell(self):
+        return self.offset + self.position
+
+    def close(self):
+        if self.position:
+            self.write_out([self.view[:self.position]])
+            self.position = 0
+        if self.fsync >= 1:
+            self.sync()
+        self.view.release()
+        os.close(self.fd)
+        self.logger.info(f"{self.offset} bytes written to '{self.filename}' in {self.writes} writes.")
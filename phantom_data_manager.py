@@ -1,49 +1,142 @@
 import logging
+import threading
 from pymongo import MongoClient, errors
 from colors import Colors
+from config_genie import ConfigGenie
 import time
 
 
 class PhantomDataManager:
 
-    def __init__(self):
+    def __init__(self, config_manager=None, uri=None, db_name=None):
+        """
+        :param config_manager: [ConfigGenie] Configuration, used for the connection profiles.
+        :param uri: [String] MongoDB URI. If not given, it's requested to the user.
+        :param db_name: [String] Database name. If not given, it's requested to the user.
+        """
+
         self.collections_allowed = {
             "servers",
             "users",
+            "events",
             # "ips"
         }
         self.logger = logging.getLogger("PhantomDataManager")
+        self.config_manager = config_manager or ConfigGenie()
 
         # Initialize MongoDB client and database
         self.client = None
         self.db = None
-        self.request_uri()
-        self.request_db_name()
-
+        self.uri = None
+        self.db_name = None
+        # Clients are created per set of pool and compression settings and kept open,
+        # so switching back to a profile doesn't pay for new connections
+        self.clients = {}
+        # Background jobs share the manager, so switching profiles and creating clients is serialized
+        self.lock = threading.RLock()
+        self.profile = None
+        self.batch_size = 0
         # Dictionary contains every collection of the database used by this app.
         self.collections = {}
-        # For each member in collections_allowed, creates an entry in the dictionary
-        for collection in self.collections_allowed:
-            collection_name = collection
-            collection_mongo = self.db[collection_name]
-            # Creates an entry on the dictionary ["name" mongo]
-            self.collections[collection_name] = collection_mongo
+
+        profile = self.config_manager.get_global_config()["connection_profile"]
+        if uri is None:
+            self.request_uri(profile)
+        elif not self.verify_mongodb_uri(uri, profile)[0]:
+            raise ConnectionError(f"Could not connect to MongoDB at '{uri}'.")
+        if db_name is None:
+            self.request_db_name()
+        elif not self.verify_mongodb_db(db_name)[0]:
+            raise ConnectionError(f"Could not access the MongoDB database '{db_name}'.")
+        self.apply_profile(profile)
 
         self.logger.info(f"Initialized PhantomDataManager component.")
         time.sleep(1.5)
 
     # AUXILIARY FUNCTIONS
 
-    def request_uri(self):
+    def client_options(self, profile):
+        """
+        Translates the settings of a connection profile into MongoClient options.
+        :param profile: [Dictionary] Connection profile settings.
+        :return: [Dictionary] MongoClient options
+        """
+
+        options = {"maxPoolSize": int(profile["max_pool_size"]), "readPreference": profile["read_preference"]}
+        if profile["compressors"]:
+            options["compressors"] = profile["compressors"]
+        if profile["write_concern"]:
+            write_concern = profile["write_concern"]
+            options["w"] = int(write_concern) if write_concern.isdigit() else write_concern
+        if profile["journal"]:
+            options["journal"] = profile["journal"] == "True"
+        return options
+
+    def get_client(self, uri, profile):
+        """
+        Gets the client for the settings of a connection profile, creating it if needed.
+        :param uri: [String] MongoDB URI.
+        :param profile: [Dictionary] Connection profile settings.
+        :return: MongoClient
+        """
+
+        options = self.client_options(profile)
+        key = (uri, tuple(sorted(options.items())))
+        with self.lock:
+            if key not in self.clients:
+                self.clients[key] = MongoClient(uri, serverSelectionTimeoutMS=10000, **options)  # 10 seconds
+                self.logger.info(f"MongoDB client created with options {options}.")
+            return self.clients[key]
+
+    def apply_profile(self, name):
+        """
+        Switches to a connection profile: the client with its pool size, wire compression,
+        write concern and read preference, and the batch size of reads and inserts.
+        :param name: [String] Connection profile name.
+        :return: Boolean
+        """
+
+        profile = self.config_manager.get_connection_profile(name)
+        if profile is None:
+            return False
+        with self.lock:
+            if name == self.profile:
+                return True
+
+            self.client = self.get_client(self.uri, profile)
+            self.db = self.client[self.db_name]
+            self.batch_size = int(profile["batch_size"])
+            # For each member in collections_allowed, creates an entry in the dictionary ["name" mongo].
+            # A new dictionary is swapped in, so other threads never see it half updated
+            self.collections = {collection: self.db[collection] for collection in self.collections_allowed}
+            self.profile = name
+        self.logger.info(f"Connection profile '{name}' applied.")
+        return True
+
+    def get_collection(self, collection, profile=None):
+        """
+        Gets a collection through a connection profile, without switching the current profile.
+        :param collection: [String] Name of the collection.
+        :param profile: [String] Connection profile. If not given, the current one is used.
+        :return: (Collection, [int] batch size of the profile)
+        """
+
+        settings = self.config_manager.get_connection_profile(profile) if profile else None
+        if settings is None:
+            return self.collections[collection], self.batch_size
+        return self.get_client(self.uri, settings)[self.db_name][collection], int(settings["batch_size"])
+
+    def request_uri(self, profile):
         """
         Requests to the user the mongodb URI to connect.
+        :param profile: [String] Connection profile used to connect.
         """
 
         default_uri = "mongodb://localhost:27017/"
         while True:
             uri = (input(f"Enter {Colors.ORANGE}MongoDB URI{Colors.ENDC} (default: mongodb://localhost:27017/):\n> ")
                    or default_uri)
-            is_valid, message = self.verify_mongodb_uri(uri)
+            is_valid, message = self.verify_mongodb_uri(uri, profile)
             print(message)
             self.logger.info(message)
             if is_valid:
@@ -66,18 +159,20 @@ class PhantomDataManager:
                 self.logger.info(f"MongoDB db verified successfully.")
                 return
 
-    def verify_mongodb_uri(self, uri):
+    def verify_mongodb_uri(self, uri, profile="interactive"):
         """
         Uses the provided URI to attempt a connection to the MongoDB server.
         Catches any exceptions that occur during the connection attempt.
         :param uri: [String] Provided URI
+        :param profile: [String] Connection profile used to connect.
         :return: [Tuple] Boolean, Returned message
         """
 
         try:
             # Attempt to create a client and list the databases
-            self.client = MongoClient(uri, serverSelectionTimeoutMS=10000)  # 10 seconds
+            self.client = self.get_client(uri, self.config_manager.get_connection_profile(profile))
             self.client.server_info()  # Force connection on a request as the ping is lazily connected
+            self.uri = uri
             return True, f"{Colors.OKGREEN}Connection successful!{Colors.ENDC}"
         except errors.ServerSelectionTimeoutError:
             return False, "Server selection timeout. Could not connect to the server."
@@ -101,6 +196,7 @@ class PhantomDataManager:
             self.db = self.client[db]
             # Try to list collections to ensure the database is accessible.
             self.db.list_collection_names()
+            self.db_name = db
             return True, f"{Colors.OKGREEN}Database connection successful!{Colors.ENDC}"
         except errors.OperationFailure:
             return False, "Database operation failed. Could not access the database."
@@ -120,6 +216,33 @@ class PhantomDataManager:
             return False
         return True
 
+    def open_events_collection(self, ttl=0, profile=None):
+        """
+        Gets the 'events' collection, creating it as a time-series collection if it doesn't exist:
+        'timestamp' is the time field and 'meta' (run, user and server) the meta field.
+        :param ttl: [int] Seconds after which events are removed by the server (0 = never).
+        :param profile: [String] Connection profile of the returned collection. If not given, the current one is used.
+        :return: Collection
+        """
+
+        if "events" not in self.db.list_collection_names():
+            options = {"timeseries": {"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"}}
+            if ttl:
+                options["expireAfterSeconds"] = ttl
+            try:
+                self.db.create_collection("events", **options)
+                self.logger.info(f"Time-series collection 'events' created (TTL: {ttl or 'none'}).")
+            except errors.CollectionInvalid:
+                # Created by someone else in the meantime (e.g. another worker)
+                pass
+        elif ttl:
+            try:
+                self.db.command("collMod", "events", expireAfterSeconds=ttl)
+            except errors.OperationFailure as e:
+                self.logger.warning(f"Couldn't set the TTL of the 'events' collection: {e}")
+
+        return self.get_collection("events", profile)[0]
+
     # CRUD OPERATIONS
     # https://www.mongodb.com/docs/manual/crud/#create-operations
 
@@ -139,11 +262,44 @@ class PhantomDataManager:
         print(document)
         self.logger.info(f"Document '{document}' inserted in collection '{collection}'.")
 
-    def read_doc(self, collection, query):
+    def create_docs(self, collection, documents, profile=None):
+        """
+        Adds documents to a collection with unordered bulk inserts, 'batch_size' documents
+        (of the connection profile) at a time.
+        :param collection: [String] Name of the collection.
+        :param documents: [Iterable] Documents to be inserted.
+        :param profile: [String] Connection profile used for the inserts. If not given, the current one is used.
+        :return: [int] Number of documents inserted
+        """
+
+        # Verifies that given collection exists and is allowed in the db
+        if not self.exists_collection(collection):
+            return 0
+
+        target, batch_size = self.get_collection(collection, profile)
+        batch_size = batch_size or 1000
+        inserted = 0
+        batch = []
+        for document in documents:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                target.insert_many(batch, ordered=False)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            target.insert_many(batch, ordered=False)
+            inserted += len(batch)
+        self.logger.info(f"{inserted} document(s) inserted in collection '{collection}'.")
+        return inserted
+
+    def read_doc(self, collection, query, projection=None, batch_size=None):
         """
         Reads documents found from the given collection and query.
         :param collection: [String] Name of the collection.
         :param query: [Dictionary] Query to find the document(s)
+        :param projection: [Dictionary] Fields to be returned by the server. If not given, returns every field.
+        :param batch_size: [int] Number of documents fetched from the server per round trip.
+        If not given, the batch size of the connection profile is used.
         :return: Documents
         """
 
@@ -152,8 +308,69 @@ class PhantomDataManager:
             return
 
         # Read document from collection
+        # The cursor is lazy, documents are fetched in batches as they get iterated
+        cursor = self.collections[collection].find(query, projection)
+        batch_size = batch_size or self.batch_size
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
         self.logger.info(f"Document(s) filtered by '{query}' query in collection '{collection}' has been read.")
-        return self.collections[collection].find(query)
+        return cursor
+
+    def sample_docs(self, collection, query, size, projection=None):
+        """
+        Reads random documents with the $sample aggregation stage, in as few round trips as possible.
+        Without a query, $sample is the first stage and the server picks random documents
+        directly instead of scanning the collection.
+        :param collection: [String] Name of the collection.
+        :param query: [Dictionary] Query the documents are sampled from.
+        :param size: [int] Number of documents. Fewer are returned if fewer match.
+        :param projection: [Dictionary] Fields to be returned by the server. If not given, returns every field.
+        :return: [List] Documents
+        """
+
+        # Verifies that given collection exists and is allowed in the db
+        if not self.exists_collection(collection):
+            return []
+
+        pipeline = [{"$match": query}] if query else []
+        pipeline.append({"$sample": {"size": size}})
+        if projection:
+            pipeline.append({"$project": projection})
+        documents = list(self.collections[collection].aggregate(pipeline, batchSize=size))
+        self.logger.info(f"{len(documents)} document(s) sampled by '{query}' query in collection '{collection}'.")
+        return documents
+
+    def count_doc(self, collection, query):
+        """
+        Counts the documents found with the given query in the given collection.
+        The count is done by the server, no document is transferred.
+        :param collection: [String] Name of the collection.
+        :param query: [Dictionary] Query to find the document(s).
+        :return: [int] Number of documents
+        """
+
+        # Verifies that given collection exists and is allowed in the db
+        if not self.exists_collection(collection):
+            return 0
+
+        count = self.collections[collection].count_documents(query)
+        self.logger.info(f"{count} document(s) filtered by '{query}' query in collection '{collection}' counted.")
+        return count
+
+    def exists_doc(self, collection, query):
+        """
+        Verifies that at least one document matches the given query in the given collection.
+        The server stops counting at the first match.
+        :param collection: [String] Name of the collection.
+        :param query: [Dictionary] Query to find the document(s).
+        :return: Boolean
+        """
+
+        # Verifies that given collection exists and is allowed in the db
+        if not self.exists_collection(collection):
+            return False
+
+        return self.collections[collection].count_documents(query, limit=1) > 0
 
     def update_doc(self, collection, query, new_values):
         """
@@ -161,34 +378,36 @@ class PhantomDataManager:
         :param collection: [String] Name of the collection.
         :param query: [Dictionary] Query to find the document(s).
         :param new_values: [Dictionary] New values for the document(s).
+        :return: [int] Number of documents modified
         """
 
         # Verifies that given collection exists and is allowed in the db
         if not self.exists_collection(collection):
-            return
-
-        # Saves old document value for logging (or to restore a change)
-        old_values = self.read_doc(collection, query)
+            return 0
 
         # Update document from collection
         # self.collections[collection].update_many(query, new_values)
 
-        self.collections[collection].update_many(query, {"$set": new_values})
+        result = self.collections[collection].update_many(query, {"$set": new_values})
         self.logger.info(
             f"Documents filtered by '{query}' query in collection '{collection}' were updated. "
-            f"Old value: '{old_values}' New value: '{new_values}'")
+            f"Matched: {result.matched_count}, Modified: {result.modified_count}, New value: '{new_values}'")
+        return result.modified_count
 
     def remove_doc(self, collection, query):
         """
         Removes documents found with the given query in the given collection.
         :param collection: [String] Name of the collection.
         :param query: [Dictionary] Query to find the document(s).
+        :return: [int] Number of documents removed
         """
 
         # Verifies that given collection exists and is allowed in the db
         if not self.exists_collection(collection):
-            return
+            return 0
 
         # Delete document from collection
-        self.collections[collection].delete_many(query)
-        self.logger.info(f"Document(s) filtered by '{query}' query in collection '{collection}' has been removed.")
+        result = self.collections[collection].delete_many(query)
+        self.logger.info(f"{result.deleted_count} document(s) filtered by '{query}' query in collection "
+                         f"'{collection}' has been removed.")
+        return result.deleted_count
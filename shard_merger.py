@@ -0,0 +1,217 @@
+import ast
+import csv
+import gzip
+import heapq
+import io
+import json
+import logging
+import lzma
+import xml.etree.ElementTree as ET
+
+from functools import partial
+from operator import itemgetter
+
+# Decompressors of the extensions BlockCompressor writes. Both modules read
+# multi-member files, so block compressed exports are read as one stream.
+DECOMPRESSORS = {
+    "gz": gzip.open,
+    "xz": lzma.open
+}
+
+
+def read_log(text):
+    for line in text:
+        if line.strip():
+            # '<datetime> - <event as JSON>'
+            yield json.loads(line.split(" - ", 1)[1])
+
+
+def read_ndjson(text):
+    for line in text:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_json(text, chunk_size):
+    # The file is a single JSON array, so it's decoded one element at the time
+    # from a sliding window instead of being loaded with json.load
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,[":
+            position += 1
+        if position < len(buffer):
+            if buffer[position] == "]":
+                return
+            try:
+                event, position = decoder.raw_decode(buffer, position)
+                yield event
+                continue
+            except json.JSONDecodeError:
+                # Either the event continues in the next chunk, or the file is broken
+                if eof:
+                    raise
+        elif eof:
+            return
+        chunk = text.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def read_flat(text, delimiter, schema):
+    # Rebuilds the nested events from the columns, with the types of the schema
+    reader = csv.reader(text, delimiter=delimiter, quotechar='"')
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = {field["path"]: field for field in schema.fields}
+    columns = []
+    for path in header:
+        field = fields.get(path, {"type": "str", "default": None})
+        # Booleans are written as 'True'/'False', and bool('False') would be True
+        cast = partial(schema.convert, "bool") if field["type"] == "bool" else schema.types[field["type"]]
+        columns.append((path.split("."), cast, field["default"]))
+    for row in reader:
+        event = {}
+        for (keys, cast, default), value in zip(columns, row):
+            target = event
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = cast(value) if value != "" else default
+        yield event
+
+
+def read_xml(binary):
+    # Children are written as str(value), so nested values are read back as literals
+    iterator = ET.iterparse(binary, events=("start", "end"))
+    _, root = next(iterator)
+    for action, element in iterator:
+        if action != "end" or element.tag != "Event":
+            continue
+        event = {}
+        for child in element:
+            text = child.text or ""
+            if child.tag == "timestamp":
+                event[child.tag] = float(text)
+            elif child.tag == "sequence":
+                event[child.tag] = int(text) if text != "None" else None
+            elif text.startswith("{"):
+                event[child.tag] = ast.literal_eval(text)
+            else:
+                event[child.tag] = text
+        # Frees the events already read, so memory doesn't grow with the file
+        root.clear()
+        yield event
+
+
+class ShardMerger:
+    """
+    Merges files of time-sorted events (e.g. the shards of a distribute run) into a single
+    time-ordered stream. Each shard is read lazily through a large buffer, and a heap holds
+    only the next event of each one (plus a bounded reorder window per shard), so memory
+    doesn't depend on the size of the shards.
+    """
+
+    formats = ("log", "ndjson", "json", "csv", "tsv", "xml")
+
+    def __init__(self, schema, buffer_size=1048576, reorder_window=10000):
+        """
+        :param schema: [EventSchema] Columns of the csv and tsv shards.
+        :param buffer_size: [int] Bytes read at once from each shard.
+        :param reorder_window: [int] Events of each shard sorted in memory before the merge.
+        """
+
+        self.schema = schema
+        self.buffer_size = buffer_size
+        self.reorder_window = reorder_window
+        self.logger = logging.getLogger("ShardMerger")
+
+    def get_format(self, path):
+        """
+        Gets the format of a shard from its extension, e.g. 'log' for 'events_w0.log.gz'.
+        :param path: [String] Shard file.
+        :return: [String] Format, or None if it can't be merged
+        """
+
+        parts = path.split(".")
+        if parts[-1] in DECOMPRESSORS:
+            parts.pop()
+        return parts[-1] if len(parts) > 1 and parts[-1] in self.formats else None
+
+    def open_binary(self, path):
+        extension = path.rsplit(".", 1)[-1]
+        if extension in DECOMPRESSORS:
+            return io.BufferedReader(DECOMPRESSORS[extension](path, "rb"), self.buffer_size)
+        return open(path, "rb", buffering=self.buffer_size)
+
+    def read_shard(self, path):
+        """
+        Reads the events of a shard one at the time.
+        :param path: [String] Shard file.
+        :return: [Generator] Events
+        """
+
+        format_str = self.get_format(path)
+        with self.open_binary(path) as binary:
+            if format_str == "xml":
+                events = read_xml(binary)
+            else:
+                newline = "" if format_str in ("csv", "tsv") else None
+                text = io.TextIOWrapper(binary, encoding="utf-8", newline=newline)
+                if format_str == "log":
+                    events = read_log(text)
+                elif format_str == "ndjson":
+                    events = read_ndjson(text)
+                elif format_str == "json":
+                    events = read_json(text, self.buffer_size)
+                else:
+                    events = read_flat(text, "," if format_str == "csv" else "\t", self.schema)
+            yield from self.reorder(path, events)
+
+    def reorder(self, path, events):
+        # Shards can be slightly out of order, e.g. the last events of a seeded distribute
+        # chunk can be later than the first ones of the next chunk of the same worker.
+        # A heap of the next 'reorder_window' events puts them back in order, as long as
+        # no event is further than that from its place. If one is, the merge fails rather
+        # than writing it out of order.
+        heap = []
+        last = float("-inf")
+        pending = enumerate(events)
+        while True:
+            item = next(pending, None)
+            if item is not None:
+                index, event = item
+                entry = (event["timestamp"], index, event)
+                if len(heap) < self.reorder_window:
+                    heapq.heappush(heap, entry)
+                    continue
+                timestamp, index, event = heapq.heappushpop(heap, entry)
+            elif heap:
+                timestamp, index, event = heapq.heappop(heap)
+            else:
+                return
+            if timestamp < last:
+                raise ValueError(f"Event {index + 1} of '{path}' is more than {self.reorder_window} events away "
+                                 f"from its place in time order. Merge it with a larger 'merge_reorder_window'.")
+            last = timestamp
+            yield event
+
+    def merge(self, paths, sinks):
+        """
+        Merges the shards in time order and writes the events to the sinks. Events with
+        the same timestamp keep the order of the shards.
+        :param paths: [List-of String] Shard files.
+        :param sinks: [EventFanout] Sinks the merged stream is written to.
+        :return: [int] Number of events merged
+        :raises ValueError: If a shard is more out of order than the reorder window can fix
+        """
+
+        count = 0
+        for event in heapq.merge(*(self.read_shard(path) for path in paths), key=itemgetter("timestamp")):
+            sinks.write(event)
+            count += 1
+        self.logger.info(f"{count} events merged from {len(paths)} shards.")
+        return count
@@ -0,0 +1,171 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from collections import Counter
+
+PROFILE_MODES = ("cpu", "memory", "all")
+PROFILE_SORTS = ("cumulative", "tottime", "calls")
+
+
+def frame_name(code):
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stacks of every thread at a fixed interval and counts them, to be
+    written as collapsed stacks ('thread;outer;...;inner count' lines), the input
+    of flamegraph.pl, speedscope and most flame graph tools. Unlike cProfile, it
+    sees the sink and compression threads too.
+    """
+
+    def __init__(self, interval):
+        """
+        :param interval: [float] Seconds between two samples.
+        """
+
+        super().__init__(name="StackSampler", daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def save(self, path):
+        """
+        Writes the sampled stacks in collapsed format.
+        :param path: [String] Output file.
+        """
+
+        with open(path, "w") as file:
+            for stack, count in sorted(self.stacks.items()):
+                file.write(f"{stack} {count}\n")
+
+
+class ShellProfiler:
+    """
+    Runs shell commands under cProfile (CPU time of the shell thread), tracemalloc
+    (memory allocated by every thread) and optionally the stack sampler, and reports
+    the top functions and allocation sites.
+    """
+
+    def __init__(self, config_manager):
+        self.config_manager = config_manager
+        self.logger = logging.getLogger("ShellProfiler")
+        self.logger.info("ShellProfiler component initialized.")
+
+    def run(self, function, argument, mode="cpu"):
+        """
+        Calls a function under the profilers of the mode.
+        :param function: [Function] Function to be profiled (e.g. the shell's onecmd).
+        :param argument: [Any] Argument of the function.
+        :param mode: [String] cpu, memory or all.
+        :return: [List-of String] Report lines
+        """
+
+        config = self.config_manager.get_global_config("profile_top", "profile_sort", "profile_collapsed",
+                                                       "profile_sample_interval", "profile_memory_frames")
+        top = int(config["profile_top"])
+        profiler = cProfile.Profile() if mode in ("cpu", "all") else None
+        sampler = StackSampler(float(config["profile_sample_interval"])) if config["profile_collapsed"] else None
+        memory = mode in ("memory", "all")
+
+        if memory:
+            tracemalloc.start(int(config["profile_memory_frames"]))
+        if sampler is not None:
+            sampler.start()
+        started = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.runcall(function, argument)
+            else:
+                function(argument)
+        finally:
+            elapsed = time.perf_counter() - started
+            if sampler is not None:
+                sampler.stop()
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+        lines = [f"Profiled '{argument}' in {elapsed:.2f}s."]
+        if profiler is not None:
+            lines += self.cpu_report(profiler, config["profile_sort"], top)
+        if memory:
+            lines += self.memory_report(snapshot, current, peak, top)
+        if sampler is not None:
+            sampler.save(config["profile_collapsed"])
+            lines.append(f"{sampler.samples} stack samples written to '{config['profile_collapsed']}'.")
+        self.logger.info(f"Profiled '{argument}' ({mode}) in {elapsed:.2f}s.")
+        return lines
+
+    def cpu_report(self, profiler, sort, top):
+        """
+        Formats the functions with the most time.
+        :param profiler: [Profile] Profiler that ran the command.
+        :param sort: [String] cumulative, tottime or calls.
+        :param top: [int] Number of functions.
+        :return: [List-of String] Report lines
+        """
+
+        stats = pstats.Stats(profiler)
+        column = {"calls": 1, "tottime": 2, "cumulative": 3}[sort if sort in PROFILE_SORTS else "cumulative"]
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][column], reverse=True)[:top]
+        lines = [f"Top {len(rows)} functions by {sort} time ({stats.total_calls} calls, {stats.total_tt:.2f}s):",
+                 f"{'calls':>12}{'tottime':>10}{'cumtime':>10}  function"]
+        for (filename, line, name), (_, calls, tottime, cumtime, _) in rows:
+            location = f"{os.path.basename(filename)}:{line}({name})" if line else name
+            lines.append(f"{calls:>12}{tottime:>10.3f}{cumtime:>10.3f}  {location}")
+        return lines
+
+    def memory_report(self, snapshot, current, peak, top):
+        """
+        Formats the allocation sites still holding the most memory when the command finished.
+        They explain what the command leaves behind, not its peak: memory freed before
+        the end (e.g. buffers of a finished export) isn't in the snapshot.
+        :param snapshot: [Snapshot] tracemalloc snapshot taken when the command finished.
+        :param current: [int] Bytes still allocated.
+        :param peak: [int] Most bytes allocated at once.
+        :param top: [int] Number of allocation sites.
+        :return: [List-of String] Report lines
+        """
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ))
+        statistics = snapshot.statistics("lineno")[:top]
+        lines = [f"Memory: peak {peak / 2 ** 20:.1f} MiB, {current / 2 ** 20:.1f} MiB still held at exit.",
+                 f"Top {len(statistics)} allocation sites still held at exit (not a breakdown of the peak):",
+                 f"{'size (KiB)':>12}{'blocks':>10}  site"]
+        for statistic in statistics:
+            frame = statistic.traceback[0]
+            lines.append(f"{statistic.size / 1024:>12.1f}{statistic.count:>10}  "
+                         f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return lines
@@ -0,0 +1,228 @@
+import logging
+import pickle
+import tempfile
+import threading
+
+from collections import deque
+
+
+class SinkError(Exception):
+    """
+    Raised in the generator's thread when the writer of a sink failed in its own thread.
+    The original error is its cause.
+    """
+
+
+class SinkChannel:
+    """
+    Queue between the generator and the writer thread of one sink.
+    Events travel in batches. When the queue is full, the generator either waits for
+    the sink (overflow 'block') or the batches are spilled to a temporary file and
+    read back by the sink once it catches up (overflow 'spill'), so a slow sink
+    never stalls the others.
+    """
+
+    def __init__(self, writer, capacity, overflow="spill", spill_dir=None):
+        """
+        :param writer: [EventWriter] Writer of the sink.
+        :param capacity: [int] Batches kept in memory.
+        :param overflow: [String] 'spill' or 'block'.
+        :param spill_dir: [String] Directory of the spill file. If not given, the system temp directory is used.
+        """
+
+        self.writer = writer
+        self.capacity = capacity
+        self.overflow = overflow
+        self.spill_dir = spill_dir or None
+        self.logger = logging.getLogger("SinkChannel")
+
+        self.condition = threading.Condition()
+        self.buffer = deque()
+        # Batches put but not written yet, used to wait for the sink to catch up
+        self.pending = 0
+        self.closed = False
+        self.error = None
+
+        # The spill file is only created the first time the queue overflows
+        self.spill = None
+        self.spilled = 0
+        self.spill_read_offset = 0
+
+        self.thread = threading.Thread(target=self.run, name=f"Sink-{writer.filename}", daemon=True)
+        self.thread.start()
+
+    def put(self, batch):
+        """
+        Queues a batch of events for the sink.
+        :param batch: [List] Events.
+        """
+
+        with self.condition:
+            if self.error:
+                raise self.error
+            if self.overflow == "block":
+                while len(self.buffer) >= self.capacity and not self.error:
+                    self.condition.wait()
+                self.buffer.append(batch)
+            elif self.spilled or len(self.buffer) >= self.capacity:
+                # Once something is spilled, everything goes to the spill file
+                # until the sink reads it back, so the order is kept
+                self.spill_batch(batch)
+            else:
+                self.buffer.append(batch)
+            self.pending += 1
+            self.condition.notify_all()
+
+    def spill_batch(self, batch):
+        if self.spill is None:
+            self.spill = tempfile.TemporaryFile(prefix="pyeventgen_spill_", dir=self.spill_dir)
+            self.logger.warning(f"Sink '{self.writer.filename}' is falling behind, spilling events to disk.")
+        self.spill.seek(0, 2)
+        pickle.dump(batch, self.spill, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled += 1
+
+    def unspill_batches(self):
+        # Moves spilled batches back into memory, oldest first
+        self.spill.seek(self.spill_read_offset)
+        while self.spilled and len(self.buffer) < self.capacity:
+            self.buffer.append(pickle.load(self.spill))
+            self.spilled -= 1
+        self.spill_read_offset = self.spill.tell()
+        if not self.spilled:
+            self.spill.seek(0)
+            self.spill.truncate()
+            self.spill_read_offset = 0
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.buffer and not self.spilled and not self.closed:
+                    self.condition.wait()
+                if not self.buffer and self.spilled:
+                    self.unspill_batches()
+                if not self.buffer:
+                    break
+                batch = self.buffer.popleft()
+                self.condition.notify_all()
+            try:
+                for event in batch:
+                    self.writer.write(event)
+            except Exception as e:
+                error = SinkError(f"Sink '{self.writer.filename}' failed: {e}")
+                error.__cause__ = e
+                self.logger.error(str(error))
+                with self.condition:
+                    self.error = error
+                    self.condition.notify_all()
+                return
+            with self.condition:
+                self.pending -= 1
+                self.condition.notify_all()
+
+    def wait(self):
+        """
+        Waits until the sink has written every batch put so far.
+        """
+
+        with self.condition:
+            while self.pending and not self.error:
+                self.condition.wait()
+            if self.error:
+                raise self.error
+
+    def close(self):
+        """
+        Lets the sink write what's left and stops its thread.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        if self.spill is not None:
+            self.spill.close()
+        if self.error:
+            raise self.error
+
+
+class EventFanout:
+    """
+    Sends every generated event to several sinks, each one rendering and writing
+    from its own thread.
+    """
+
+    def __init__(self, writers, batch_size=256, capacity=64, overflow="spill", spill_dir=None):
+        """
+        :param writers: [List-of EventWriter] Writers of the sinks.
+        :param batch_size: [int] Events handed to the sinks at once.
+        :param capacity: [int] Batches kept in memory per sink.
+        :param overflow: [String] What happens when a sink falls behind, 'spill' or 'block'.
+        :param spill_dir: [String] Directory of the spill files.
+        """
+
+        self.writers = writers
+        self.batch_size = batch_size
+        self.batch = []
+        self.channels = [SinkChannel(writer, capacity, overflow, spill_dir) for writer in writers]
+        self.closed = False
+        self.logger = logging.getLogger("EventFanout")
+        self.logger.info(f"Fanning out to {len(writers)} sinks ({overflow} on overflow).")
+
+    def write(self, event):
+        """
+        Sends an event to every sink.
+        :param event: [Dictionary] Event. Sinks only read it, so the same dictionary is shared.
+        """
+
+        self.batch.append(event)
+        if len(self.batch) >= self.batch_size:
+            self.send_batch()
+
+    def send_batch(self):
+        if not self.batch:
+            return
+        for channel in self.channels:
+            channel.put(self.batch)
+        self.batch = []
+
+    def sync(self):
+        """
+        Waits until every sink has written every event sent so far, so the writers
+        are idle and their offsets can be read.
+        """
+
+        self.send_batch()
+        for channel in self.channels:
+            channel.wait()
+
+    def push(self):
+        """
+        Waits until every sink has written every event sent so far, then has the writers
+        write their buffered events out without syncing them, so the files can be read
+        while the run goes on (e.g. by a consumer of a paced replay).
+        """
+
+        self.sync()
+        for writer in self.writers:
+            writer.push()
+
+    def close(self):
+        """
+        Sends the remaining events and stops every sink thread. The writers are left open.
+        If a sink failed, the other threads are still stopped before its error is raised.
+        :raises SinkError: If a sink failed
+        """
+
+        self.closed = True
+        error = None
+        try:
+            self.send_batch()
+        except SinkError as e:
+            error = e
+        for channel in self.channels:
+            try:
+                channel.close()
+            except SinkError as e:
+                error = error or e
+        if error is not None:
+            raise error
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# The modules of PyEventGen live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from entity_snapshot import write_snapshot  # noqa: E402
+
+SNAPSHOT_USERS = [{"username": f"usr_{i}", "role": "admin", "ip_address": f"10.0.0.{i}", "group": "g1"}
+                  for i in range(20)]
+SNAPSHOT_SERVERS = [{"server_name": f"srv_{i}", "server_type": "web", "ip_address": f"10.1.0.{i}", "group": "g1"}
+                    for i in range(5)]
+
+
+@pytest.fixture
+def make_shell(tmp_path, monkeypatch):
+    # Shells started from a snapshot, so they don't need MongoDB
+    from command_line import PyEventGenShell
+    monkeypatch.setattr(PyEventGenShell, "clear_console", lambda self: None)
+    monkeypatch.setattr(PyEventGenShell, "setup_history", lambda self: None)
+    snapshot_path = str(tmp_path / "entities.snap")
+    write_snapshot(snapshot_path, SNAPSHOT_USERS, SNAPSHOT_SERVERS)
+
+    def make_shell(**config):
+        shell = PyEventGenShell(snapshot_path)
+        for attribute, value in dict({"shell_verbose": "False"}, **config).items():
+            shell.config_manager.set_global_config(attribute, value)
+        return shell
+    return make_shell
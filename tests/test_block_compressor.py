@@ -0,0 +1,84 @@
+import gzip
+import lzma
+import os
+
+import pytest
+
+from block_compressor import BlockCompressor
+from output_buffer import OutputBuffer
+
+DECOMPRESS = {"gzip": gzip.decompress, "xz": lzma.decompress}
+
+
+def lines(first, last):
+    return b"".join(f"event {i} with some padding to fill the blocks\n".encode("ascii") for i in range(first, last))
+
+
+def read_index(path):
+    with open(path, "r") as index:
+        return [[int(field) for field in line.split("\t")] for line in index]
+
+
+def open_compressor(path, codec, resume_offset=None):
+    return BlockCompressor(OutputBuffer(str(path), resume_offset, buffer_size=256, fsync="none"), codec,
+                           block_size=1000, threads=3, index_path=f"{path}.idx")
+
+
+@pytest.mark.parametrize("codec", ["gzip", "xz"])
+def test_blocks_decompress_as_one_stream_and_one_by_one(tmp_path, codec):
+    path = tmp_path / f"events.log.{codec}"
+    data = lines(0, 500)
+    compressor = open_compressor(path, codec)
+    for i in range(0, len(data), 77):
+        compressor.write(data[i:i + 77])
+    compressor.close()
+
+    compressed = path.read_bytes()
+    assert DECOMPRESS[codec](compressed) == data
+    index = read_index(f"{path}.idx")
+    assert len(index) > 1
+    # Every block is found by the index alone, and they cover the data without gaps
+    position = 0
+    for uncompressed_offset, size, compressed_offset, compressed_size in index:
+        assert uncompressed_offset == position
+        block = DECOMPRESS[codec](compressed[compressed_offset:compressed_offset + compressed_size])
+        assert block == data[uncompressed_offset:uncompressed_offset + size]
+        position += size
+    assert position == len(data)
+    assert index[-1][2] + index[-1][3] == len(compressed)
+
+
+@pytest.mark.parametrize("codec", ["gzip", "xz"])
+def test_resume_drops_the_blocks_after_the_offset(tmp_path, codec):
+    path = tmp_path / f"events.log.{codec}"
+    compressor = open_compressor(path, codec)
+    compressor.write(lines(0, 100))
+    offset = compressor.tell()
+    # Written after the checkpoint, lost when the run is resumed
+    compressor.write(lines(100, 200))
+    compressor.close()
+
+    compressor = open_compressor(path, codec, resume_offset=offset)
+    compressor.write(lines(100, 300))
+    compressor.close()
+
+    compressed = path.read_bytes()
+    assert DECOMPRESS[codec](compressed) == lines(0, 300)
+    index = read_index(f"{path}.idx")
+    assert [entry[0] for entry in index] == [sum(entry[1] for entry in index[:i]) for i in range(len(index))]
+    assert index[-1][2] + index[-1][3] == len(compressed)
+
+
+def test_sync_syncs_the_index_and_the_file(tmp_path, monkeypatch):
+    path = tmp_path / "events.log.gz"
+    compressor = open_compressor(path, "gzip")
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+
+    compressor.write(lines(0, 10))
+    compressor.sync()
+
+    assert sorted(synced) == sorted([compressor.index.fileno(), compressor.file.fd])
+    assert len(read_index(f"{path}.idx")) == 1
+    compressor.close()
@@ -0,0 +1,57 @@
+import glob
+import json
+
+from campaign_injector import CampaignInjector
+from entity_pool import EntityPool
+
+CAMPAIGNS = [
+    {"type": "brute_force", "start": 30, "attempts": 40, "rate": 4},
+    {"type": "lateral_movement", "start": 60, "hops": 3, "interval": 20},
+    {"type": "exfiltration", "start": 90, "exports": 50, "rate": 10}
+]
+USERS = [{"username": f"usr_{i}", "role": "admin", "ip_address": f"10.0.0.{i}"} for i in range(20)]
+SERVERS = [{"server_name": f"srv_{i}", "server_type": "web", "ip_address": f"10.1.0.{i}"} for i in range(5)]
+
+
+def build_event(timestamp, user, server, action, rng):
+    return {"timestamp": timestamp, "user": user["username"], "server": server["server_name"], "action": action,
+            "details": {"user_ip": user["ip_address"], "nonce": rng.random()}}
+
+
+def campaign_events(campaigns, seed):
+    injector = CampaignInjector(campaigns, seed, 1700000000.0, EntityPool(USERS, SERVERS), build_event)
+    # Sequence numbers depend on the events of the other campaigns
+    return [{key: value for key, value in event.items() if key != "sequence"}
+            for event in injector.pop_until(float("inf"), 0)]
+
+
+def run_labels(make_shell, directory, monkeypatch, seed):
+    monkeypatch.chdir(directory)
+    make_shell(campaigns=str(directory.parent / "campaigns.json"), start_time="1700000000",
+               event_rate="2").onecmd(f"generate_events 1000 {{}} {{}} ndjson {seed}")
+    labels, = glob.glob("events_*.labels.jsonl")
+    with open(labels, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_seeded_run_injects_the_same_labelled_campaigns(make_shell, tmp_path, monkeypatch):
+    (tmp_path / "campaigns.json").write_text(json.dumps(CAMPAIGNS))
+    for name in ("first", "second", "other"):
+        (tmp_path / name).mkdir()
+
+    first = run_labels(make_shell, tmp_path / "first", monkeypatch, 42)
+    second = run_labels(make_shell, tmp_path / "second", monkeypatch, 42)
+    other = run_labels(make_shell, tmp_path / "other", monkeypatch, 43)
+
+    assert len(first) == 40 + 1 + 3 * 3 + 5 + 50
+    assert {label["scenario"] for label in first} == {"brute_force", "lateral_movement", "exfiltration"}
+    assert second == first
+    assert other != first
+
+
+def test_adding_a_campaign_doesnt_change_the_others():
+    alone = campaign_events(CAMPAIGNS[:2], 42)
+    together = campaign_events(CAMPAIGNS, 42)
+
+    assert [event for event in together if event["action"] not in ("database_query", "data_export")] == alone
+    assert campaign_events(CAMPAIGNS[:2], 7) != alone
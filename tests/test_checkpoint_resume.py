@@ -0,0 +1,70 @@
+import glob
+import itertools
+import multiprocessing
+import os
+
+import pytest
+
+CONFIG = {
+    "checkpoint_interval": "700",
+    "start_time": "1700000000",
+    # Small buffers, so events after the last checkpoint are on disk when the run crashes
+    "output_buffer_size": "512",
+    "compression_block_size": "4096"
+}
+
+
+def crash_after(shell, count):
+    # The process dies like on a power cut: nothing is flushed or closed
+    generate_event = shell.event_manager.generate_event
+    calls = itertools.count(1)
+
+    def crashing(*args):
+        if next(calls) > count:
+            os._exit(1)
+        return generate_event(*args)
+    shell.event_manager.generate_event = crashing
+
+
+def read_files(directory):
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory, "events_*"))):
+        with open(path, "rb") as file:
+            files[os.path.basename(path)] = file.read()
+    return files
+
+
+@pytest.mark.parametrize("formats, compression", [
+    ("log,ndjson", "none"),
+    ("json,csv,xml", "none"),
+    ("log,json", "gzip"),
+    ("ndjson", "xz")
+])
+def test_resumed_run_is_identical_to_an_uninterrupted_one(make_shell, tmp_path, monkeypatch, formats, compression):
+    command = f"generate_events 3000 {{}} {{}} {formats} 42"
+    config = dict(CONFIG, export_compression=compression)
+    (tmp_path / "full").mkdir()
+    (tmp_path / "resumed").mkdir()
+    monkeypatch.chdir(tmp_path / "full")
+    make_shell(**config).onecmd(command)
+
+    monkeypatch.chdir(tmp_path / "resumed")
+
+    def crashing_run():
+        shell = make_shell(**config)
+        crash_after(shell, 2000)
+        shell.onecmd(command)
+    process = multiprocessing.get_context("fork").Process(target=crashing_run)
+    process.start()
+    process.join(60)
+    assert process.exitcode == 1
+    checkpoints = glob.glob("events_*.checkpoint.json")
+    assert len(checkpoints) == 1
+    make_shell(**config).onecmd(f"resume {checkpoints[0]}")
+
+    full = read_files(tmp_path / "full")
+    resumed = read_files(tmp_path / "resumed")
+    # Both runs name their files after the time they started
+    assert len(full) == len(resumed) > 1
+    for (_, full_data), (_, resumed_data) in zip(full.items(), resumed.items()):
+        assert resumed_data == full_data
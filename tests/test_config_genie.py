@@ -0,0 +1,32 @@
+import pytest
+
+from config_genie import ConfigGenie
+
+
+@pytest.mark.parametrize("attribute, value", [
+    ("page_size", "20"),
+    ("event_rate", "0.5"),
+    ("start_time", ""),
+    ("compression_level", "9"),
+    ("export_compression", "xz"),
+    ("journal", ""),
+    ("spill_dir", "/any/free/text")
+])
+def test_valid_values_are_accepted(attribute, value):
+    assert ConfigGenie().validate_value(attribute, value) is None
+
+
+@pytest.mark.parametrize("attribute, value", [
+    ("page_size", "0"),
+    ("page_size", "2.5"),
+    ("compression_level", "10"),
+    ("export_compression", "zip"),
+    ("shell_verbose", "true"),
+    ("checkpoint_interval", ""),
+    ("event_rate", "nan"),
+    ("stats_interval", "inf"),
+    ("distributed_eps", "-inf"),
+    ("start_time", "NaN")
+])
+def test_invalid_values_are_rejected(attribute, value):
+    assert ConfigGenie().validate_value(attribute, value) is not None
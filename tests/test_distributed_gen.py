@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+
+import pytest
+
+import distributed_gen
+from config_genie import ConfigGenie
+from distributed_gen import GenerationCoordinator, GenerationWorker
+
+USERS = [{"username": f"usr_{i}", "role": "admin", "ip_address": f"10.0.0.{i}"} for i in range(20)]
+SERVERS = [{"server_name": f"srv_{i}", "server_type": "web", "ip_address": f"10.1.0.{i}"} for i in range(5)]
+
+
+def make_job(config_manager, count, chunk_size, eps=0):
+    # Same job do_distribute sends, with the entities inline
+    config = config_manager.get_global_config()
+    return {
+        "count": count,
+        "servers_query": {},
+        "users_query": {},
+        "formats": ["ndjson"],
+        "seed": 7,
+        "event_mix": None,
+        "event_details": False,
+        "ip_enrichment": [],
+        "start_time": 1700000000.0,
+        "event_rate": 10.0,
+        "eps": eps,
+        "rate": 0,
+        "chunk_size": chunk_size,
+        "prefix": "events_test",
+        "config": dict(config),
+        "entities": {"users": USERS, "servers": SERVERS}
+    }
+
+
+def read_sequences(outputs):
+    sequences = []
+    for output in outputs:
+        with open(output["filename"], "r", encoding="utf-8") as file:
+            sequences.extend(json.loads(line)["sequence"] for line in file)
+    return sequences
+
+
+@pytest.fixture
+def coordinator(tmp_path, monkeypatch):
+    # Workers write their files to the working directory they're started in
+    monkeypatch.chdir(tmp_path)
+    coordinator = GenerationCoordinator(ConfigGenie())
+    yield coordinator
+    for process, _ in coordinator.processes:
+        process.kill()
+        process.wait()
+
+
+def test_local_workers_generate_every_event_once(coordinator):
+    job = make_job(coordinator.config_manager, 25000, 2000)
+
+    summary = coordinator.run(job, coordinator.spawn_local_workers(3))
+
+    assert summary["events"] == 25000
+    assert sum(worker["events"] for worker in summary["workers"]) == 25000
+    assert sum(output["events"] for output in summary["outputs"]) == 25000
+    assert sorted(read_sequences(summary["outputs"])) == list(range(25000))
+    assert summary["partial"] == []
+
+
+def test_lost_local_worker_output_is_dropped(coordinator):
+    # A small buffer puts part of the chunk being generated in the file before the worker is killed,
+    # and the job is throttled, so it's still running then
+    coordinator.config_manager.set_global_config("output_buffer_size", "4096")
+    job = make_job(coordinator.config_manager, 12000, 500, eps=6000)
+    addresses = coordinator.spawn_local_workers(3)
+    process = coordinator.processes[0][0]
+    threading.Timer(0.6, process.kill).start()
+
+    summary = coordinator.run(job, addresses)
+
+    assert process.poll() is not None
+    assert summary["events"] == 12000
+    sequences = read_sequences(summary["outputs"])
+    assert len(sequences) == len(set(sequences))
+    assert sorted(sequences) == list(range(12000))
+
+
+def test_worker_that_cant_open_the_job_is_replaced(coordinator, monkeypatch):
+    job = make_job(coordinator.config_manager, 6000, 500)
+    addresses = coordinator.spawn_local_workers(2)
+    # Only the second worker gets a snapshot path that doesn't exist
+    job["snapshot"] = "/nonexistent/entities.snap"
+    job["snapshot_version"] = "0"
+    send = distributed_gen.Connection.send
+
+    def send_job(connection, message):
+        if message["type"] == "job" and message["job"]["worker_id"] == 0:
+            message = dict(message, job={key: value for key, value in message["job"].items()
+                                         if not key.startswith("snapshot")})
+        send(connection, message)
+
+    monkeypatch.setattr(distributed_gen.Connection, "send", send_job)
+    summary = coordinator.run(job, addresses)
+
+    assert summary["events"] == 6000
+    assert [worker["events"] for worker in summary["workers"]] == [6000, 0]
+    assert sorted(read_sequences(summary["outputs"])) == list(range(6000))
+
+
+@pytest.fixture
+def worker():
+    # Serves in a thread of the test, with its secret
+    worker = GenerationWorker(secret="right secret")
+    thread = threading.Thread(target=worker.serve, daemon=True)
+    thread.start()
+    yield worker
+    worker.close_job()
+    coordinator = GenerationCoordinator(ConfigGenie())
+    coordinator.secret = "right secret"
+    coordinator.connect(("127.0.0.1", worker.port)).send({"type": "shutdown"})
+    thread.join(5)
+
+
+def test_coordinator_with_another_secret_is_rejected(coordinator, worker):
+    coordinator.secret = "wrong secret"
+    connection = coordinator.connect(("127.0.0.1", worker.port))
+
+    assert connection.receive()["type"] == "error"
+    assert connection.receive() is None
+    connection.close()
+    # The worker still serves the coordinators that know the secret
+    coordinator.secret = "right secret"
+    summary = coordinator.run(make_job(coordinator.config_manager, 1000, 500), [("127.0.0.1", worker.port)])
+    assert sorted(read_sequences(summary["outputs"])) == list(range(1000))
+
+
+def test_worker_without_secret_only_listens_on_loopback():
+    with pytest.raises(ValueError):
+        GenerationWorker("0.0.0.0")
+
+
+def test_job_files_stay_in_the_working_directory(coordinator, worker, tmp_path):
+    job = make_job(coordinator.config_manager, 1000, 500)
+    job["prefix"] = "../../tmp/events_test"
+    job["formats"] = ["csv"]
+    job["schema"] = [{"path": "sequence", "type": "int", "default": 0}]
+    job["config"] = dict(job["config"], spill_dir="/nonexistent", event_schema="/nonexistent.json")
+    job["worker_id"] = 0
+
+    worker.open_job(job)
+
+    assert worker.config_manager.get_global_config("spill_dir")["spill_dir"] == ""
+    assert worker.config_manager.get_global_config("event_schema")["event_schema"] == ""
+    assert [os.path.dirname(os.path.abspath(writer.filename)) for writer in worker.sinks.writers] == [str(tmp_path)]
+    job["prefix"] = "/.."
+    with pytest.raises(ValueError):
+        worker.open_job(job)
@@ -0,0 +1,32 @@
+import json
+import os
+import threading
+
+from config_genie import ConfigGenie
+from event_replayer import EventReplayer
+from export_manager import ExportManager
+
+
+def test_paced_replay_reaches_the_files_as_it_goes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source = tmp_path / "events.ndjson"
+    source.write_text("".join(json.dumps({"timestamp": 1700000000 + second, "sequence": second}) + "\n"
+                              for second in range(10)))
+    # Default sink batches and output buffer, which hold far more than these events
+    export_manager = ExportManager(ConfigGenie())
+    sinks = export_manager.open_sinks(["ndjson"], prefix="replay_test")
+    replayer = EventReplayer(str(source), None)
+    replaying = threading.Thread(target=replayer.replay, args=(sinks, 20))
+    replaying.start()
+
+    sizes = set()
+    while replaying.is_alive():
+        sizes.add(os.path.getsize("replay_test.ndjson"))
+        replaying.join(0.01)
+    replayer.close()
+    export_manager.close_sinks(sinks)
+    lines = (tmp_path / "replay_test.ndjson").read_text().splitlines()
+
+    # The file grew while the events were being replayed, not only once at the end
+    assert len(sizes - {0}) >= 5
+    assert [json.loads(line)["sequence"] for line in lines] == list(range(10))
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from event_schema import DEFAULT_FIELDS, EventSchema
+
+FIELDS = [
+    {"path": "timestamp", "type": "float", "default": 0},
+    {"path": "details.port", "type": "int", "default": -1},
+    {"path": "user", "type": "str", "default": ""},
+    {"path": "details.admin", "type": "bool", "default": False},
+    {"path": "details.geo.site", "type": "str", "default": "none"}
+]
+
+
+def test_complete_events_keep_their_values_in_schema_order():
+    extract = EventSchema(FIELDS).compile_extractor()
+    event = {"user": "usr_1", "timestamp": 1.5, "details": {"admin": True, "port": 22, "geo": {"site": "dc1"}}}
+
+    assert extract(event) == (1.5, 22, "usr_1", True, "dc1")
+
+
+def test_missing_fields_take_their_defaults():
+    extract = EventSchema(FIELDS).compile_extractor()
+
+    assert extract({"timestamp": 2.0}) == (2.0, -1, "", False, "none")
+    # A parent that isn't a dictionary has none of the fields below it
+    assert extract({"timestamp": 2.0, "details": {"port": 80, "geo": "unknown"}}) == (2.0, 80, "", False, "none")
+
+
+def test_values_are_cast_to_the_type_of_their_column():
+    extract = EventSchema(FIELDS).compile_extractor()
+    event = {"timestamp": 3, "user": 7, "details": {"port": "443", "admin": "False", "geo": {"site": "dc2"}}}
+
+    assert extract(event) == (3.0, 443, "7", False, "dc2")
+    assert [type(value) for value in extract(event)] == [float, int, str, bool, str]
+
+
+def test_values_that_cant_be_cast_take_the_default():
+    extract = EventSchema(FIELDS).compile_extractor()
+    event = {"timestamp": "late", "user": "usr_2", "details": {"port": "ssh", "admin": "yes"}}
+
+    assert extract(event) == (0.0, -1, "usr_2", False, "none")
+
+
+def test_defaults_are_converted_and_types_checked(tmp_path):
+    assert EventSchema(FIELDS).fields[0]["default"] == 0.0
+    assert type(EventSchema(FIELDS).fields[0]["default"]) is float
+    with pytest.raises(ValueError):
+        EventSchema([{"path": "timestamp", "type": "datetime", "default": None}])
+
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps(FIELDS))
+    assert EventSchema.from_file(str(path)).header() == [field["path"] for field in FIELDS]
+    assert EventSchema().header() == [field["path"] for field in DEFAULT_FIELDS]
+
+
+@pytest.mark.parametrize("value, expected", [("True", True), ("False", False), (True, True), (0, False)])
+def test_booleans_are_parsed_from_their_text(value, expected):
+    assert EventSchema().convert("bool", value) is expected
+
+
+def test_other_boolean_text_is_rejected():
+    with pytest.raises(ValueError):
+        EventSchema().convert("bool", "false")
@@ -0,0 +1,74 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from event_stats import CountMinSketch, EventStats, HyperLogLog, hash64
+
+
+@pytest.mark.parametrize("count", [100, 5000, 50000, 300000])
+def test_distinct_estimate_is_within_the_error_bound(count):
+    sketch = HyperLogLog()
+    rng = random.Random(42)
+    values = [f"usr_{i}_{rng.getrandbits(32)}" for i in range(count)]
+    for value in values + values[:count // 2]:
+        sketch.add(hash64(value))
+
+    # Three standard errors of the 4096 registers, repeated values count once
+    assert abs(sketch.estimate() - count) <= 3 * 1.04 / math.sqrt(4096) * count
+
+
+def zipf_values(count, distinct, seed):
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, distinct + 1)]
+    return rng.choices([f"srv_{rank}" for rank in range(distinct)], weights, k=count)
+
+
+def test_frequency_estimates_are_never_lower_and_within_the_error_bound():
+    sketch = CountMinSketch()
+    values = zipf_values(100000, 20000, seed=7)
+    for value in values:
+        sketch.add(value, hash64(value))
+    counts = Counter(values)
+
+    # Over by at most e / width of the events with probability 1 - e^-depth per value
+    bound = math.e / sketch.width * len(values)
+    errors = []
+    for value, count in counts.items():
+        h1, h2 = hash64(value) & 0xFFFFFFFF, (hash64(value) >> 32) | 1
+        estimate = min(sketch.table[row * sketch.width + (h1 + row * h2) % sketch.width] for row in range(sketch.depth))
+        assert estimate >= count
+        errors.append(estimate - count)
+    assert sum(error > bound for error in errors) <= math.exp(-sketch.depth) * len(counts)
+
+
+def test_heavy_hitters_are_the_busiest_values():
+    sketch = CountMinSketch()
+    values = zipf_values(100000, 20000, seed=7)
+    for value in values:
+        sketch.add(value, hash64(value))
+    counts = Counter(values)
+
+    heavy_hitters = sketch.heavy_hitters()
+    assert [value for value, _ in heavy_hitters] == [value for value, _ in counts.most_common(10)]
+    assert all(estimate >= counts[value] for value, estimate in heavy_hitters)
+
+
+def test_statistics_survive_a_checkpoint():
+    rng = random.Random(3)
+    events = [{"action": rng.choice(["login", "logout"]), "user": f"usr_{rng.randrange(500)}",
+               "server": f"srv_{rng.randrange(50)}", "timestamp": 1700000000 + i,
+               "details": {"user_ip": f"10.0.{rng.randrange(4)}.{rng.randrange(256)}"}} for i in range(20000)]
+    full, resumed = EventStats(), EventStats()
+    for event in events:
+        full.add(event)
+    for event in events[:12000]:
+        resumed.add(event)
+    state = resumed.get_state()
+    resumed = EventStats()
+    resumed.set_state(state)
+    for event in events[12000:]:
+        resumed.add(event)
+
+    assert resumed.summary() == full.summary()
@@ -0,0 +1,74 @@
+import random
+
+from ip_enricher import IpEnricher, flatten
+
+
+def narrowest(ranges, address):
+    # What flatten should pick for one address: the narrowest range holding it, the later row on ties
+    holding = [(last - first, -row) for first, last, row in ranges if first <= address <= last]
+    return -min(holding)[1] if holding else None
+
+
+def lookup(segments, address):
+    for first, last, row in segments:
+        if first <= address <= last:
+            return row
+    return None
+
+
+def test_nested_ranges_pick_the_narrowest():
+    # A /16 site holding a /24 subnet holding a single host
+    ranges = [(0x0A010000, 0x0A01FFFF, 0), (0x0A010300, 0x0A0103FF, 1), (0x0A010304, 0x0A010304, 2)]
+
+    assert flatten(ranges) == [
+        (0x0A010000, 0x0A0102FF, 0),
+        (0x0A010300, 0x0A010303, 1),
+        (0x0A010304, 0x0A010304, 2),
+        (0x0A010305, 0x0A0103FF, 1),
+        (0x0A010400, 0x0A01FFFF, 0)
+    ]
+
+
+def test_overlapping_ranges_of_the_same_size_pick_the_later_row():
+    assert flatten([(0, 99, 0), (50, 149, 1)]) == [(0, 49, 0), (50, 149, 1)]
+    assert flatten([(50, 149, 0), (0, 99, 1)]) == [(0, 99, 1), (100, 149, 0)]
+
+
+def test_gaps_and_adjacent_ranges_of_the_same_row():
+    # Nothing covers 20-29, and the two ranges of row 1 touch, so they become one segment
+    assert flatten([(0, 19, 0), (30, 39, 1), (40, 49, 1)]) == [(0, 19, 0), (30, 49, 1)]
+    assert flatten([]) == []
+
+
+def test_flatten_matches_the_narrowest_range_of_every_address():
+    rng = random.Random(3)
+    for _ in range(50):
+        ranges = []
+        for row in range(rng.randrange(1, 12)):
+            first = rng.randrange(200)
+            ranges.append((first, first + rng.randrange(60), row))
+        segments = flatten(ranges)
+
+        assert all(previous[1] < current[0] for previous, current in zip(segments, segments[1:]))
+        for address in range(270):
+            assert lookup(segments, address) == narrowest(ranges, address)
+
+
+def test_enrich_adds_the_fields_of_the_narrowest_range_and_later_tables(tmp_path):
+    sites = tmp_path / "sites.csv"
+    sites.write_text("cidr,site,owner\n10.20.0.0/16,campus,it\n10.20.3.0/24,datacenter,infra\n")
+    assets = tmp_path / "assets.csv"
+    assets.write_text("start,end,owner,criticality\n10.20.3.1,10.20.3.9,dba,high\n")
+    enricher = IpEnricher([str(sites), str(assets)], ["user_ip", "server_ip"])
+
+    event = {"details": {"user_ip": "10.20.3.4", "server_ip": "10.20.9.9", "destination_ip": "10.20.3.4"}}
+    enricher.enrich(event)
+
+    assert event["details"] == {
+        "user_ip": "10.20.3.4", "user_ip_site": "datacenter", "user_ip_owner": "dba", "user_ip_criticality": "high",
+        "server_ip": "10.20.9.9", "server_ip_site": "campus", "server_ip_owner": "it",
+        "destination_ip": "10.20.3.4"
+    }
+    unknown = {"details": {"user_ip": "unknown", "server_ip": "192.168.1.1"}}
+    enricher.enrich(unknown)
+    assert unknown["details"] == {"user_ip": "unknown", "server_ip": "192.168.1.1"}
@@ -0,0 +1,125 @@
+import sys
+import threading
+
+import pytest
+
+from colors import Colors
+from job_manager import JobManager
+
+
+@pytest.fixture
+def job_manager(monkeypatch):
+    # The manager swaps sys.stdout for the outputs of the jobs, put it back afterwards
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    job_manager = JobManager()
+    yield job_manager
+    job_manager.cancel_all()
+
+
+def run_until_cancelled(ticks, reached):
+    # Command that ticks until it's cancelled, reporting every tick it got through
+    def command(job):
+        while job.tick():
+            ticks.append(job.progress)
+            if len(ticks) == 100:
+                reached.set()
+    return command
+
+
+def test_paused_job_waits_in_tick_until_resumed(job_manager):
+    ticks = []
+    reached = threading.Event()
+    job = job_manager.start("test", run_until_cancelled(ticks, reached))
+    assert reached.wait(5)
+
+    job.pause()
+    # A tick that was already past the pause check may still land
+    paused_at = len(ticks)
+    threading.Event().wait(0.2)
+    assert job.state == "paused"
+    assert len(ticks) <= paused_at + 1
+    assert job.rate() == 0.0
+
+    job.resume()
+    resumed_at = len(ticks)
+    threading.Event().wait(0.2)
+    assert job.state == "running"
+    assert len(ticks) > resumed_at
+
+    job.cancel()
+    job.thread.join(5)
+    assert job.state == "cancelled"
+
+
+def test_cancel_wakes_a_paused_job(job_manager):
+    ticks = []
+    reached = threading.Event()
+    job = job_manager.start("test", run_until_cancelled(ticks, reached))
+    assert reached.wait(5)
+    job.pause()
+
+    job.cancel()
+    job.thread.join(5)
+    assert not job.thread.is_alive()
+    assert job.state == "cancelled"
+    assert job.finished is not None
+
+
+def test_job_whose_command_returns_false_is_failed(job_manager):
+    def command(job):
+        print("Loading...")
+        print(f"{Colors.FAIL}No users found with query {{}}.{Colors.ENDC}")
+        return False
+
+    job = job_manager.start("test", command)
+    job.thread.join(5)
+
+    assert job.state == "failed"
+    assert list(job.output) == ["Loading...", f"{Colors.FAIL}No users found with query {{}}.{Colors.ENDC}"]
+
+
+def test_error_colors_in_the_output_dont_fail_a_job(job_manager):
+    # e.g. a replayed event that happens to hold the escape codes
+    job = job_manager.start("test", lambda job: print(f"{Colors.FAIL}not an error{Colors.ENDC}"))
+    job.thread.join(5)
+
+    assert job.state == "done"
+    assert job.error is None
+
+
+def test_failed_background_command_fails_its_job(make_shell, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", sys.stdout)
+    shell = make_shell()
+
+    shell.onecmd("bg generate_events 10 {} {} nonexistent_format")
+    shell.onecmd("bg generate_events 10 {} {} none")
+    for job in shell.job_manager.jobs.values():
+        job.thread.join(5)
+
+    assert [job.state for job in shell.job_manager.jobs.values()] == ["failed", "done"]
+
+
+def test_job_that_raises_is_failed_and_output_is_kept(job_manager):
+    def command(job):
+        job.set_total(10)
+        for _ in job.track(range(10)):
+            pass
+        sys.stdout.write("no newline at the end")
+        raise RuntimeError("broken")
+
+    job = job_manager.start("test", command)
+    job.thread.join(5)
+
+    assert job.state == "failed"
+    assert job.error == "broken"
+    assert job.progress == 10
+    assert list(job.output) == ["Job failed: broken", "no newline at the end"]
+
+
+def test_job_that_finishes_is_done(job_manager):
+    job = job_manager.start("test", lambda job: print("ok"))
+    job.thread.join(5)
+
+    assert job.state == "done"
+    assert job.error is None
+    assert job_manager.active() == []
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from output_buffer import OutputBuffer
+
+
+@pytest.fixture
+def short_writes(monkeypatch):
+    # Makes every write and writev hand at most 7 bytes to the file, like a pipe or a full disk would
+    real_write = os.write
+    calls = []
+
+    def write(fd, data):
+        calls.append(len(data))
+        return real_write(fd, bytes(data[:7]))
+
+    def writev(fd, buffers):
+        calls.append(sum(len(buffer) for buffer in buffers))
+        return real_write(fd, b"".join(bytes(buffer) for buffer in buffers)[:7])
+
+    monkeypatch.setattr(os, "write", write)
+    monkeypatch.setattr(os, "writev", writev, raising=False)
+    return calls
+
+
+def test_partial_writes_continue_where_they_stopped(tmp_path, short_writes):
+    path = tmp_path / "events.log"
+    output = OutputBuffer(str(path), buffer_size=16, fsync="none")
+    chunks = [b"first line\n", b"second\n", b"a chunk larger than the whole buffer\n", b"last\n"]
+    for chunk in chunks:
+        output.write(chunk)
+    assert output.tell() == sum(len(chunk) for chunk in chunks)
+    output.close()
+
+    assert path.read_bytes() == b"".join(chunks)
+    assert output.offset == len(path.read_bytes())
+    assert output.writes == len(short_writes)
+    assert len(short_writes) > 1
+
+
+def test_buffer_is_written_once_full(tmp_path):
+    path = tmp_path / "events.log"
+    output = OutputBuffer(str(path), buffer_size=10, fsync="none")
+    output.write(b"12345")
+    output.write(b"67890")
+    assert output.writes == 0
+    output.write(b"abc")
+    assert output.writes == 1
+    assert path.read_bytes() == b"1234567890"
+    output.close()
+
+    assert path.read_bytes() == b"1234567890abc"
+    assert output.writes == 2
+
+
+def test_resume_truncates_at_the_offset(tmp_path):
+    path = tmp_path / "events.log"
+    path.write_bytes(b"kept|lost after the checkpoint")
+    output = OutputBuffer(str(path), resume_offset=5, fsync="none")
+    assert output.tell() == 5
+    output.write(b"new")
+    output.close()
+
+    assert path.read_bytes() == b"kept|new"
+
+
+def test_resume_of_a_missing_file_raises(tmp_path):
+    path = tmp_path / "events.log"
+    with pytest.raises(FileNotFoundError):
+        OutputBuffer(str(path), resume_offset=5)
+    assert not path.exists()
@@ -0,0 +1,61 @@
+import gzip
+import json
+
+import pytest
+
+from event_schema import EventSchema
+from shard_merger import ShardMerger
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+
+def write_shard(path, timestamps, worker):
+    lines = "".join(json.dumps({"timestamp": timestamp, "worker": worker}) + "\n" for timestamp in timestamps)
+    if path.suffix == ".gz":
+        path.write_bytes(gzip.compress(lines.encode("utf-8")))
+    else:
+        path.write_text(lines)
+    return str(path)
+
+
+def late_timestamps(count, distance):
+    # The last event belongs 'distance' events earlier
+    late = count - 1 - distance
+    return [timestamp for timestamp in range(count) if timestamp != late] + [late]
+
+
+def merge(paths, reorder_window):
+    sink = ListSink()
+    ShardMerger(EventSchema(), buffer_size=64, reorder_window=reorder_window).merge(paths, sink)
+    return sink.events
+
+
+def test_shards_are_merged_in_time_order(tmp_path):
+    first = write_shard(tmp_path / "events_w0.ndjson", range(0, 100, 2), 0)
+    second = write_shard(tmp_path / "events_w1.ndjson.gz", range(1, 100, 2), 1)
+
+    events = merge([first, second], 10)
+
+    assert [event["timestamp"] for event in events] == list(range(100))
+    assert [event["worker"] for event in events] == [0, 1] * 50
+
+
+@pytest.mark.parametrize("reorder_window", [5, 6, 50])
+def test_events_within_the_reorder_window_are_put_back_in_order(tmp_path, reorder_window):
+    shard = write_shard(tmp_path / "events_w0.ndjson", late_timestamps(40, 5), 0)
+
+    assert [event["timestamp"] for event in merge([shard], reorder_window)] == list(range(40))
+
+
+@pytest.mark.parametrize("distance", [6, 20])
+def test_events_past_the_reorder_window_fail_the_merge(tmp_path, distance):
+    shard = write_shard(tmp_path / "events_w0.ndjson", late_timestamps(40, distance), 0)
+
+    with pytest.raises(ValueError, match="Event 40 of .* more than 5 events away"):
+        merge([shard], 5)
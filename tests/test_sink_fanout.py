@@ -0,0 +1,87 @@
+import threading
+
+import pytest
+
+from sink_fanout import EventFanout, SinkError
+
+
+class ListWriter:
+    # Writer of a sink that keeps its events in memory, and can be held back or made to fail
+    def __init__(self, name, gate=None, fail_at=None):
+        self.filename = name
+        self.events = []
+        self.gate = gate
+        self.fail_at = fail_at
+
+    def write(self, event):
+        if self.gate is not None:
+            self.gate.wait()
+        if self.fail_at is not None and len(self.events) == self.fail_at:
+            raise OSError("No space left on device")
+        self.events.append(event)
+
+
+def events(count):
+    return [{"sequence": i} for i in range(count)]
+
+
+def test_slow_sink_spills_and_then_drains_in_order(tmp_path):
+    gate = threading.Event()
+    slow, fast = ListWriter("slow", gate), ListWriter("fast")
+    fanout = EventFanout([slow, fast], batch_size=2, capacity=3, overflow="spill", spill_dir=str(tmp_path))
+    for event in events(100):
+        fanout.write(event)
+    slow_channel, fast_channel = fanout.channels
+
+    fast_channel.wait()
+    # The fast sink isn't held back by the slow one, whose batches went to its spill file
+    assert fast.events == events(100)
+    assert slow_channel.spilled > 0
+    assert len(slow_channel.buffer) <= 3
+
+    gate.set()
+    fanout.sync()
+    assert slow.events == events(100)
+    assert slow_channel.spilled == 0
+
+    # Spilling again after the spill file was drained keeps the order too
+    gate.clear()
+    for event in events(200)[100:]:
+        fanout.write(event)
+    gate.set()
+    fanout.close()
+    assert slow.events == events(200)
+    assert fast.events == events(200)
+
+
+def test_block_overflow_waits_for_the_slow_sink():
+    gate = threading.Event()
+    slow = ListWriter("slow", gate)
+    fanout = EventFanout([slow], batch_size=1, capacity=2, overflow="block")
+    writing = threading.Thread(target=lambda: [fanout.write(event) for event in events(20)])
+    writing.start()
+
+    writing.join(0.3)
+    assert writing.is_alive()
+    assert len(fanout.channels[0].buffer) <= 2
+    assert fanout.channels[0].spill is None
+
+    gate.set()
+    writing.join(5)
+    fanout.close()
+    assert slow.events == events(20)
+
+
+def test_failed_sink_raises_and_the_others_still_get_everything():
+    failing, other = ListWriter("failing", fail_at=5), ListWriter("other")
+    fanout = EventFanout([failing, other], batch_size=4, capacity=2)
+    for event in events(12):
+        fanout.write(event)
+
+    with pytest.raises(SinkError) as error:
+        fanout.close()
+    assert "'failing'" in str(error.value)
+    assert isinstance(error.value.__cause__, OSError)
+    assert fanout.closed
+    assert failing.events == events(5)
+    assert other.events == events(12)
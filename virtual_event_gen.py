@@ -1,7 +1,63 @@
+import itertools
+import json
 import logging
 import time
 import random
 
+from entity_pool import EntityPool, SampledEntityPool
+from event_details import EventDetails
+from ip_enricher import IpEnricher
+
+# I haven't figured out yet how I'm gonna code this or what the purpose of
+# event_type and active_hours fields is gonna be, so for now, I will just
+# throw a list of possible random event_types, pick one of them every time
+# an event is generated, and hardcode an active hours value.
+EVENT_TYPES = (
+    "login_success",
+    "login_failure",
+    "file_access",
+    "file_deletion",
+    "file_modification",
+    "system_start",
+    "system_shutdown",
+    "user_creation",
+    "user_deletion",
+    "user_privilege_change",
+    "network_connection",
+    "network_disconnection",
+    "malware_detection",
+    "firewall_rule_change",
+    "configuration_change",
+    "software_installation",
+    "software_uninstallation",
+    "service_start",
+    "service_stop",
+    "backup_creation",
+    "backup_restoration",
+    "data_export",
+    "data_import",
+    "security_alert",
+    "policy_violation",
+    "resource_overuse",
+    "database_query",
+    "database_update",
+    "system_error",
+    "hardware_failure",
+    "password_change",
+    "password_reset",
+    "multi_factor_authentication",
+    "vpn_connection",
+    "vpn_disconnection",
+    "email_sent",
+    "email_received",
+    "print_job_started",
+    "print_job_completed",
+)
+
+# Only the fields used to build an event are fetched from the database
+USER_FIELDS = {"username": 1, "role": 1, "ip_address": 1}
+SERVER_FIELDS = {"server_name": 1, "server_type": 1, "ip_address": 1}
+
 
 class VirtualEventGen:
 
@@ -10,13 +66,231 @@ class VirtualEventGen:
         self.config_manager = config_manager
         self.data_manager = data_manager
         self.logger = logging.getLogger("VirtualEventGen")
+
+        # Every random pick goes through this generator, so a run can be seeded,
+        # checkpointed (getstate) and resumed (setstate)
+        self.random = random.Random()
+        # Users and servers are loaded once per query pair instead of once per event
+        self.entity_pool = None
+        self.entity_queries = None
+        # Memory-mapped snapshot used instead of the database when loaded
+        self.snapshot = None
+        # Simulated clock used by seeded runs. When None, events use the wall clock
+        self.clock = None
+        self.event_rate = None
+        # Optional weights of the event types. When None, every type is equally likely
+        self.event_mix = None
+        self.event_mix_types = EVENT_TYPES
+        self.event_mix_weights = None
+        # Generators of the action specific details. When None, events only have the generic ones
+        self.event_details = None
+        # Adds the fields of the IP tables to the events. When None, events aren't enriched
+        self.ip_enricher = None
         self.logger.info("VirtualEventGen component initialized.")
 
-    def generate_event(self, users_query, servers_query):
+    def seed(self, seed=None, start_time=None, event_rate=None):
+        """
+        Prepares the generator for a new run. With a seed, the run is reproducible:
+        the random generator gets seeded and timestamps are taken from a simulated
+        clock instead of the wall clock. Without one, it goes back to random picks
+        and wall clock timestamps.
+        :param seed: [int] Seed of the run.
+        :param start_time: [float] Timestamp of the first event (epoch seconds).
+        :param event_rate: [float] Average number of events per simulated second.
+        """
+
+        self.random.seed(seed)
+        if seed is None:
+            self.clock = None
+            self.event_rate = None
+            self.logger.info("Generator reset to an unseeded run.")
+            return
+        self.clock = start_time
+        self.event_rate = event_rate
+        self.logger.info(f"Generator seeded with '{seed}', start time '{start_time}', rate '{event_rate}'.")
+
+    def get_state(self):
+        """
+        Gets the generator state so it can be stored in a checkpoint.
+        :return: [Dictionary] JSON serializable state
+        """
+
+        version, internal_state, gauss_next = self.random.getstate()
+        return {
+            "rng_state": [version, list(internal_state), gauss_next],
+            "clock": self.clock,
+            "event_rate": self.event_rate
+        }
+
+    def set_state(self, state):
+        """
+        Restores a generator state previously obtained with get_state.
+        :param state: [Dictionary] State stored in a checkpoint.
+        """
+
+        version, internal_state, gauss_next = state["rng_state"]
+        self.random.setstate((version, tuple(internal_state), gauss_next))
+        self.clock = state["clock"]
+        self.event_rate = state["event_rate"]
+        self.logger.info("Generator state restored.")
+
+    def load_event_mix(self):
+        """
+        Reads the event mix from the JSON file in the 'event_mix' config,
+        a dictionary with the weight of each event type, e.g. {"login_failure": 5, "file_access": 1}.
+        :return: [Dictionary] Event mix, or None if it isn't configured
+        """
+
+        path = self.config_manager.get_global_config("event_mix")["event_mix"]
+        if not path:
+            return None
+        with open(path, "r") as file:
+            return json.load(file)
+
+    def set_event_mix(self, event_mix):
+        """
+        Sets the weights used to pick the event type of each event.
+        :param event_mix: [Dictionary] Weight of each event type. None picks every type with the same probability.
+        """
+
+        self.event_mix = event_mix
+        if not event_mix:
+            self.event_mix_types = EVENT_TYPES
+            self.event_mix_weights = None
+            return
+        unknown = set(event_mix) - set(EVENT_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown event types in event mix: {', '.join(sorted(unknown))}")
+        self.event_mix_types = list(event_mix)
+        self.event_mix_weights = list(itertools.accumulate(event_mix.values()))
+        self.logger.info(f"Event mix set: {event_mix}")
+
+    def set_event_details(self, enabled):
+        """
+        Enables or disables the action specific details (file paths, processes, ports, packages...).
+        The vocabularies are mapped the first time they are enabled.
+        :param enabled: [Boolean] Whether events get the details of their action.
+        """
+
+        if not enabled:
+            self.event_details = None
+        elif self.event_details is None:
+            self.event_details = EventDetails()
+
+    def set_ip_enrichment(self, tables):
+        """
+        Loads the IP tables the events are enriched with. They're only loaded again when
+        the files or their contents change.
+        :param tables: [List-of String] CSV tables of IP ranges, or an empty list to disable the enrichment.
+        """
+
+        if not tables:
+            self.ip_enricher = None
+            return
+        if self.ip_enricher is not None and self.ip_enricher.version == IpEnricher.get_version(tables):
+            return
+        config = self.config_manager.get_global_config("ip_enrichment_fields", "ip_enrichment_cache")
+        fields = [field.strip() for field in config["ip_enrichment_fields"].split(",") if field.strip()]
+        self.ip_enricher = IpEnricher(tables, fields, int(config["ip_enrichment_cache"]))
+
+    def enrich(self, event):
+        """
+        Adds the fields of the IP tables to an event, once it's final (e.g. after a campaign
+        changed its IPs). Does nothing if the enrichment is disabled.
+        :param event: [Dictionary] Event.
+        """
+
+        if self.ip_enricher is not None:
+            self.ip_enricher.enrich(event)
+
+    def set_entity_pool(self, entity_pool, users_query, servers_query):
+        """
+        Uses an entity pool that was loaded somewhere else (e.g. sent by a coordinator)
+        for the given queries.
+        :param entity_pool: [EntityPool] Users and servers.
+        :param users_query: [Dictionary] Users query the pool stands for.
+        :param servers_query: [Dictionary] Servers query the pool stands for.
+        """
+
+        self.close_entity_pool()
+        self.entity_pool = entity_pool
+        self.entity_queries = (users_query, servers_query)
+
+    def use_snapshot(self, snapshot):
+        """
+        Takes the entities from a snapshot instead of the database.
+        :param snapshot: [EntitySnapshot] Snapshot, or None to go back to the database.
+        """
+
+        self.snapshot = snapshot
+        self.close_entity_pool()
+        self.entity_pool = None
+        self.entity_queries = None
+
+    def close_entity_pool(self):
+        # A sampled pool has a batch being sampled in the background
+        if isinstance(self.entity_pool, SampledEntityPool):
+            self.entity_pool.close()
+
+    def load_entities(self, users_query, servers_query):
+        """
+        Reads the users and servers matching the queries into an entity pool.
+        If a snapshot is in use, the pool is a view of the snapshot instead. If the
+        'entity_sampling' config is enabled and there are more users or servers than
+        fit in 'sample_reservoir_size', the pool samples them from the database instead.
+        :param users_query: [Dictionary] Filters the users to be used in the events.
+        :param servers_query: [Dictionary] Filters the servers to be used in the events.
+        :return: EntityPool or SampledEntityPool
+        """
+
+        self.close_entity_pool()
+        if self.snapshot is not None:
+            self.entity_pool = self.snapshot.select(users_query, servers_query)
+            self.entity_queries = (users_query, servers_query)
+            return self.entity_pool
+
+        config = self.config_manager.get_global_config("entity_sampling", "sample_reservoir_size",
+                                                       "sample_batch_size")
+        if config["entity_sampling"] == "True":
+            size = int(config["sample_reservoir_size"])
+            counts = (self.data_manager.count_doc("users", users_query),
+                      self.data_manager.count_doc("servers", servers_query))
+            if max(counts) > size:
+                self.entity_pool = SampledEntityPool(self.data_manager, users_query, servers_query, USER_FIELDS,
+                                                     SERVER_FIELDS, counts, size, int(config["sample_batch_size"]))
+                self.entity_queries = (users_query, servers_query)
+                return self.entity_pool
+
+        users = self.data_manager.read_doc("users", users_query, USER_FIELDS)
+        servers = self.data_manager.read_doc("servers", servers_query, SERVER_FIELDS)
+
+        # Sorted by _id so a seeded run always picks from the same ordering
+        self.entity_pool = EntityPool(list(users.sort("_id", 1)), list(servers.sort("_id", 1)))
+        self.entity_queries = (users_query, servers_query)
+        return self.entity_pool
+
+    def next_timestamp(self):
+        """
+        Gets the timestamp for the next event.
+        :return: [float] Timestamp (epoch seconds)
+        """
+
+        if self.clock is None:
+            return time.time()
+        self.clock += self.random.expovariate(self.event_rate)
+        return self.clock
+
+    def pick_event_type(self):
+        if self.event_mix_weights is None:
+            return self.random.choice(EVENT_TYPES)
+        return self.random.choices(self.event_mix_types, cum_weights=self.event_mix_weights)[0]
+
+    def generate_event(self, users_query, servers_query, sequence=None):
         """
         Generates a mock event. One at the time.
         :param users_query: [Dictionary] Filters the users to be used in the event.
         :param servers_query: [Dictionary] Filters the servers to be used in the event.
+        :param sequence: [int] Position of the event in its run. If given, it's added to the event.
         :return: Generated event
         """
 
@@ -24,77 +298,50 @@ class VirtualEventGen:
         # event_type = self.config_manager.get_global_config("event_type")
         # active_hours = self.config_manager.get_global_config("active_hours")
 
-        # I haven't figured out yet how I'm gonna code this or what the purpose of
-        # event_type and active_hours fields is gonna be, so for now, I will just
-        # throw a list of possible random event_types, pick one of them every time
-        # an event is generated, and hardcode an active hours value.
-        event_types = [
-            "login_success",
-            "login_failure",
-            "file_access",
-            "file_deletion",
-            "file_modification",
-            "system_start",
-            "system_shutdown",
-            "user_creation",
-            "user_deletion",
-            "user_privilege_change",
-            "network_connection",
-            "network_disconnection",
-            "malware_detection",
-            "firewall_rule_change",
-            "configuration_change",
-            "software_installation",
-            "software_uninstallation",
-            "service_start",
-            "service_stop",
-            "backup_creation",
-            "backup_restoration",
-            "data_export",
-            "data_import",
-            "security_alert",
-            "policy_violation",
-            "resource_overuse",
-            "database_query",
-            "database_update",
-            "system_error",
-            "hardware_failure",
-            "password_change",
-            "password_reset",
-            "multi_factor_authentication",
-            "vpn_connection",
-            "vpn_disconnection",
-            "email_sent",
-            "email_received",
-            "print_job_started",
-            "print_job_completed"
-        ]
-        event_type = random.choice(event_types)
+        event_type = self.pick_event_type()
         active_hours = "8:00-17:00"
 
-        # Filters users and servers to be used in the event
-        users = self.data_manager.read_doc("users", users_query)
-        servers = self.data_manager.read_doc("servers", servers_query)
+        # Filters users and servers to be used in the event.
+        # They are only read again when the queries change.
+        if self.entity_queries != (users_query, servers_query):
+            self.load_entities(users_query, servers_query)
 
         # Validates that there are users or servers available.
-        if not users or not servers:
+        if not self.entity_pool:
             message = "No users or servers available for event generation."
             self.logger.warning(message)
             return
 
         # Pick a random user and server.
-        user = random.choice(list(users))
-        server = random.choice(list(servers))
+        user = self.entity_pool.pick_user(self.random)
+        server = self.entity_pool.pick_server(self.random)
 
         # Verify the user is in active hours (NOT implemented/in use yet)
         if not self.is_user_active(user, active_hours):
             self.logger.warning("User not active.")
             return None
 
-        # Generates event
+        event = self.build_event(self.next_timestamp(), user, server, event_type)
+        if sequence is not None:
+            event["sequence"] = sequence
+        self.logger.info("Generated event.")
+        self.logger.debug(f"Generated event: {event}")
+        return event
+
+    def build_event(self, timestamp, user, server, event_type, rng=None):
+        """
+        Builds an event from its parts.
+        :param timestamp: [float] Timestamp (epoch seconds).
+        :param user: [Dictionary] User document.
+        :param server: [Dictionary] Server document.
+        :param event_type: [String] Action.
+        :param rng: [Random] Generator the action details are drawn with. Defaults to the one of the run.
+        :return: Event
+        """
+
         # Generic format for now, it can be improved or have a more custom solution
         event = {
-            "timestamp": time.time(),
+            "timestamp": timestamp,
             "user": user["username"],
             "server": server["server_name"],
             "action": event_type,
@@ -105,8 +352,8 @@ class VirtualEventGen:
                 "server_ip": server.get("ip_address", "unknown")
             }
         }
-        self.logger.info("Generated event.")
-        self.logger.debug(f"Generated event: {event}")
+        if self.event_details is not None:
+            event["details"].update(self.event_details.generate(event_type, rng or self.random))
         return event
 
     def is_user_active(self, user, active_hours):